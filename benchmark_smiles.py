@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the SMILES validators
+  scaling      validation throughput while scaling the number of worker processes
+  formula      formula parsing, the formula module against the previous str.replace/re parser
+  vector       RDKit-side formula comparison: Hill string + dict, element vectors, atom walk
+  descriptors  descriptor table throughput (use --rows 100000 for the catalogue-scale number)
+  index        substructure/similarity query latency (e.g. --rows 10000,100000,1000000)
+  suite        validator throughput and peak RSS on synthetic catalogues, saved as a JSON baseline
+  compare      compare a suite result with a baseline, exit 1 when throughput regressed
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rdkit import Chem
+from rdkit.Chem import rdMolDescriptors
+
+import formula as chem_formula
+import molecule_descriptors
+import substructure_index
+import synthetic_catalogue
+import validate_all_smiles
+import validate_smiles
+
+SUITE_SIZES = (1000, 10000, 100000)
+DEFAULT_THRESHOLD = 0.10
+
+# Micro benchmarks on pre-parsed molecules run on a sample to bound memory at 1M rows
+MOL_SAMPLE = 20000
+
+def build_catalogue(rows: int) -> str:
+    """Repeat the embedded catalogue until it holds the requested number of rows"""
+    lines = [line for line in validate_all_smiles.molecules_data.strip().split('\n') if line.count(',') >= 2]
+    repeated = [lines[i % len(lines)] for i in range(rows)]
+    return '\n'.join(repeated)
+
+def time_validate_all(data: str, workers: int, chunk_size: int) -> float:
+    """Run validate_all on data with output discarded, return wall time in seconds"""
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        validate_all_smiles.validate_all(workers=workers, chunk_size=chunk_size,
+                                         data=data, output=os.devnull)
+    return time.perf_counter() - start
+
+def bench_scaling(rows: int, max_workers: int, chunk_size: int) -> List[Dict]:
+    """Measure throughput for 1..max_workers processes"""
+    data = build_catalogue(rows)
+    results = []
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        elapsed = time_validate_all(data, workers, chunk_size)
+        rate = rows / elapsed
+        if baseline is None:
+            baseline = rate
+        results.append({
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'molecules_per_sec': round(rate, 1),
+            'speedup': round(rate / baseline, 2),
+        })
+        print(f"{workers:>3} workers: {elapsed:8.3f} s  {rate:10.1f} mol/s  x{rate / baseline:.2f}",
+              file=sys.stderr)
+    return results
+
+def legacy_parse_formula(formula_str: str) -> Dict[str, int]:
+    """The parser validate_all_smiles used before the formula module, kept for comparison"""
+    subscripts = {
+        '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4',
+        '₅': '5', '₆': '6', '₇': '7', '₈': '8', '₉': '9'
+    }
+    for sub, num in subscripts.items():
+        formula_str = formula_str.replace(sub, num)
+    formula_str = formula_str.replace('⁺', '').replace('⁻', '')
+    formula_str = formula_str.replace('(', '').replace(')', 'n').replace('n', '')
+    elements = {}
+    for element, count in re.findall(r'([A-Z][a-z]?)(\d*)', formula_str):
+        count = int(count) if count else 1
+        elements[element] = elements.get(element, 0) + count
+    return elements
+
+def catalogue_formula_pairs() -> List[Tuple[str, str]]:
+    """(expected formula, CalcMolFormula output) for every parseable embedded row"""
+    pairs = []
+    for _, _, formula, smiles in validate_all_smiles.iter_text_rows(validate_all_smiles.molecules_data):
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is not None:
+            pairs.append((formula, rdMolDescriptors.CalcMolFormula(mol)))
+    return pairs
+
+def bench_formula(repeat: int) -> Dict:
+    """Time parsing and comparing every catalogue formula with both parsers"""
+    pairs = catalogue_formula_pairs()
+    formulas = [f for pair in pairs for f in pair]
+
+    def run_legacy():
+        for expected, actual in pairs:
+            legacy_parse_formula(expected) == legacy_parse_formula(actual)
+
+    def run_uncached():
+        chem_formula.parse.cache_clear()
+        for expected, actual in pairs:
+            chem_formula.parse(expected).counts == chem_formula.parse(actual).counts
+
+    def run_cached():
+        for expected, actual in pairs:
+            chem_formula.parse(expected).counts == chem_formula.parse(actual).counts
+
+    results = {'formulas': len(formulas), 'repeat': repeat}
+    for label, fn in (('legacy', run_legacy), ('formula_cold', run_uncached), ('formula_warm', run_cached)):
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - start
+        per_formula = elapsed / (repeat * len(formulas)) * 1e9
+        results[label] = {'seconds': round(elapsed, 4), 'ns_per_formula': round(per_formula, 1)}
+        print(f"{label:>13}: {elapsed:8.4f} s  {per_formula:8.1f} ns/formula", file=sys.stderr)
+
+    mismatches = [f for f in formulas if legacy_parse_formula(f) != chem_formula.element_counts(f)]
+    results['differs_from_legacy'] = mismatches
+    return results
+
+def catalogue_mols() -> List[Tuple[str, object]]:
+    """(expected formula, parsed Mol) for every parseable row of the embedded catalogue and molecules.js"""
+    rows = list(validate_all_smiles.iter_text_rows(validate_all_smiles.molecules_data))
+    rows += list(validate_all_smiles.iter_rows(validate_all_smiles.DEFAULT_MOLECULES_JS))
+    mols = []
+    for _, _, formula, smiles in rows:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is not None:
+            mols.append((formula, mol))
+    return mols
+
+def bench_vector(repeat: int) -> Dict:
+    """Time the formula comparison on pre-parsed Mols and check every path gives the same verdict"""
+    mols = catalogue_mols()
+
+    def run_dict():
+        for formula, mol in mols:
+            legacy_parse_formula(rdMolDescriptors.CalcMolFormula(mol)) == legacy_parse_formula(formula)
+
+    def run_vector_cold():
+        chem_formula.parse.cache_clear()
+        chem_formula.vector.cache_clear()
+        for formula, mol in mols:
+            validate_all_smiles.get_rdkit_vector(mol) == chem_formula.vector(formula)
+
+    def run_vector():
+        for formula, mol in mols:
+            validate_all_smiles.get_rdkit_vector(mol) == chem_formula.vector(formula)
+
+    def run_atoms():
+        for formula, mol in mols:
+            chem_formula.mol_vector(mol) == chem_formula.vector(formula)
+
+    results = {'molecules': len(mols), 'repeat': repeat}
+    runs = (('hill_dict', run_dict), ('vector_cold', run_vector_cold),
+            ('vector_warm', run_vector), ('atom_walk', run_atoms))
+    for label, fn in runs:
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - start
+        per_mol = elapsed / (repeat * len(mols)) * 1e6
+        results[label] = {'seconds': round(elapsed, 4), 'us_per_molecule': round(per_mol, 2)}
+        print(f"{label:>12}: {elapsed:8.4f} s  {per_mol:8.2f} us/molecule", file=sys.stderr)
+
+    disagreements = []
+    for formula, mol in mols:
+        hill = validate_all_smiles.get_rdkit_vector(mol)
+        if hill != chem_formula.mol_vector(mol):
+            disagreements.append({'formula': formula, 'smiles': Chem.MolToSmiles(mol), 'reason': 'atom walk'})
+        legacy = legacy_parse_formula(rdMolDescriptors.CalcMolFormula(mol)) == legacy_parse_formula(formula)
+        if legacy != (hill == chem_formula.vector(formula)):
+            disagreements.append({'formula': formula, 'smiles': Chem.MolToSmiles(mol), 'reason': 'legacy verdict'})
+    results['disagreements'] = disagreements
+    return results
+
+def bench_descriptors(rows: int, max_workers: int, chunk_size: int) -> Dict:
+    """Time building the descriptor table for a catalogue of the given size"""
+    data = build_catalogue(rows)
+    results = {'rows': rows, 'chunk_size': chunk_size, 'runs': []}
+    for workers in sorted({1, max_workers}):
+        start = time.perf_counter()
+        table, _, _ = molecule_descriptors.build_table(validate_all_smiles.iter_text_rows(data), workers, chunk_size)
+        elapsed = time.perf_counter() - start
+        rate = len(table) / elapsed
+        results['runs'].append({'workers': workers, 'seconds': round(elapsed, 3),
+                                'molecules_per_sec': round(rate, 1), 'table_bytes': table.nbytes})
+        print(f"{workers:>3} workers: {elapsed:8.3f} s  {rate:10.1f} mol/s  {table.nbytes} bytes",
+              file=sys.stderr)
+    return results
+
+def bench_index(sizes: List[int], repeat: int) -> Dict:
+    """Build an index per catalogue size and time substructure and similarity queries against it"""
+    queries = [('substructure', q) for q in ('steroid', 'carboxylic_acid', 'indole')]
+    queries += [('similar', s) for s in ('CC(=O)Oc1ccccc1C(=O)O', 'NCCc1ccc(O)c(O)c1')]
+    results = {'repeat': repeat, 'sizes': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"{rows}.idx")
+            stats = substructure_index.build_index(validate_all_smiles.iter_text_rows(build_catalogue(rows)), path)
+            index = substructure_index.SubstructureIndex(path)
+            entry = {'rows': rows, 'build_seconds': stats['seconds'], 'index_bytes': stats['bytes'], 'queries': {}}
+            for kind, query in queries:
+                run = index.substructure if kind == 'substructure' else index.similar
+                hits = len(run(query))
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    run(query)
+                ms = (time.perf_counter() - start) / repeat * 1000
+                entry['queries'][f"{kind}:{query}"] = {'ms': round(ms, 3), 'hits': hits}
+                print(f"{rows:>9} rows  {kind:>12} {query:<24} {ms:9.3f} ms  {hits} hits", file=sys.stderr)
+            results['sizes'].append(entry)
+            del index
+    return results
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children, in MiB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_validate_molecule(path: str) -> int:
+    count = 0
+    for molecule in validate_smiles.iter_molecules(path):
+        validate_smiles.validate_molecule(molecule)
+        count += 1
+    return count
+
+def run_parse_formula(path: str) -> Tuple[int, float]:
+    validate_all_smiles.chem_formula.parse.cache_clear()
+    formulas = [formula for _, _, formula, _ in validate_all_smiles.iter_rows(path)]
+    start = time.perf_counter()
+    for formula in formulas:
+        try:
+            validate_all_smiles.parse_formula(formula)
+        except chem_formula.FormulaError:
+            pass
+    return len(formulas), time.perf_counter() - start
+
+def run_get_rdkit_formula(path: str) -> Tuple[int, float]:
+    mols = []
+    for _, _, _, smiles in validate_all_smiles.iter_rows(path):
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is not None:
+            mols.append(mol)
+        if len(mols) >= MOL_SAMPLE:
+            break
+    start = time.perf_counter()
+    for mol in mols:
+        validate_all_smiles.get_rdkit_formula(mol)
+    return len(mols), time.perf_counter() - start
+
+def run_validate_all(path: str, workers: int = 1) -> Tuple[int, float]:
+    count = sum(1 for _ in validate_all_smiles.iter_rows(path))
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        validate_all_smiles.validate_all(workers=workers, source=path, output=os.devnull, mode='quiet')
+    return count, time.perf_counter() - start
+
+def measure(target: Callable, *args) -> Dict:
+    """Run one benchmark in this (fresh) process: wall time, molecules/sec and peak RSS
+
+    Targets return a row count, or (count, seconds) when setup must not be timed.
+    """
+    from rdkit import RDLogger
+    RDLogger.DisableLog('rdApp.*')
+    start = time.perf_counter()
+    result = target(*args)
+    elapsed = time.perf_counter() - start
+    count, seconds = result if isinstance(result, tuple) else (result, elapsed)
+    return {'molecules': count, 'seconds': round(seconds, 4),
+            'molecules_per_sec': round(count / seconds, 1) if seconds else None, 'peak_rss_mb': peak_rss_mb()}
+
+def bench_suite(sizes: List[int], workers: int, seed: int) -> Dict:
+    """Every validator entry point on synthetic catalogues, each in its own process for a clean peak RSS"""
+    benchmarks = [('validate_molecule', run_validate_molecule, ()),
+                  ('parse_formula', run_parse_formula, ()),
+                  ('get_rdkit_formula', run_get_rdkit_formula, ()),
+                  ('validate_all', run_validate_all, (1,))]
+    if workers > 1:
+        benchmarks.append((f'validate_all_{workers}w', run_validate_all, (workers,)))
+    results = {'version': 1, 'seed': seed, 'cpus': os.cpu_count(), 'benchmarks': {}}
+    for rows in sizes:
+        path = synthetic_catalogue.catalogue_path(rows, seed)
+        for name, target, extra in benchmarks:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(measure, target, path, *extra).result()
+            key = f"{name}@{rows}"
+            results['benchmarks'][key] = result
+            print(f"{key:>28}: {result['seconds']:9.3f} s  {result['molecules_per_sec'] or 0:11.1f} mol/s  "
+                  f"{result['peak_rss_mb']:8.1f} MiB", file=sys.stderr)
+    return results
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Dict], List[str]]:
+    """Per-benchmark throughput change, and the benchmarks slower than baseline by more than threshold
+
+    A baseline benchmark missing from the current run, or one that measured no
+    throughput (it crashed or was renamed), counts as a regression.
+    """
+    changes = []
+    regressions = []
+    for key, base in baseline['benchmarks'].items():
+        if not base.get('molecules_per_sec'):
+            continue
+        now = current['benchmarks'].get(key)
+        if now is None or not now.get('molecules_per_sec'):
+            changes.append({'benchmark': key, 'baseline': base['molecules_per_sec'], 'current': None,
+                            'change': None, 'rss_change_mb': None})
+            regressions.append(key)
+            continue
+        change = now['molecules_per_sec'] / base['molecules_per_sec'] - 1
+        changes.append({'benchmark': key, 'baseline': base['molecules_per_sec'],
+                        'current': now['molecules_per_sec'], 'change': round(change, 4),
+                        'rss_change_mb': round(now['peak_rss_mb'] - base['peak_rss_mb'], 1)})
+        if change < -threshold:
+            regressions.append(key)
+    return changes, regressions
+
+def print_comparison(changes: List[Dict], regressions: List[str], threshold: float):
+    for c in changes:
+        if c['current'] is None:
+            print(f"{c['benchmark']:>28}: {c['baseline']:11.1f} -> no result  REGRESSION", file=sys.stderr)
+            continue
+        flag = '  REGRESSION' if c['benchmark'] in regressions else ''
+        print(f"{c['benchmark']:>28}: {c['baseline']:11.1f} -> {c['current']:11.1f} mol/s "
+              f"{c['change']:+7.1%}  RSS {c['rss_change_mb']:+.1f} MiB{flag}", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} benchmarks missing or slower than baseline by more than {threshold:.0%}",
+              file=sys.stderr)
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark SMILES validation throughput")
+    parser.add_argument('benchmark', nargs='?', default='scaling',
+                        choices=('scaling', 'formula', 'vector', 'descriptors', 'index', 'suite', 'compare'))
+    parser.add_argument('--rows',
+                        help="catalogue size, built by repeating the embedded rows (default: 20000, and "
+                             f"{','.join(map(str, SUITE_SIZES))} synthetic rows for the suite); "
+                             "the index benchmark accepts a comma-separated list")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                        help="highest worker count to measure (default: number of CPUs)")
+    parser.add_argument('--chunk-size', type=int, default=validate_all_smiles.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--repeat', type=int, default=200,
+                        help="passes over the catalogue for micro benchmarks (default: 200)")
+    parser.add_argument('--output', help="write results as JSON to this path")
+    parser.add_argument('--seed', type=int, default=synthetic_catalogue.DEFAULT_SEED,
+                        help="synthetic catalogue seed for the suite")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="suite: also time validate_all with this many worker processes")
+    parser.add_argument('--baseline', help="suite/compare: baseline JSON to compare throughput against")
+    parser.add_argument('--current', help="compare: result JSON to check (default: run the suite)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"largest tolerated throughput drop, as a fraction (default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+    if args.rows is None:
+        args.rows = ','.join(map(str, SUITE_SIZES)) if args.benchmark in ('suite', 'compare') else '20000'
+
+    sizes = [int(r) for r in args.rows.split(',')]
+    args.rows = sizes[0]
+    if args.benchmark in ('suite', 'compare'):
+        if args.benchmark == 'compare' and not args.baseline:
+            parser.error("compare needs --baseline")
+        if args.current:
+            with open(args.current, encoding='utf-8') as f:
+                report = json.load(f)
+        else:
+            report = bench_suite(sizes, args.workers, args.seed)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            changes, regressions = compare_results(baseline, report, args.threshold)
+            print_comparison(changes, regressions, args.threshold)
+            if regressions:
+                sys.exit(1)
+        elif not args.output:
+            print(json.dumps(report, indent=2))
+        return
+    if args.benchmark == 'index':
+        report = bench_index(sizes, args.repeat)
+    elif args.benchmark == 'formula':
+        report = bench_formula(args.repeat)
+    elif args.benchmark == 'vector':
+        report = bench_vector(args.repeat)
+    elif args.benchmark == 'descriptors':
+        report = bench_descriptors(args.rows, args.max_workers, args.chunk_size)
+    else:
+        results = bench_scaling(args.rows, args.max_workers, args.chunk_size)
+        report = {'rows': args.rows, 'chunk_size': args.chunk_size, 'scaling': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Element table compiled from src/data/elements.js
+Loads symbol, atomic number and atomic mass for every element into NumPy arrays indexed
+by atomic number, cached on disk and rebuilt only when elements.js changes. Used for a
+vectorised check that expected formulas only use known elements and that their mass
+matches RDKit's MolWt, and to compare the site's masses with RDKit's periodic table.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import zipfile
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from rdkit import Chem
+
+import formula as chem_formula
+
+ELEMENTS_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'data', 'elements.js')
+DEFAULT_TABLE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'elements.npz')
+
+# Formula mass and MolWt may differ by this much (Da) plus a relative share of the mass
+MASS_ABS_TOLERANCE = 0.05
+MASS_REL_TOLERANCE = 1e-3
+
+JS_NUMBER_FIELD = r"\b{}:\s*(-?[\d.]+)"
+JS_STRING_FIELD = r"\b{}:\s*[\"']([^\"']*)[\"']"
+
+class ElementTable(NamedTuple):
+    """Per-atomic-number arrays of width formula.CHARGE_INDEX; absent elements have NaN mass"""
+    symbols: np.ndarray
+    mass: np.ndarray
+    present: np.ndarray
+    digest: str
+
+def parse_elements_js(text: str) -> List[Tuple[int, str, float]]:
+    """(atomic number, symbol, atomic mass) for every element object in elements.js"""
+    number = re.compile(JS_NUMBER_FIELD.format('atomic_number'))
+    symbol = re.compile(JS_STRING_FIELD.format('symbol'))
+    mass = re.compile(JS_NUMBER_FIELD.format('atomic_mass'))
+    starts = [m.start() for m in number.finditer(text)]
+    elements = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        block = text[start:end]
+        s, m = symbol.search(block), mass.search(block)
+        if s and m:
+            elements.append((int(number.match(block).group(1)), s.group(1), float(m.group(1))))
+    return elements
+
+def element_table(symbols: np.ndarray, mass: np.ndarray, digest: str) -> ElementTable:
+    """Table of the elements.js arrays, plus the massless dummy atom '*' (z=0) that formulas may contain"""
+    symbols[0] = chem_formula.ELEMENT_SYMBOLS[0]
+    mass[0] = 0.0
+    return ElementTable(symbols, mass, ~np.isnan(mass), digest)
+
+def compile_table(elements: Sequence[Tuple[int, str, float]], digest: str) -> ElementTable:
+    width = chem_formula.CHARGE_INDEX
+    symbols = np.full(width, '', dtype='<U3')
+    mass = np.full(width, np.nan)
+    for z, symbol, atomic_mass in elements:
+        if 0 < z < width:
+            symbols[z] = symbol
+            mass[z] = atomic_mass
+    return element_table(symbols, mass, digest)
+
+def load_element_table(path: str = ELEMENTS_JS, cache_path: Optional[str] = DEFAULT_TABLE_CACHE) -> ElementTable:
+    """Element table for elements.js, from the on-disk cache when it was built from the same file"""
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()[:16]
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if str(cached['digest']) == digest:
+                    return element_table(cached['symbols'], cached['mass'], digest)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            pass
+    table = compile_table(parse_elements_js(source.decode('utf-8')), digest)
+    if cache_path:
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Workers may load the table concurrently, so readers must never see a half-written file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, symbols=table.symbols, mass=table.mass, digest=np.array(digest))
+        os.replace(tmp_path, cache_path)
+    return table
+
+def count_matrix(vectors: Sequence[bytes]) -> np.ndarray:
+    """Stack formula.vector() results into an (n, VECTOR_WIDTH) int32 matrix without copying per row"""
+    if not vectors:
+        return np.zeros((0, chem_formula.VECTOR_WIDTH), dtype=np.int32)
+    return np.frombuffer(b''.join(vectors), dtype=np.int32).reshape(len(vectors), chem_formula.VECTOR_WIDTH)
+
+def check_masses(vectors: Sequence[bytes], rdkit_masses: Sequence[float],
+                 table: ElementTable) -> List[Optional[str]]:
+    """Error message per formula vector, or None when it only uses listed elements and its mass matches"""
+    counts = count_matrix(vectors)[:, :chem_formula.CHARGE_INDEX]
+    unknown = (counts[:, ~table.present] != 0).any(axis=1)
+    expected = counts @ np.nan_to_num(table.mass)
+    actual = np.asarray(rdkit_masses, dtype=np.float64)
+    delta = np.abs(expected - actual)
+    bad = unknown | (delta > MASS_ABS_TOLERANCE + MASS_REL_TOLERANCE * actual)
+    errors: List[Optional[str]] = [None] * len(counts)
+    for i in np.flatnonzero(bad):
+        if unknown[i]:
+            missing = [chem_formula.ELEMENT_SYMBOLS[z] for z in np.flatnonzero((counts[i] != 0) & ~table.present)]
+            errors[i] = f"Unknown element: {', '.join(missing)} not in elements.js"
+        else:
+            errors[i] = f"Mass mismatch: formula {expected[i]:.3f}, RDKit MolWt {actual[i]:.3f}"
+    return errors
+
+def table_discrepancies(table: ElementTable, tolerance: float = 0.01) -> List[Tuple[int, str, str, float, float]]:
+    """Elements whose symbol or mass in elements.js disagrees with RDKit's periodic table"""
+    periodic = Chem.GetPeriodicTable()
+    found = []
+    for z in np.flatnonzero(table.present):
+        z = int(z)
+        symbol = periodic.GetElementSymbol(z)
+        rdkit_mass = periodic.GetAtomicWeight(z)
+        if symbol != table.symbols[z] or abs(rdkit_mass - table.mass[z]) > tolerance:
+            found.append((z, str(table.symbols[z]), symbol, float(table.mass[z]), rdkit_mass))
+    return found
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Compare elements.js with RDKit's periodic table")
+    parser.add_argument('path', nargs='?', default=ELEMENTS_JS)
+    parser.add_argument('--tolerance', type=float, default=0.01, help="largest accepted mass difference (Da)")
+    args = parser.parse_args(argv)
+
+    table = load_element_table(args.path)
+    missing = [chem_formula.ELEMENT_SYMBOLS[z] for z in range(1, chem_formula.CHARGE_INDEX) if not table.present[z]]
+    print(f"{int(table.present[1:].sum())} elements in {args.path}")
+    if missing:
+        print(f"Missing: {', '.join(missing)}")
+    for z, symbol, rdkit_symbol, mass, rdkit_mass in table_discrepancies(table, args.tolerance):
+        label = symbol if symbol == rdkit_symbol else f"{symbol} (RDKit: {rdkit_symbol})"
+        print(f"  {z:>3} {label:<14} elements.js {mass:>10.4f}   RDKit {rdkit_mass:>10.4f}")
+
+if __name__ == "__main__":
+    main()
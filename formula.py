@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Chemical formula parser
+Single-pass parser for formulas such as C₁₈H₂₄O₂, (C₆H₁₀O₅)ₙ, CuSO₄·5H₂O, C₆H₅N₂⁺,
+[Co(NH₃)₆]3+ and RDKit's CalcMolFormula output (C2H3O2-, Fe+2, CH*O2), returning
+interned Formula values
+"""
+
+import re
+from array import array
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class FormulaError(ValueError):
+    """Raised when a formula string cannot be parsed"""
+
+class Formula(NamedTuple):
+    """Element counts sorted by symbol, plus the net charge
+
+    Values returned by parse() are interned, so equal formulas are usually the
+    same object and compare in constant time.
+    """
+    counts: Tuple[Tuple[str, int], ...]
+    charge: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.counts)
+
+# One translate table: subscript digits become digits, superscript digits become
+# '^'-prefixed charge digits, charge signs become +/-, ₙ becomes n and every
+# hydrate dot becomes '.'. Braces become parentheses; square brackets stay distinct because
+# each must be closed by its own kind and digits after ']' may be a charge.
+TRANSLATION = str.maketrans({
+    **{chr(0x2080 + d): str(d) for d in range(10)},
+    **{sup: '^' + str(d) for d, sup in enumerate('⁰¹²³⁴⁵⁶⁷⁸⁹')},
+    '⁺': '+', '⁻': '-', '−': '-', 'ₙ': 'n',
+    '·': '.', '•': '.', '⋅': '.', '∙': '.',
+    '{': '(', '}': ')',
+})
+
+TOKEN_PATTERN = re.compile(
+    r'(?P<element>[A-Z][a-z]?|\*)'
+    r'|(?P<number>\d+)'
+    r'|(?P<open>[(\[])'
+    r'|(?P<close>[)\]])'
+    r'|(?P<repeat>n)'
+    r'|(?P<dot>\.)'
+    r'|(?P<charge>\^\d+)'
+    r'|(?P<sign>[+-])'
+    r'|(?P<space>\s+)'
+)
+
+# Fast path for plain formulas without groups or hydrates: element counts plus an optional charge,
+# either superscript digits before the sign (^2+) or plain digits after it (+2), never both
+SIMPLE_FORMULA = re.compile(r'((?:(?:[A-Z][a-z]?|\*)\d*)+)(?:(\^\d+)([+-])|([+-])(\d*))?')
+ELEMENT_COUNT = re.compile(r'([A-Z][a-z]?|\*)(\d*)')
+
+# Element symbols indexed by atomic number; 0 is RDKit's dummy atom '*'
+ELEMENT_SYMBOLS = (
+    '*', 'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne',
+    'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca',
+    'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn',
+    'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr', 'Y', 'Zr',
+    'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn',
+    'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd',
+    'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb',
+    'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg',
+    'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr', 'Ra', 'Ac', 'Th',
+    'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm',
+    'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds',
+    'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+ATOMIC_NUMBERS = {symbol: z for z, symbol in enumerate(ELEMENT_SYMBOLS)}
+
+# Element vectors hold one int32 count per atomic number, then the net charge
+CHARGE_INDEX = len(ELEMENT_SYMBOLS)
+VECTOR_WIDTH = CHARGE_INDEX + 1
+EMPTY_VECTOR = array('i', [0]) * VECTOR_WIDTH
+
+# Closing bracket expected for each opening one
+CLOSING = {'(': ')', '[': ']'}
+
+# Parsed formula strings kept by the parse() memo cache
+CACHE_SIZE = 1 << 16
+
+_interned: Dict[Formula, Formula] = {}
+
+def normalize(formula_str: str) -> str:
+    """Translate Unicode subscripts, superscripts and hydrate dots to ASCII"""
+    return formula_str.translate(TRANSLATION)
+
+def tokenize(formula_str: str) -> List[Tuple[str, str]]:
+    """Split a formula into (kind, text) tokens, rejecting unknown characters"""
+    text = normalize(formula_str)
+    tokens = []
+    pos = 0
+    match_at = TOKEN_PATTERN.match
+    while pos < len(text):
+        match = match_at(text, pos)
+        if match is None:
+            raise FormulaError(f"Unexpected character {text[pos]!r} in formula {formula_str!r}")
+        if match.lastgroup != 'space':
+            tokens.append((match.lastgroup, match.group()))
+        pos = match.end()
+    # Digits and a sign after a closing bracket are the charge of a complex ion: [Co(NH3)6]3+
+    for i in range(len(tokens) - 2):
+        if tokens[i] == ('close', ']') and tokens[i + 1][0] == 'number' and tokens[i + 2][0] == 'sign':
+            tokens[i + 1] = ('charge', '^' + tokens[i + 1][1])
+    return tokens
+
+def _multiplier(tokens: List[Tuple[str, str]], pos: int) -> Tuple[int, int]:
+    """Read an optional count after an element or group; a polymer 'n' counts as one repeat unit"""
+    if pos < len(tokens):
+        kind, text = tokens[pos]
+        if kind == 'number':
+            return int(text), pos + 1
+        if kind == 'repeat':
+            return 1, pos + 1
+    return 1, pos
+
+def _parse_group(tokens: List[Tuple[str, str]], pos: int, opener: Optional[str],
+                 formula_str: str) -> Tuple[Dict[str, int], int]:
+    """Element counts up to the bracket closing opener, or to the end of a top-level part (opener None)"""
+    counts: Dict[str, int] = {}
+    while pos < len(tokens):
+        kind, text = tokens[pos]
+        if kind == 'element':
+            n, pos = _multiplier(tokens, pos + 1)
+            counts[text] = counts.get(text, 0) + n
+        elif kind == 'open':
+            group, pos = _parse_group(tokens, pos + 1, text, formula_str)
+            n, pos = _multiplier(tokens, pos)
+            for element, count in group.items():
+                counts[element] = counts.get(element, 0) + count * n
+        elif kind == 'close':
+            if opener is None:
+                raise FormulaError(f"Unbalanced {text!r} in formula {formula_str!r}")
+            if text != CLOSING[opener]:
+                raise FormulaError(f"{opener!r} closed by {text!r} in formula {formula_str!r}")
+            return counts, pos + 1
+        else:
+            break
+    if opener is not None:
+        raise FormulaError(f"Unclosed {opener!r} in formula {formula_str!r}")
+    return counts, pos
+
+def _parse_ordered(formula_str: str) -> Tuple[Tuple[Tuple[str, int], ...], int]:
+    """Element counts in order of first appearance, and the net charge"""
+    simple = SIMPLE_FORMULA.fullmatch(normalize(formula_str))
+    if simple:
+        body, magnitude, sign, bare_sign, digits = simple.groups()
+        sign = sign or bare_sign
+        total: Dict[str, int] = {}
+        for element, count in ELEMENT_COUNT.findall(body):
+            total[element] = total.get(element, 0) + (int(count) if count else 1)
+        charge = 0
+        if sign:
+            size = int(magnitude[1:]) if magnitude else int(digits) if digits else 1
+            charge = size if sign == '+' else -size
+        return tuple(total.items()), charge
+
+    tokens = tokenize(formula_str)
+    total = {}
+    pos = 0
+    while True:
+        coefficient = 1
+        if pos < len(tokens) and tokens[pos][0] == 'number':
+            coefficient = int(tokens[pos][1])
+            pos += 1
+        counts, pos = _parse_group(tokens, pos, None, formula_str)
+        hydrate = pos < len(tokens) and tokens[pos][0] == 'dot'
+        if not counts and (hydrate or total):
+            raise FormulaError(f"Empty hydrate part in formula {formula_str!r}")
+        for element, count in counts.items():
+            total[element] = total.get(element, 0) + count * coefficient
+        if hydrate:
+            pos += 1
+            continue
+        break
+
+    # Charge: ²⁺ / ⁺ (superscripts) or +2 / - (CalcMolFormula)
+    charge = 0
+    magnitude = None
+    if pos < len(tokens) and tokens[pos][0] == 'charge':
+        magnitude = int(tokens[pos][1][1:])
+        pos += 1
+    if pos < len(tokens) and tokens[pos][0] == 'sign':
+        sign = 1 if tokens[pos][1] == '+' else -1
+        pos += 1
+        if magnitude is None and pos < len(tokens) and tokens[pos][0] == 'number':
+            magnitude = int(tokens[pos][1])
+            pos += 1
+        charge = sign * (1 if magnitude is None else magnitude)
+    elif magnitude is not None:
+        raise FormulaError(f"Charge without sign in formula {formula_str!r}")
+    if pos != len(tokens):
+        raise FormulaError(f"Unexpected {tokens[pos][1]!r} in formula {formula_str!r}")
+    return tuple(total.items()), charge
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse(formula_str: str) -> Formula:
+    """Parse a formula into an interned Formula"""
+    ordered, charge = _parse_ordered(formula_str)
+    formula = Formula(tuple(sorted(ordered)), charge)
+    if len(_interned) >= CACHE_SIZE:
+        _interned.clear()
+    return _interned.setdefault(formula, formula)
+
+def element_counts(formula_str: str) -> Dict[str, int]:
+    """Element counts as a dict in order of first appearance in the formula"""
+    return dict(_parse_ordered(formula_str)[0])
+
+@lru_cache(maxsize=CACHE_SIZE)
+def vector(formula_str: str) -> bytes:
+    """Element vector of a formula: packed int32 counts indexed by atomic number, then the charge
+
+    Vectors are immutable bytes, so comparing two formulas is a single memcmp.
+    """
+    parsed = parse(formula_str)
+    counts = array('i', EMPTY_VECTOR)
+    for element, count in parsed.counts:
+        z = ATOMIC_NUMBERS.get(element)
+        if z is None:
+            raise FormulaError(f"Unknown element {element!r} in formula {formula_str!r}")
+        counts[z] = count
+    counts[CHARGE_INDEX] = parsed.charge
+    return counts.tobytes()
+
+def mol_vector(mol) -> bytes:
+    """Element vector counted atom by atom from an RDKit Mol, including implicit hydrogens"""
+    counts = array('i', EMPTY_VECTOR)
+    for atom in mol.GetAtoms():
+        counts[atom.GetAtomicNum()] += 1
+        counts[1] += atom.GetTotalNumHs()
+        counts[CHARGE_INDEX] += atom.GetFormalCharge()
+    return counts.tobytes()
+
+def vector_counts(vec: bytes) -> Tuple[Dict[str, int], int]:
+    """Decode an element vector back into {symbol: count} and the charge"""
+    counts = array('i')
+    counts.frombytes(vec)
+    return {ELEMENT_SYMBOLS[z]: n for z, n in enumerate(counts[:CHARGE_INDEX]) if n}, counts[CHARGE_INDEX]
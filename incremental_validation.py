@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Helpers for incremental validation of src/data/molecules.js
+Finds which molecule entries changed since a base version and records run manifests. A run
+keeps a copy of the exact file contents it validated next to its manifest, so the next run
+diffs against that snapshot even when the file had uncommitted edits or was reverted since.
+A git ref can be given as the base instead; its version of the file is read with git show.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from molecule_reader import parse_molecule_line
+
+DEFAULT_MANIFEST_PATH = os.path.join('.cache', 'validation_manifest.json')
+
+def git(path: str, *args: str) -> Optional[str]:
+    """Run git in the directory containing path, return stdout or None on failure"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        proc = subprocess.run(['git', '-C', directory, *args], capture_output=True, text=True,
+                              encoding='utf-8', check=False)
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+def head_commit(path: str) -> Optional[str]:
+    """Commit currently checked out in the repository holding path"""
+    out = git(path, 'rev-parse', 'HEAD')
+    return out.strip() if out else None
+
+def ref_text(path: str, ref: str) -> Optional[str]:
+    """Contents of path at a git ref, or None if git cannot answer (not a repository, unknown ref, path missing)"""
+    return git(path, 'show', f"{ref}:./{os.path.basename(path)}")
+
+def content_hash(text: str) -> str:
+    """SHA-256 of file contents, recorded in the manifest to check its snapshot"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def snapshot_path(manifest_path: str) -> str:
+    """Where the contents validated by a run are kept, next to its manifest"""
+    return os.path.splitext(manifest_path)[0] + '.snapshot'
+
+def read_snapshot(manifest: Dict) -> Optional[str]:
+    """Contents validated by the run that wrote manifest, or None if missing or not matching its hash"""
+    try:
+        with open(manifest['snapshot'], encoding='utf-8', newline='') as f:
+            text = f.read()
+    except (KeyError, TypeError, OSError):
+        return None
+    return text if content_hash(text) == manifest.get('sha256') else None
+
+def molecule_names(lines: Iterable[str]) -> Set[str]:
+    """Names of the molecule entries among lines of molecules.js"""
+    names = set()
+    for line in lines:
+        molecule = parse_molecule_line(line)
+        if molecule:
+            names.add(molecule['name'])
+    return names
+
+def changed_molecules(old: str, new: str) -> Tuple[Set[str], Set[str]]:
+    """Names of molecule entries added/edited and removed between two versions of molecules.js
+
+    Each entry is one line, so entries whose line occurs in only one version are
+    the ones a line diff reports; moved and unchanged entries are skipped.
+    """
+    old_lines, new_lines = Counter(old.splitlines()), Counter(new.splitlines())
+    added = molecule_names(new_lines - old_lines)
+    deleted = molecule_names(old_lines - new_lines)
+    # An edited row shows up on both sides; only names gone from the file are removals
+    return added | deleted, deleted - added
+
+def read_manifest(path: str = DEFAULT_MANIFEST_PATH) -> Dict:
+    """Load the manifest recorded by the previous run, or an empty one"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_manifest(source: str, output: str, text: str, clean: bool, path: str = DEFAULT_MANIFEST_PATH):
+    """Record the contents a run validated and whether its report was empty, as the base of the next run
+
+    A clean run writes no report file, so 'clean' rather than the file's
+    existence tells the next run that the previous report had no errors.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    snapshot = snapshot_path(path)
+    with open(snapshot + '.tmp', 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(snapshot + '.tmp', snapshot)
+    manifest = {
+        'commit': head_commit(source),
+        'sha256': content_hash(text),
+        'snapshot': os.path.abspath(snapshot),
+        'source': os.path.abspath(source),
+        'output': os.path.abspath(output),
+        'clean': clean,
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Worker pool with per-item time and memory budgets
+Runs a function over items in separate, recyclable worker processes. Each item gets a
+wall-clock deadline, and each worker gets an address-space limit derived from an RSS cap.
+It is restarted when it exceeds the cap between items or after a fixed number of items.
+An item that overruns its deadline, exhausts memory or crashes its worker is replaced by
+a TIMEOUT, RESOURCE_LIMIT or WORKER_CRASH result; the item's worker is replaced and the
+rest of the run goes on. Results come back in submission order.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not on Windows; the RSS cap is then only checked between items
+    resource = None
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_MEMORY_MB = 2048
+DEFAULT_MAX_TASKS = 10000
+
+# Jobs queued per worker beyond the one it is running, bounding memory like the other pools
+IN_FLIGHT_PER_WORKER = 4
+
+# Workers send finished results at most this often, instead of one message per item
+FLUSH_INTERVAL = 0.05
+
+# Address space a worker may always grow by, even when it starts close to the RSS cap
+MIN_HEADROOM = 64 * 1024 * 1024
+
+TIMEOUT = 'TIMEOUT'
+RESOURCE_LIMIT = 'RESOURCE_LIMIT'
+WORKER_CRASH = 'WORKER_CRASH'
+
+class Limits(NamedTuple):
+    """Budgets of an isolated run: seconds per item, RSS cap per worker (MB, None for none), items per worker"""
+    timeout: float = DEFAULT_TIMEOUT
+    max_memory: Optional[int] = DEFAULT_MAX_MEMORY_MB
+    max_tasks: int = DEFAULT_MAX_TASKS
+
+def memory_usage() -> Tuple[int, int]:
+    """(resident, virtual) size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            size, resident = f.read().split()[:2]
+        page = os.sysconf('SC_PAGE_SIZE')
+        return int(resident) * page, int(size) * page
+    except (OSError, ValueError):
+        if resource is None:
+            return 0, 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return peak, 0
+
+def worker_main(conn, task: Callable, max_memory: Optional[int], max_tasks: int, started):
+    """Run task over (items, flush interval) jobs received on conn
+
+    Messages are ('ok', [results]) for consecutive items, sent before starting
+    an item once the flush interval has passed, and ('limit', kind, detail).
+    The time each item starts is written to the shared value started, so the
+    parent can time the item without waiting for its results.
+    The worker exits after a MemoryError, once its RSS passes the cap, or after
+    max_tasks items, and the parent starts a fresh one.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cap = max_memory * 1024 * 1024 if max_memory else None
+    if cap and resource is not None:
+        rss, vm = memory_usage()
+        if vm:
+            limit = vm + max(cap - rss, MIN_HEADROOM)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    done = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        items, flush_interval = job
+        results = []
+        flushed = time.monotonic()
+        for item in items:
+            if results and time.monotonic() - flushed >= flush_interval:
+                conn.send(('ok', results))
+                results = []
+                flushed = time.monotonic()
+            started.value = time.monotonic()
+            try:
+                results.append(task(item))
+            except MemoryError:
+                if results:
+                    conn.send(('ok', results))
+                conn.send(('limit', RESOURCE_LIMIT, f"worker memory cap of {max_memory} MB reached"))
+                os._exit(0)
+            done += 1
+            if done >= max_tasks or (cap and memory_usage()[0] > cap):
+                conn.send(('ok', results))
+                os._exit(0)
+        conn.send(('ok', results))
+
+class Job:
+    """Items of one submission and the results collected for them so far
+
+    A careful job has its worker report every item as soon as it finishes, so
+    a timeout or crash can be pinned on the exact item.
+    """
+    __slots__ = ('tag', 'items', 'results', 'careful')
+
+    def __init__(self, tag: Any, items: List):
+        self.tag = tag
+        self.items = items
+        self.results: List = []
+        self.careful = False
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) == len(self.items)
+
+class Slot:
+    """One worker process, the job it is running and when its current item started
+
+    time.monotonic() reads a system-wide clock, so the worker's start times
+    compare with the parent's.
+    """
+    __slots__ = ('process', 'conn', 'job', 'started')
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.job: Optional[Job] = None
+        self.started = None
+
+class IsolatedPool:
+    """Map task over items in isolated workers; on_limit(item, kind, detail) builds the result of a failed item"""
+
+    def __init__(self, task: Callable, on_limit: Callable, workers: int = 1, limits: Limits = Limits()):
+        # Results reach the parent up to FLUSH_INTERVAL after they are done
+        if limits.timeout <= FLUSH_INTERVAL:
+            raise ValueError(f"timeout must be longer than {FLUSH_INTERVAL:g} s")
+        self.task = task
+        self.on_limit = on_limit
+        self.limits = limits
+        self.slots = [Slot() for _ in range(max(1, workers))]
+        methods = multiprocessing.get_all_start_methods()
+        # Forked workers start with RDKit already imported
+        self._context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self.counts = {TIMEOUT: 0, RESOURCE_LIMIT: 0, WORKER_CRASH: 0, 'restarts': 0, 'retries': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for slot in self.slots:
+            if slot.process is None:
+                continue
+            if slot.job is None and slot.process.is_alive():
+                try:
+                    slot.conn.send(None)
+                except OSError:
+                    pass
+                slot.process.join(1)
+            self._stop(slot)
+
+    def _start(self, slot: Slot):
+        parent, child = self._context.Pipe()
+        slot.started = self._context.RawValue('d', time.monotonic())
+        slot.process = self._context.Process(target=worker_main, daemon=True,
+                                             args=(child, self.task, self.limits.max_memory, self.limits.max_tasks,
+                                                   slot.started))
+        slot.process.start()
+        child.close()
+        slot.conn = parent
+
+    def _stop(self, slot: Slot):
+        if slot.process.is_alive():
+            slot.process.kill()
+        slot.process.join()
+        slot.conn.close()
+        slot.process = slot.conn = None
+
+    def _assign(self, slot: Slot, job: Job):
+        """Send the job's remaining items to the slot's worker, starting one if needed"""
+        if slot.process is not None and not slot.process.is_alive():
+            self._stop(slot)
+        for _ in range(2):
+            if slot.process is None:
+                self._start(slot)
+                self.counts['restarts'] += 1
+            try:
+                slot.conn.send((job.items[len(job.results):], 0.0 if job.careful else FLUSH_INTERVAL))
+                break
+            except OSError:
+                # The worker recycled itself right after its previous job
+                self._stop(slot)
+        slot.job = job
+        # Until the worker starts the first item, time it from now
+        slot.started.value = time.monotonic()
+
+    def _fail(self, slot: Slot, kind: str, detail: str, requeue: Deque[Job]):
+        """Drop the slot's worker after a timeout or crash and requeue the rest of its job
+
+        The failed item is known when the job was careful or only one item was
+        left. Otherwise the worker may have finished items it had not reported
+        yet, so the rest of the job is retried carefully first.
+        """
+        job = slot.job
+        if job.careful or len(job.items) - len(job.results) == 1:
+            job.results.append(self.on_limit(job.items[len(job.results)], kind, detail))
+            job.careful = False
+            self.counts[kind] += 1
+        else:
+            job.careful = True
+            self.counts['retries'] += 1
+        self._stop(slot)
+        self._release(slot, requeue)
+
+    def _release(self, slot: Slot, requeue: Deque[Job]):
+        if slot.job is not None and not slot.job.done:
+            requeue.appendleft(slot.job)
+        slot.job = None
+
+    def _receive(self, slot: Slot, requeue: Deque[Job]):
+        job = slot.job
+        try:
+            message = slot.conn.recv()
+        except (EOFError, OSError):
+            slot.process.join(5)
+            code = slot.process.exitcode
+            if code == 0:
+                # Recycled after its last result; the rest of the job goes to a fresh worker
+                self._stop(slot)
+                self._release(slot, requeue)
+            elif code == -signal.SIGKILL:
+                self._fail(slot, RESOURCE_LIMIT, "worker was killed, most likely out of memory", requeue)
+            else:
+                reason = signal.Signals(-code).name if code and code < 0 else f"exit status {code}"
+                self._fail(slot, WORKER_CRASH, f"worker died ({reason})", requeue)
+            return
+        if message[0] == 'ok':
+            job.results.extend(message[1])
+        else:
+            job.results.append(self.on_limit(job.items[len(job.results)], message[1], message[2]))
+            self.counts[message[1]] += 1
+        if job.done:
+            slot.job = None
+
+    def imap(self, jobs: Iterable[Tuple[Any, List]]) -> Iterator[Tuple[Any, List]]:
+        """Yield (tag, results) for every (tag, items) job, in submission order"""
+        jobs = iter(jobs)
+        pending: Deque[Job] = deque()
+        queued: Deque[Job] = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < len(self.slots) * IN_FLIGHT_PER_WORKER:
+                try:
+                    tag, items = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                job = Job(tag, list(items))
+                pending.append(job)
+                if job.items:
+                    queued.append(job)
+            for slot in self.slots:
+                if slot.job is None and queued:
+                    self._assign(slot, queued.popleft())
+            while pending and pending[0].done:
+                job = pending.popleft()
+                yield job.tag, job.results
+            busy = [slot for slot in self.slots if slot.job is not None]
+            if not busy:
+                if exhausted and not pending:
+                    return
+                continue
+            deadline = min(slot.started.value for slot in busy) + self.limits.timeout
+            ready = wait([slot.conn for slot in busy], max(0.0, deadline - time.monotonic()))
+            for slot in busy:
+                if slot.conn in ready:
+                    self._receive(slot, queued)
+                elif time.monotonic() >= slot.started.value + self.limits.timeout:
+                    self._fail(slot, TIMEOUT, f"no result within {self.limits.timeout:g} s", queued)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Prebuilt 3D conformers for the molecule catalogue
+Embeds several ETKDG conformers per molecule that passes validation with RDKit's
+multi-threaded embedder,
+optimises them with MMFF (UFF where MMFF has no parameters) and keeps the lowest-energy
+one. Molecules are spread over a process pool. Coordinates go to one float32 binary
+file with a JSON offset index, so the site can fetch a molecule with a single range
+read. Molecules whose SMILES did not change since the previous index are copied over
+instead of being embedded again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from rdkit import Chem, rdBase
+from rdkit.Chem import AllChem, rdDistGeom
+
+from molecule_reader import FORMATS, iter_molecules
+from validate_all_smiles import (DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, IN_FLIGHT_PER_WORKER, chunked,
+                                 invalid_molecules)
+from validate_smiles import smiles_to_mol
+from validation_cache import DEFAULT_CACHE_PATH
+
+DEFAULT_OUTPUT_DIR = os.path.join('public', 'data')
+INDEX_NAME = 'conformers.json'
+STORE_NAME = 'conformers.bin'
+
+# Changing any option invalidates every stored conformer
+CONFORMER_OPTIONS = {
+    'conformers': 4,
+    'seed': 0xf00d,
+    'max_iters': 500,
+    'hydrogens': True,
+}
+
+# Little-endian record of one molecule with n atoms and b bonds, padded to 4 bytes so
+# every record starts where a Float32Array can view it
+RECORD_LAYOUT = "float32 xyz[n*3], uint16 bond_atoms[b*2], uint8 atomic_numbers[n], uint8 bond_orders[b]"
+
+# Bond order codes in the store; anything else (dative, zero-order) is 0
+BOND_CODES = {
+    Chem.BondType.SINGLE: 1,
+    Chem.BondType.DOUBLE: 2,
+    Chem.BondType.TRIPLE: 3,
+    Chem.BondType.AROMATIC: 4,
+}
+
+def default_threads(workers: int) -> int:
+    """Threads per worker process that together use every core once"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def conformer_key(smiles: str) -> str:
+    """Hash of the inputs that determine a conformer"""
+    text = json.dumps([smiles, CONFORMER_OPTIONS, rdBase.rdkitVersion], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:20]
+
+def encode_record(mol, conf_id: int) -> bytes:
+    """Pack one conformer of mol in RECORD_LAYOUT"""
+    xyz = mol.GetConformer(conf_id).GetPositions().astype('<f4')
+    bonds = [(b.GetBeginAtomIdx(), b.GetEndAtomIdx(), BOND_CODES.get(b.GetBondType(), 0)) for b in mol.GetBonds()]
+    pairs = np.array([(a, b) for a, b, _ in bonds], dtype='<u2').reshape(-1, 2)
+    elements = np.array([a.GetAtomicNum() for a in mol.GetAtoms()], dtype='u1')
+    orders = np.array([code for _, _, code in bonds], dtype='u1')
+    record = xyz.tobytes() + pairs.tobytes() + elements.tobytes() + orders.tobytes()
+    return record + b'\0' * (-len(record) % 4)
+
+def optimise(mol, threads: int) -> Tuple[List[Optional[float]], str]:
+    """Optimise every conformer in place; return their energies and the force field used"""
+    max_iters = CONFORMER_OPTIONS['max_iters']
+    if AllChem.MMFFHasAllMoleculeParams(mol):
+        results = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=threads, maxIters=max_iters)
+        return [energy for _, energy in results], 'mmff'
+    if AllChem.UFFHasAllMoleculeParams(mol):
+        results = AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=threads, maxIters=max_iters)
+        return [energy for _, energy in results], 'uff'
+    # Metal centres such as B12's cobalt: keep the distance-geometry coordinates
+    return [None] * mol.GetNumConformers(), 'none'
+
+def embed(smiles: str, threads: int = 0) -> Tuple[Optional[bytes], Optional[Dict], Optional[str]]:
+    """Return (record, index entry, error) for the lowest-energy conformer of one SMILES"""
+    mol, error = smiles_to_mol(smiles)
+    if error:
+        return None, None, error
+    if CONFORMER_OPTIONS['hydrogens']:
+        mol = Chem.AddHs(mol)
+    params = rdDistGeom.ETKDGv3()
+    params.randomSeed = CONFORMER_OPTIONS['seed']
+    params.numThreads = threads
+    with rdBase.BlockLogs():
+        conf_ids = list(rdDistGeom.EmbedMultipleConfs(mol, CONFORMER_OPTIONS['conformers'], params))
+        if not conf_ids:
+            # Strained or crowded structures often only embed from random starting coordinates
+            params.useRandomCoords = True
+            conf_ids = list(rdDistGeom.EmbedMultipleConfs(mol, CONFORMER_OPTIONS['conformers'], params))
+        if not conf_ids:
+            return None, None, "3D embedding failed"
+        energies, force_field = optimise(mol, threads)
+    best = min(range(len(conf_ids)), key=lambda i: energies[i] if energies[i] is not None else 0.0)
+    record = encode_record(mol, conf_ids[best])
+    entry = {
+        'atoms': mol.GetNumAtoms(),
+        'bonds': mol.GetNumBonds(),
+        'force_field': force_field,
+        'energy': round(energies[best], 3) if energies[best] is not None else None,
+    }
+    return record, entry, None
+
+def embed_chunk(items: List[Tuple[str, str]], threads: int = 0) -> List[Tuple[str, Optional[bytes], Optional[Dict],
+                                                                              Optional[str]]]:
+    """Embed a chunk of (key, smiles) pairs in a worker process"""
+    return [(key, *embed(smiles, threads)) for key, smiles in items]
+
+def iter_conformers(items: Iterable[Tuple[str, str]], workers: int = 1, threads: int = 0,
+                    chunk_size: int = 8) -> Iterator[Tuple[str, Optional[bytes], Optional[Dict], Optional[str]]]:
+    """Yield (key, record, entry, error) for every (key, smiles) pair, serially or across a process pool"""
+    if workers <= 1:
+        for chunk in chunked(items, chunk_size):
+            yield from embed_chunk(chunk, threads)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(items, chunk_size):
+            pending.append(executor.submit(embed_chunk, chunk, threads))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def load_index(output_dir: str) -> Dict:
+    """Previous index, or an empty one"""
+    try:
+        with open(os.path.join(output_dir, INDEX_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def read_records(path: str, entries: Iterable[Dict]) -> Dict[str, bytes]:
+    """Records of the previous store by key; entries that lie outside the file are skipped"""
+    records = {}
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return records
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        for entry in entries:
+            if entry['key'] in records or entry['offset'] + entry['length'] > size:
+                continue
+            f.seek(entry['offset'])
+            records[entry['key']] = f.read(entry['length'])
+    return records
+
+def build_conformers(molecules: Iterable[Dict], output_dir: str = DEFAULT_OUTPUT_DIR, workers: int = 1,
+                     threads: Optional[int] = None, chunk_size: int = 8,
+                     cache_path: Optional[str] = DEFAULT_CACHE_PATH) -> Dict:
+    """Embed every valid molecule, reusing unchanged records of the previous store, and write the store and its index
+
+    threads is per worker process and defaults to default_threads(workers).
+    """
+    if threads is None:
+        threads = default_threads(workers)
+    molecules = list(molecules)
+    invalid = invalid_molecules(molecules, workers, DEFAULT_CHUNK_SIZE, cache_path)
+    os.makedirs(output_dir, exist_ok=True)
+    store_path = os.path.join(output_dir, STORE_NAME)
+    previous = load_index(output_dir)
+    reusable = previous.get('molecules', {}).values() if previous.get('version') == 1 else ()
+    old_entries = {entry['key']: entry for entry in reusable}
+    old_records = read_records(store_path, old_entries.values())
+
+    names = {}
+    todo = {}
+    for molecule in (m for k, m in enumerate(molecules) if k not in invalid):
+        key = conformer_key(molecule['smiles'])
+        names[molecule['name']] = key
+        if key not in old_records:
+            todo.setdefault(key, molecule['smiles'])
+
+    records = {}
+    entries = {}
+    errors = {}
+    for key, record, entry, error in iter_conformers(todo.items(), workers, threads, chunk_size):
+        if error:
+            errors[key] = error
+        else:
+            records[key] = record
+            entries[key] = entry
+
+    # Rewrite the store with only the records still referenced, in catalogue order
+    molecules_index = {}
+    failed = {}
+    offsets = {}
+    offset = 0
+    with open(store_path + '.tmp', 'wb') as f:
+        for name, key in names.items():
+            if key in errors:
+                failed[name] = errors[key]
+                continue
+            record = records[key] if key in records else old_records[key]
+            if key not in offsets:
+                f.write(record)
+                offsets[key] = offset
+                offset += len(record)
+            entry = entries[key] if key in entries else old_entries[key]
+            molecules_index[name] = {**entry, 'key': key, 'offset': offsets[key], 'length': len(record)}
+    os.replace(store_path + '.tmp', store_path)
+
+    index = {
+        'version': 1,
+        'options': CONFORMER_OPTIONS,
+        'rdkit': rdBase.rdkitVersion,
+        'store': STORE_NAME,
+        'layout': RECORD_LAYOUT,
+        'molecules': molecules_index,
+        'failed': failed,
+    }
+    index_path = os.path.join(output_dir, INDEX_NAME)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(index_path + '.tmp', index_path)
+
+    return {
+        'molecules': len(molecules),
+        'excluded': {molecules[k]['name']: error for k, error in sorted(invalid.items())},
+        'embedded': len(records),
+        'reused': sum(1 for key in names.values() if key in old_records),
+        'failed': len(failed),
+        'bytes': offset,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Generate 3D conformers and a binary coordinate store for the website")
+    parser.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                        help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                             "(default: src/data/molecules.js)")
+    parser.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"directory for {STORE_NAME} and {INDEX_NAME} (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--threads', type=int,
+                        help="embedding/optimisation threads per worker (default: cores divided by --workers)")
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help=f"validation result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--no-cache', action='store_true', help="validate every molecule from scratch")
+    args = parser.parse_args(argv)
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+
+    stats = build_conformers(iter_molecules(args.input, args.format), args.output_dir, args.workers,
+                             args.threads, args.chunk_size, None if args.no_cache else args.cache)
+    print(f"Conformers: {stats['molecules']} molecules, {len(stats['excluded'])} invalid, {stats['embedded']} "
+          f"embedded, {stats['reused']} reused, {stats['failed']} failed, {stats['bytes']} bytes")
+    for name, error in stats['excluded'].items():
+        print(f"  not embedded: {name}: {error}")
+    print(f"Index: {os.path.join(args.output_dir, INDEX_NAME)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection for the molecule catalogue
+Computes the canonical SMILES and standard InChIKey of every molecule once and groups
+entries in hash indexes, in a single pass, into:
+  exact     same canonical isomeric SMILES
+  tautomer  same standard InChIKey (mobile-H normalised) but different canonical SMILES
+  stereo    same InChI apart from its stereo and isotope layers, but different InChIKey
+Optionally writes a collapsed catalogue that keeps the first entry of each group.
+"""
+
+import argparse
+import csv
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rdkit import Chem, rdBase
+
+from molecule_reader import FORMATS, Row, iter_rows, iter_text_rows
+from validate_all_smiles import (DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, IN_FLIGHT_PER_WORKER, chunked,
+                                 molecules_data, validate_smiles)
+
+LEVELS = ('exact', 'tautomer', 'stereo')
+
+# InChI layers of stereochemistry (b, t, m, s) and isotopes (i); they come after all others
+STEREO_ISOTOPE_LAYERS = ('b', 't', 'm', 's', 'i')
+
+# Identity of a molecule: (canonical SMILES, InChIKey or None, skeleton InChI or None),
+# or None if RDKit cannot parse it
+Identity = Optional[Tuple[str, Optional[str], Optional[str]]]
+
+def skeleton(inchi: str) -> str:
+    """InChI without its stereo and isotope layers; charge and protonation layers are kept"""
+    layers = inchi.split('/')
+    for n in range(2, len(layers)):
+        if layers[n][:1] in STEREO_ISOTOPE_LAYERS:
+            return '/'.join(layers[:n])
+    return inchi
+
+def mol_identity(mol) -> Tuple[str, Optional[str], Optional[str]]:
+    """Canonical isomeric SMILES, standard InChIKey and skeleton InChI of a parsed molecule
+
+    Key and skeleton are None when InChI cannot represent the molecule (wildcard atoms).
+    """
+    inchi = Chem.MolToInchi(mol)
+    if not inchi:
+        return Chem.MolToSmiles(mol), None, None
+    return Chem.MolToSmiles(mol), Chem.InchiToInchiKey(inchi), skeleton(inchi)
+
+def smiles_identity(smiles: str) -> Identity:
+    """Identity of a SMILES, with InChI warnings silenced"""
+    mol, error = validate_smiles(smiles)
+    if error:
+        return None
+    # BlockLogs restores the previous log levels; EnableLog would switch on debug and info too
+    with rdBase.BlockLogs():
+        return mol_identity(mol)
+
+def identity_chunk(smiles: List[str]) -> List[Identity]:
+    """Identities of a chunk of SMILES in a worker process"""
+    return [smiles_identity(s) for s in smiles]
+
+def iter_identities(rows: Iterable[Row], workers: int = 1,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Row, Identity]]:
+    """Yield (row, identity) in input order; each distinct SMILES is identified once"""
+    known: Dict[str, Identity] = {}
+
+    def resolve(chunk: List[Row], computed: List[Identity], todo: List[str]) -> Iterator[Tuple[Row, Identity]]:
+        known.update(zip(todo, computed))
+        for row in chunk:
+            yield row, known[row[3]]
+
+    def split(chunk: List[Row]) -> List[str]:
+        return list(dict.fromkeys(row[3] for row in chunk if row[3] not in known))
+
+    if workers <= 1:
+        for chunk in chunked(rows, chunk_size):
+            todo = split(chunk)
+            yield from resolve(chunk, identity_chunk(todo), todo)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(rows, chunk_size):
+            # SMILES already in flight in an earlier chunk are resolved when that chunk is
+            todo = split(chunk)
+            for s in todo:
+                known[s] = None
+            pending.append((chunk, todo, executor.submit(identity_chunk, todo)))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                chunk, todo, future = pending.popleft()
+                yield from resolve(chunk, future.result(), todo)
+        while pending:
+            chunk, todo, future = pending.popleft()
+            yield from resolve(chunk, future.result(), todo)
+
+class DuplicateIndex:
+    """Hash indexes of catalogue entries by canonical SMILES, InChIKey and skeleton InChI"""
+
+    def __init__(self):
+        self.entries: List[Dict] = []
+        self.unparseable: List[str] = []
+        self.by_smiles: Dict[str, List[int]] = {}
+        self.by_key: Dict[str, List[int]] = {}
+        self.by_skeleton: Dict[str, List[int]] = {}
+
+    def add(self, row: Row, identity: Identity):
+        _, name, formula, smiles = row
+        i = len(self.entries)
+        if identity is None:
+            # Kept so a collapsed catalogue still contains them, but never grouped
+            self.entries.append({'name': name, 'formula': formula, 'smiles': smiles})
+            self.unparseable.append(name)
+            return
+        canonical, key, stereo_free = identity
+        self.entries.append({'name': name, 'formula': formula, 'smiles': smiles,
+                             'canonical_smiles': canonical, 'inchikey': key})
+        self.by_smiles.setdefault(canonical, []).append(i)
+        if key is None:
+            # Without an InChIKey only exact duplicates can be told apart
+            return
+        self.by_key.setdefault(key, []).append(i)
+        self.by_skeleton.setdefault(stereo_free, []).append(i)
+
+    def groups(self, kind: str) -> List[List[int]]:
+        """Entry indices of each duplicate group of one kind, in catalogue order
+
+        Tautomer and stereo groups only include entries that are not already
+        duplicates at a stricter level, with one representative per stricter group.
+        """
+        if kind == 'exact':
+            return [members for members in self.by_smiles.values() if len(members) > 1]
+        if kind == 'tautomer':
+            index, stricter = self.by_key, 'canonical_smiles'
+        elif kind == 'stereo':
+            index, stricter = self.by_skeleton, 'inchikey'
+        else:
+            raise ValueError(f"Unknown duplicate kind {kind!r}")
+        found = []
+        for members in index.values():
+            representatives = {}
+            for i in members:
+                representatives.setdefault(self.entries[i][stricter], i)
+            if len(representatives) > 1:
+                found.append(list(representatives.values()))
+        return found
+
+    def report(self) -> Dict:
+        """Duplicate groups of every kind, with the fields needed to review them"""
+        report = {'molecules': len(self.entries), 'unparseable': self.unparseable}
+        for kind in LEVELS:
+            report[kind] = [[self.entries[i] for i in members] for members in self.groups(kind)]
+        return report
+
+    def collapsed(self, level: str = 'exact') -> Tuple[List[Dict], Dict[str, str]]:
+        """Entries left after collapsing duplicates up to level, and a map of dropped name -> kept name"""
+        indexes = {'exact': self.by_smiles, 'tautomer': self.by_key, 'stereo': self.by_skeleton}
+        dropped = {}
+        # Stricter levels first: entries without an InChIKey are only in the exact index
+        for kind in LEVELS[:LEVELS.index(level) + 1]:
+            for members in indexes[kind].values():
+                left = [i for i in members if i not in dropped]
+                for i in left[1:]:
+                    dropped[i] = left[0]
+        for i, keep in dropped.items():
+            while keep in dropped:
+                keep = dropped[keep]
+            dropped[i] = keep
+        kept = [entry for i, entry in enumerate(self.entries) if i not in dropped]
+        return kept, {self.entries[i]['name']: self.entries[keep]['name'] for i, keep in dropped.items()}
+
+def find_duplicates(rows: Iterable[Row], workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    identities: Optional[Iterable[Tuple[Row, Identity]]] = None) -> DuplicateIndex:
+    """Identify every row and index it in one pass
+
+    identities, if given, are iter_identities results computed already, and rows is ignored.
+    """
+    index = DuplicateIndex()
+    for row, identity in identities if identities is not None else iter_identities(rows, workers, chunk_size):
+        index.add(row, identity)
+    return index
+
+def write_collapsed(entries: List[Dict], path: str):
+    """Write name,formula,smiles rows as CSV"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('name', 'formula', 'smiles'))
+        for entry in entries:
+            writer.writerow((entry['name'], entry['formula'], entry['smiles']))
+
+def print_summary(index: DuplicateIndex):
+    """Print the duplicate groups of every kind"""
+    for kind in LEVELS:
+        groups = index.groups(kind)
+        print(f"{kind.capitalize()} duplicates: {len(groups)} groups")
+        for members in groups:
+            print(f"  {' / '.join(index.entries[i]['name'] for i in members)}")
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Find duplicate molecules by canonical SMILES and InChIKey")
+    parser.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                        help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                             "(default: src/data/molecules.js); 'embedded' uses validate_all_smiles' rows")
+    parser.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    parser.add_argument('--output', default='duplicates.json', help="duplicate report (default: duplicates.json)")
+    parser.add_argument('--collapse', metavar='CSV', help="write the catalogue with duplicates removed")
+    parser.add_argument('--level', choices=LEVELS, default='exact',
+                        help="loosest kind of duplicate merged by --collapse; 'stereo' also merges "
+                             "distinct stereoisomers such as Glukose/Galaktose (default: exact)")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    rows = iter_text_rows(molecules_data) if args.input == 'embedded' else iter_rows(args.input, args.format)
+    index = find_duplicates(rows, args.workers, args.chunk_size)
+    print_summary(index)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(index.report(), f, indent=2, ensure_ascii=False)
+    print(f"Duplicate report saved to: {args.output}")
+    if args.collapse:
+        kept, merged = index.collapsed(args.level)
+        write_collapsed(kept, args.collapse)
+        print(f"Collapsed {len(merged)} duplicates ({len(kept)} molecules left): {args.collapse}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Prebuilt 2D depictions for the molecule catalogue
+Generates 2D coordinates, a molblock and an SVG for every molecule that passes
+validation, across a process pool, and writes content-hashed files plus a manifest so
+the site can show structures without loading RDKit WASM. Molecules whose SMILES did
+not change since the previous manifest are not regenerated.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rdkit import Chem, rdBase
+from rdkit.Chem import rdDepictor
+from rdkit.Chem.Draw import rdMolDraw2D
+
+from molecule_reader import FORMATS, iter_molecules
+from validate_all_smiles import (DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, IN_FLIGHT_PER_WORKER, chunked,
+                                 invalid_molecules)
+from validate_smiles import smiles_to_mol
+from validation_cache import DEFAULT_CACHE_PATH
+
+DEFAULT_OUTPUT_DIR = os.path.join('public', 'data', 'depictions')
+MANIFEST_NAME = 'manifest.json'
+
+# File names content_name gives depictions, the only ones pruning may delete
+DEPICTION_FILE = re.compile(r'[0-9a-f]{16}\.(?:svg|mol)')
+
+# Changing any option invalidates every cached depiction
+DEPICTION_OPTIONS = {
+    'width': 300,
+    'height': 300,
+    'coord_gen': 'coordgen',
+    'transparent': True,
+}
+
+def depiction_key(smiles: str) -> str:
+    """Hash of the inputs that determine a depiction"""
+    text = json.dumps([smiles, DEPICTION_OPTIONS, rdBase.rdkitVersion], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:20]
+
+def content_name(content: str, suffix: str) -> str:
+    """Content-addressed file name for long-lived caching"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16] + suffix
+
+def depict(smiles: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return (molblock, svg, error) for one SMILES"""
+    mol, error = smiles_to_mol(smiles)
+    if error:
+        return None, None, error
+    rdDepictor.SetPreferCoordGen(DEPICTION_OPTIONS['coord_gen'] == 'coordgen')
+    rdDepictor.Compute2DCoords(mol)
+    molblock = Chem.MolToMolBlock(mol)
+    drawer = rdMolDraw2D.MolDraw2DSVG(DEPICTION_OPTIONS['width'], DEPICTION_OPTIONS['height'])
+    if DEPICTION_OPTIONS['transparent']:
+        drawer.drawOptions().clearBackground = False
+    rdMolDraw2D.PrepareAndDrawMolecule(drawer, mol)
+    drawer.FinishDrawing()
+    return molblock, drawer.GetDrawingText(), None
+
+def depict_chunk(items: List[Tuple[str, str]]) -> List[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """Depict a chunk of (key, smiles) pairs in a worker process"""
+    return [(key, *depict(smiles)) for key, smiles in items]
+
+def iter_depictions(items: Iterable[Tuple[str, str]], workers: int = 1,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """Yield (key, molblock, svg, error) for every (key, smiles) pair, serially or across a process pool"""
+    if workers <= 1:
+        for chunk in chunked(items, chunk_size):
+            yield from depict_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(items, chunk_size):
+            pending.append(executor.submit(depict_chunk, chunk))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def load_manifest(output_dir: str) -> Dict:
+    """Previous manifest, or an empty one"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_file(output_dir: str, name: str, content: str):
+    """Write a content-named file through a temporary file, so an interrupted run leaves no partial file"""
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+def build_depictions(molecules: Iterable[Dict], output_dir: str = DEFAULT_OUTPUT_DIR, workers: int = 1,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                     prune: bool = True) -> Dict:
+    """Depict every valid molecule, reusing unchanged entries of the previous manifest, and write the new manifest"""
+    molecules = list(molecules)
+    invalid = invalid_molecules(molecules, workers, chunk_size, cache_path)
+    os.makedirs(output_dir, exist_ok=True)
+    previous = {entry['key']: entry for entry in load_manifest(output_dir).get('molecules', {}).values()
+                if all(os.path.exists(os.path.join(output_dir, entry[f])) for f in ('svg', 'molblock'))}
+
+    names = {}
+    todo = {}
+    for molecule in (m for k, m in enumerate(molecules) if k not in invalid):
+        key = depiction_key(molecule['smiles'])
+        names[molecule['name']] = key
+        if key not in previous:
+            todo.setdefault(key, molecule['smiles'])
+
+    generated = {}
+    errors = {}
+    for key, molblock, svg, error in iter_depictions(todo.items(), workers, chunk_size):
+        if error:
+            errors[key] = error
+            continue
+        entry = {'key': key, 'svg': content_name(svg, '.svg'), 'molblock': content_name(molblock, '.mol')}
+        write_file(output_dir, entry['svg'], svg)
+        write_file(output_dir, entry['molblock'], molblock)
+        generated[key] = entry
+
+    entries = {}
+    failed = {}
+    for name, key in names.items():
+        if key in errors:
+            failed[name] = errors[key]
+        else:
+            entries[name] = previous.get(key) or generated[key]
+
+    manifest = {
+        'version': 1,
+        'options': DEPICTION_OPTIONS,
+        'rdkit': rdBase.rdkitVersion,
+        'molecules': entries,
+        'failed': failed,
+    }
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+    removed = 0
+    if prune:
+        referenced = {entry[f] for entry in entries.values() for f in ('svg', 'molblock')}
+        for file_name in os.listdir(output_dir):
+            if DEPICTION_FILE.fullmatch(file_name) and file_name not in referenced:
+                os.remove(os.path.join(output_dir, file_name))
+                removed += 1
+
+    return {
+        'molecules': len(molecules),
+        'excluded': {molecules[k]['name']: error for k, error in sorted(invalid.items())},
+        'generated': len(generated),
+        'reused': sum(1 for key in names.values() if key in previous),
+        'failed': len(failed),
+        'removed_files': removed,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Generate 2D depictions and a manifest for the website")
+    parser.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                        help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                             "(default: src/data/molecules.js)")
+    parser.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"directory for SVG/molblock files and {MANIFEST_NAME} (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=32)
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help=f"validation result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--no-cache', action='store_true', help="validate every molecule from scratch")
+    parser.add_argument('--keep-stale', action='store_true', help="do not delete files no longer in the manifest")
+    args = parser.parse_args(argv)
+
+    stats = build_depictions(iter_molecules(args.input, args.format), args.output_dir, args.workers,
+                             args.chunk_size, None if args.no_cache else args.cache, prune=not args.keep_stale)
+    print(f"Depictions: {stats['molecules']} molecules, {len(stats['excluded'])} invalid, {stats['generated']} "
+          f"generated, {stats['reused']} reused, {stats['failed']} failed, {stats['removed_files']} stale files removed")
+    for name, error in stats['excluded'].items():
+        print(f"  not depicted: {name}: {error}")
+    print(f"Manifest: {os.path.join(args.output_dir, MANIFEST_NAME)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Batch descriptor table for the molecule catalogue
+Computes MW, exact mass, logP, TPSA, HBD/HBA, rotatable bonds and ring counts for every
+molecule into a columnar NumPy structured array, written once as .npy and compact JSON
+so the website can load precomputed values instead of computing them with RDKit.js
+"""
+
+import argparse
+import json
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from rdkit.Chem import Crippen, Descriptors, rdMolDescriptors
+
+from molecule_reader import FORMATS, Row, iter_rows, iter_text_rows
+from validate_all_smiles import (DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, IN_FLIGHT_PER_WORKER, check_formula,
+                                 chunked, molecules_data, validate_smiles)
+
+DEFAULT_OUTPUT_DIR = os.path.join('public', 'data')
+
+# Columns of the descriptor table; float columns are NaN and integer columns -1
+# for molecules RDKit could not parse
+DESCRIPTOR_DTYPE = np.dtype([
+    ('mw', '<f8'),
+    ('exact_mass', '<f8'),
+    ('logp', '<f4'),
+    ('tpsa', '<f4'),
+    ('hbd', '<i2'),
+    ('hba', '<i2'),
+    ('rotatable_bonds', '<i2'),
+    ('rings', '<i2'),
+    ('aromatic_rings', '<i2'),
+    ('valid', '?'),
+])
+
+# Decimal places kept per float column in the JSON export
+JSON_PRECISION = {'mw': 3, 'exact_mass': 4, 'logp': 2, 'tpsa': 2}
+
+MISSING = (math.nan, math.nan, math.nan, math.nan, -1, -1, -1, -1, -1, False)
+
+def describe_mol(mol) -> Tuple:
+    """Descriptor values of a parsed molecule in DESCRIPTOR_DTYPE order, without the valid flag"""
+    return (
+        Descriptors.MolWt(mol),
+        Descriptors.ExactMolWt(mol),
+        Crippen.MolLogP(mol),
+        rdMolDescriptors.CalcTPSA(mol),
+        rdMolDescriptors.CalcNumHBD(mol),
+        rdMolDescriptors.CalcNumHBA(mol),
+        rdMolDescriptors.CalcNumRotatableBonds(mol),
+        rdMolDescriptors.CalcNumRings(mol),
+        rdMolDescriptors.CalcNumAromaticRings(mol),
+    )
+
+def describe_row(row: Row) -> Tuple[str, str, Tuple]:
+    """Validate one row and compute its descriptors from the same parsed molecule"""
+    _, name, formula, smiles = row
+    mol, error = validate_smiles(smiles)
+    if error:
+        return name, smiles, MISSING
+    valid = check_formula(mol, name, formula, smiles) is None
+    return name, smiles, describe_mol(mol) + (valid,)
+
+def describe_chunk(rows: List[Row]) -> List[Tuple[str, str, Tuple]]:
+    """Describe a chunk of rows in a worker process"""
+    return [describe_row(row) for row in rows]
+
+def iter_descriptors(rows: Iterable[Row], workers: int = 1,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Tuple[str, str, Tuple]]]:
+    """Yield described chunks in input order, serially or across a process pool"""
+    if workers <= 1:
+        for chunk in chunked(rows, chunk_size):
+            yield describe_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(rows, chunk_size):
+            pending.append(executor.submit(describe_chunk, chunk))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def build_table(rows: Iterable[Row], workers: int = 1,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[np.ndarray, List[str], List[str]]:
+    """Compute the descriptor table, returning (structured array, names, smiles)"""
+    names, smiles, blocks = [], [], []
+    for described in iter_descriptors(rows, workers, chunk_size):
+        names.extend(name for name, _, _ in described)
+        smiles.extend(s for _, s, _ in described)
+        blocks.append(np.array([values for _, _, values in described], dtype=DESCRIPTOR_DTYPE))
+    table = np.concatenate(blocks) if blocks else np.empty(0, dtype=DESCRIPTOR_DTYPE)
+    return table, names, smiles
+
+def to_json(table: np.ndarray, names: List[str], smiles: List[str]) -> Dict:
+    """Columnar JSON: one list per descriptor, aligned with names; missing values are null"""
+    columns = {}
+    for field in table.dtype.names:
+        column = table[field]
+        if column.dtype.kind == 'f':
+            digits = JSON_PRECISION.get(field, 3)
+            columns[field] = [None if math.isnan(v) else round(v, digits) for v in column.tolist()]
+        elif column.dtype.kind == 'b':
+            columns[field] = [int(v) for v in column.tolist()]
+        else:
+            columns[field] = [None if v < 0 else v for v in column.tolist()]
+    return {'version': 1, 'count': len(names), 'names': names, 'smiles': smiles, 'columns': columns}
+
+def write_table(table: np.ndarray, names: List[str], smiles: List[str], output_dir: str) -> Tuple[str, str]:
+    """Write descriptors.npy and descriptors.json into output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    npy_path = os.path.join(output_dir, 'descriptors.npy')
+    json_path = os.path.join(output_dir, 'descriptors.json')
+    np.save(npy_path, table, allow_pickle=False)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(to_json(table, names, smiles), f, ensure_ascii=False, separators=(',', ':'))
+    return npy_path, json_path
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Compute the molecule descriptor table")
+    parser.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                        help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                             "(default: src/data/molecules.js); 'embedded' uses validate_all_smiles' rows")
+    parser.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"directory for descriptors.npy and descriptors.json (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    rows = iter_text_rows(molecules_data) if args.input == 'embedded' else iter_rows(args.input, args.format)
+    table, names, smiles = build_table(rows, args.workers, args.chunk_size)
+    npy_path, json_path = write_table(table, names, smiles, args.output_dir)
+    print(f"Described {len(table)} molecules ({int(table['valid'].sum())} valid)")
+    print(f"Saved: {npy_path}, {json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Streaming molecule readers and incremental error sinks
+Reads CSV/TSV/SMI files (optionally gzip-compressed), stdin and src/data/molecules.js
+row by row, so memory use does not grow with the size of the catalogue
+"""
+
+import csv
+import gzip
+import io
+import json
+import re
+import sys
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+# (line number, name, formula, smiles)
+Row = Tuple[int, str, str, str]
+
+FORMATS = ('csv', 'tsv', 'smi', 'js')
+
+HEADER_NAMES = {'name', 'formula', 'smiles'}
+
+# csv rejects fields over 128 KiB by default; a huge SMILES should reach the validator,
+# which reports it, rather than end the run
+MAX_FIELD_SIZE = 64 * 1024 * 1024
+csv.field_size_limit(MAX_FIELD_SIZE)
+
+# One molecule object per line in molecules.js, same layout fetch-all-smiles.js relies on
+JS_STRING = r"'((?:[^'\\]|\\.)*)'"
+JS_FIELD_PATTERNS = {
+    field: re.compile(rf"\b{field}:\s*{JS_STRING}")
+    for field in ('name', 'formula', 'smiles', 'description')
+}
+JS_GROUPS_PATTERN = re.compile(r"\bgroups:\s*\[([^\]]*)\]")
+JS_GROUP_ITEM_PATTERN = re.compile(JS_STRING)
+JS_ESCAPE_PATTERN = re.compile(r"\\(u[0-9a-fA-F]{4}|.)")
+JS_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+# Entries of the moleculeGroups object: key: 'Label'
+JS_GROUPS_BLOCK_PATTERN = re.compile(r"\bmoleculeGroups\s*=\s*\{([^}]*)\}")
+JS_GROUP_LABEL_PATTERN = re.compile(rf"['\"]?([^\s:'\",]+)['\"]?:\s*{JS_STRING}")
+
+def detect_format(path: str) -> str:
+    """Guess the input format from the file name, ignoring a trailing .gz"""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for fmt in FORMATS:
+        if name.endswith('.' + fmt):
+            return fmt
+    if name.endswith('.txt'):
+        return 'csv'
+    raise ValueError(f"Cannot detect input format of {path!r}, pass --format")
+
+def open_input(path: str) -> IO[str]:
+    """Open a text input; '-' is stdin and *.gz files are decompressed on the fly"""
+    if path == '-':
+        if sys.stdin.encoding != 'utf-8':
+            sys.stdin.reconfigure(encoding='utf-8')
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def unescape_js(value: str) -> str:
+    """Undo the escapes used inside a single-quoted JavaScript string"""
+    def replace(match):
+        code = match.group(1)
+        if code.startswith('u') and len(code) == 5:
+            return chr(int(code[1:], 16))
+        return JS_ESCAPES.get(code, code)
+    return JS_ESCAPE_PATTERN.sub(replace, value)
+
+def parse_molecule_line(line: str) -> Optional[Dict]:
+    """Extract a molecule object from one line of molecules.js"""
+    fields = {}
+    for field, pattern in JS_FIELD_PATTERNS.items():
+        match = pattern.search(line)
+        if match:
+            fields[field] = unescape_js(match.group(1))
+    if 'name' not in fields or 'smiles' not in fields:
+        return None
+    groups = JS_GROUPS_PATTERN.search(line)
+    fields['groups'] = [unescape_js(g) for g in JS_GROUP_ITEM_PATTERN.findall(groups.group(1))] if groups else []
+    fields.setdefault('formula', '')
+    fields.setdefault('description', '')
+    return fields
+
+def iter_js_lines(lines: Iterator[str]) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, molecule) for every molecule object in molecules.js"""
+    for i, line in enumerate(lines, 1):
+        molecule = parse_molecule_line(line)
+        if molecule:
+            yield i, molecule
+
+def iter_molecules_js(path: str) -> Iterator[Dict]:
+    """Yield every molecule in src/data/molecules.js with name, formula, smiles, groups and description"""
+    f = open_input(path)
+    try:
+        for _, molecule in iter_js_lines(f):
+            yield molecule
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def read_molecule_groups(path: str) -> Dict[str, str]:
+    """Group keys and their display labels from the moleculeGroups object in molecules.js"""
+    with open_input(path) as f:
+        match = JS_GROUPS_BLOCK_PATTERN.search(f.read())
+    if not match:
+        return {}
+    return {key: unescape_js(label) for key, label in JS_GROUP_LABEL_PATTERN.findall(match.group(1))}
+
+def iter_delimited(lines: Iterator[str], delimiter: str) -> Iterator[Row]:
+    """Yield rows of name, formula, smiles from CSV or TSV lines, with an optional header"""
+    columns = (0, 1, 2)
+    for i, parts in enumerate(csv.reader(lines, delimiter=delimiter), 1):
+        if i == 1 and HEADER_NAMES <= {p.strip().lower() for p in parts}:
+            header = [p.strip().lower() for p in parts]
+            columns = tuple(header.index(n) for n in ('name', 'formula', 'smiles'))
+            continue
+        if len(parts) <= max(columns):
+            continue
+        yield i, parts[columns[0]].strip(), parts[columns[1]].strip(), parts[columns[2]].strip()
+
+def iter_smi(lines: Iterator[str]) -> Iterator[Row]:
+    """Yield rows from a SMILES file: 'SMILES name', or tab-separated 'SMILES<TAB>name<TAB>formula'"""
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if '\t' in line:
+            parts = [p.strip() for p in line.split('\t')]
+        else:
+            parts = line.split(None, 1)
+        smiles = parts[0]
+        name = parts[1] if len(parts) > 1 else smiles
+        formula = parts[2] if len(parts) > 2 else ''
+        yield i, name, formula, smiles
+
+def iter_lines(lines: Iterator[str], fmt: str) -> Iterator[Row]:
+    """Yield rows from an iterable of text lines in the given format"""
+    if fmt == 'csv':
+        return iter_delimited(lines, ',')
+    if fmt == 'tsv':
+        return iter_delimited(lines, '\t')
+    if fmt == 'smi':
+        return iter_smi(lines)
+    if fmt == 'js':
+        return ((i, m['name'], m['formula'], m['smiles']) for i, m in iter_js_lines(lines))
+    raise ValueError(f"Unknown input format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+def iter_rows(path: str, fmt: Optional[str] = None) -> Iterator[Row]:
+    """Stream (line number, name, formula, smiles) rows from a file or stdin"""
+    if fmt is None:
+        fmt = 'csv' if path == '-' else detect_format(path)
+    f = open_input(path)
+    try:
+        yield from iter_lines(f, fmt)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def iter_text_rows(data: str) -> Iterator[Row]:
+    """Stream rows from an embedded 'name,formula,smiles' string such as molecules_data"""
+    for i, line in enumerate(io.StringIO(data.strip()), 1):
+        parts = line.rstrip('\n').split(',')
+        if len(parts) < 3:
+            continue
+        yield i, parts[0].strip(), parts[1].strip(), parts[2].strip()
+
+def iter_molecules(path: str, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """Stream molecules as dicts with name, formula and smiles keys"""
+    for _, name, formula, smiles in iter_rows(path, fmt):
+        yield {'name': name, 'formula': formula, 'smiles': smiles}
+
+class JsonArraySink:
+    """Write records to a JSON array one at a time
+
+    The file is only created when the first record arrives, and the bytes written
+    are identical to json.dump(records, f, indent=2, ensure_ascii=False).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, record: Dict):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write('[\n')
+        else:
+            self._file.write(',\n')
+        text = json.dumps(record, indent=2, ensure_ascii=False)
+        self._file.write('  ' + text.replace('\n', '\n  '))
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.write('\n]')
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonLinesSink:
+    """Append records to a JSON Lines file, one compact object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, record: Dict):
+        if self._file is None:
+            self._file = sys.stdout if self.path == '-' else open(self.path, 'w', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_error_sink(path: str):
+    """Pick a JSON Lines sink for *.jsonl paths and a JSON array sink otherwise"""
+    if path == '-' or path.endswith('.jsonl'):
+        return JsonLinesSink(path)
+    return JsonArraySink(path)
+
+def error_record(result: Dict) -> Dict:
+    """Build the error report entry for an invalid validation result"""
+    record = {
+        'name': result['name'],
+        'current_smiles': result['smiles'],
+        'expected_formula': result['formula'],
+        'rdkit_formula': dict_to_formula_str(result['rdkit_formula']) if result['rdkit_formula'] else None,
+        'errors': result['errors'],
+        'status': 'NEEDS_REVIEW'
+    }
+    if result.get('failed_stage'):
+        record['failed_stage'] = result['failed_stage']
+    if result.get('rdkit_log'):
+        record['rdkit_log'] = result['rdkit_log']
+    return record
+
+def dict_to_formula_str(formula_dict: Dict[str, int]) -> str:
+    """Convert formula dict back to string"""
+    if not formula_dict:
+        return ""
+    
+    # Order: C, H, then alphabetically
+    elements = sorted(formula_dict.keys())
+    if 'C' in elements:
+        elements.remove('C')
+        elements.insert(0, 'C')
+    if 'H' in elements:
+        elements.remove('H')
+        if 'C' in elements:
+            elements.insert(1, 'H')
+        else:
+            elements.insert(0, 'H')
+    
+    result = ""
+    for elem in elements:
+        count = formula_dict[elem]
+        if count == 1:
+            result += elem
+        else:
+            result += f"{elem}{count}"
+    return result
+
+def read_error_report(path: str) -> List[Dict]:
+    """Load an error report written by either sink"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
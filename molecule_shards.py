@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Per-category data shards of the validated catalogue for the website
+Validates src/data/molecules.js and writes only the valid molecules as one compact
+JSON shard per moleculeGroups category. Molecules in several categories go to a
+single shared shard instead of being copied into each of them. A small index.json
+lists names and groups only, so the site can load it up front and fetch a
+category's shard on demand. Shard file names carry a content hash for long-lived
+caching.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from molecule_reader import iter_molecules_js, read_molecule_groups
+from validate_all_smiles import DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, invalid_molecules
+from validation_cache import DEFAULT_CACHE_PATH
+
+DEFAULT_OUTPUT_DIR = os.path.join('public', 'data', 'molecules')
+INDEX_NAME = 'index.json'
+# Key of the shared shard, which no moleculeGroups key can equal, and its file name stem,
+# which no slug can equal since slugs hold only [a-z0-9-]
+SHARED = None
+SHARED_STEM = '_shared'
+
+# File names build_shards writes, the only ones pruning may delete: <slug>.<12 hex digits>.json
+SHARD_FILE = re.compile(r'(?:_shared|[a-z0-9-]+)\.[0-9a-f]{12}\.json')
+
+# Columns of every shard row, in order
+SHARD_FIELDS = ('name', 'formula', 'smiles', 'groups', 'description')
+
+# Letters NFKD cannot reduce to ASCII
+SLUG_LETTERS = str.maketrans({'æ': 'ae', 'ø': 'o', 'å': 'a', 'Æ': 'Ae', 'Ø': 'O', 'Å': 'A'})
+
+def slug(key: str) -> str:
+    """ASCII file-name stem of a group key, e.g. næringstillegg -> naeringstillegg"""
+    text = unicodedata.normalize('NFKD', key.translate(SLUG_LETTERS)).encode('ascii', 'ignore').decode('ascii')
+    return ''.join(c if c.isalnum() else '-' for c in text.lower()).strip('-') or 'group'
+
+def compact_json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def merge_duplicates(molecules: Iterable[Dict]) -> Tuple[List[Dict], int]:
+    """Molecules with the same name and SMILES merged into one entry with the union of their groups"""
+    merged: Dict[Tuple[str, str], Dict] = {}
+    duplicates = 0
+    for molecule in molecules:
+        key = (molecule['name'], molecule['smiles'])
+        if key in merged:
+            duplicates += 1
+            first = merged[key]
+            first['groups'] += [g for g in molecule['groups'] if g not in first['groups']]
+            first['description'] = first['description'] or molecule['description']
+        else:
+            merged[key] = dict(molecule, groups=list(molecule['groups']))
+    return list(merged.values()), duplicates
+
+def shard_key(groups: List[str]) -> Optional[str]:
+    """Shard a molecule goes to: its only group, or the shared shard"""
+    return groups[0] if len(groups) == 1 else SHARED
+
+def build_shards(source: str = DEFAULT_MOLECULES_JS, output_dir: str = DEFAULT_OUTPUT_DIR, workers: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 prune: bool = True) -> Dict:
+    """Write the shards and index.json for the valid molecules of source; returns build statistics"""
+    molecules, duplicates = merge_duplicates(iter_molecules_js(source))
+    errors = invalid_molecules(molecules, workers, chunk_size, cache_path)
+    valid = [m for k, m in enumerate(molecules) if k not in errors]
+
+    shards: Dict[Optional[str], List[List]] = {}
+    for molecule in valid:
+        shards.setdefault(shard_key(molecule['groups']), []).append([molecule[f] for f in SHARD_FIELDS])
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = {}
+    total = 0
+    for key, rows in shards.items():
+        content = compact_json({'fields': SHARD_FIELDS, 'molecules': rows})
+        stem = SHARED_STEM if key is SHARED else slug(key)
+        files[key] = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}.json"
+        total += len(content)
+        path = os.path.join(output_dir, files[key])
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+
+    # Groups used by molecules but missing from moleculeGroups are listed with their key as label
+    labels = read_molecule_groups(source)
+    for molecule in valid:
+        for key in molecule['groups']:
+            labels.setdefault(key, key)
+    positions = {key: i for i, key in enumerate(labels)}
+    index = {
+        'version': 1,
+        'groups': [[key, label, files.get(key)] for key, label in labels.items()],
+        'shared': files.get(SHARED),
+        'fields': ('name', 'groups'),
+        # Groups of a molecule as positions in 'groups', which keeps the index a fraction of a shard
+        'molecules': [[m['name'], [positions[key] for key in m['groups']]] for m in valid],
+    }
+    content = compact_json(index)
+    with open(os.path.join(output_dir, INDEX_NAME + '.tmp'), 'wb') as f:
+        f.write(content)
+    os.replace(os.path.join(output_dir, INDEX_NAME + '.tmp'), os.path.join(output_dir, INDEX_NAME))
+
+    removed = 0
+    if prune:
+        # Other data (names.json, conformers.json) may share the directory
+        referenced = set(files.values())
+        for file_name in os.listdir(output_dir):
+            if SHARD_FILE.fullmatch(file_name) and file_name not in referenced:
+                os.remove(os.path.join(output_dir, file_name))
+                removed += 1
+
+    return {
+        'molecules': len(molecules),
+        'shipped': len(valid),
+        'excluded': {molecules[k]['name']: error for k, error in sorted(errors.items())},
+        'duplicates': duplicates,
+        'shards': len(files),
+        'shared': len(shards.get(SHARED, ())),
+        'index_bytes': len(content),
+        'shard_bytes': total,
+        'removed_files': removed,
+    }
+
+def print_summary(stats: Dict, output_dir: str):
+    """Print build statistics and the molecules left out"""
+    print(f"Shards: {stats['shipped']} of {stats['molecules']} molecules in {stats['shards']} shards "
+          f"({stats['shared']} shared, {stats['duplicates']} duplicates merged), "
+          f"index {stats['index_bytes']} bytes, shards {stats['shard_bytes']} bytes, "
+          f"{stats['removed_files']} stale files removed")
+    for name, error in stats['excluded'].items():
+        print(f"  not shipped: {name}: {error}")
+    print(f"Index: {os.path.join(output_dir, INDEX_NAME)}")
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Write per-category molecule shards for the website")
+    parser.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                        help="molecules.js (default: src/data/molecules.js)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"directory for the shards and {INDEX_NAME} (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help=f"validation result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--no-cache', action='store_true', help="validate every molecule from scratch")
+    parser.add_argument('--keep-stale', action='store_true', help="do not delete shards no longer in the index")
+    args = parser.parse_args(argv)
+
+    stats = build_shards(args.input, args.output_dir, args.workers, args.chunk_size,
+                         None if args.no_cache else args.cache, prune=not args.keep_stale)
+    print_summary(stats, args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Standardised forms of SMILES that fail the formula comparison
+Many formula mismatches are representation differences rather than wrong structures:
+salts and mixtures whose formula describes one component (Natriumoksalat), and charged
+forms whose formula describes the neutral molecule (Karbamat). Each mismatching SMILES
+is run through RDKit's MolStandardize: largest organic fragment, charge neutralisation
+and canonical tautomer. The expected formula is then compared with every standardised
+form, and the fewest transformations that make it match are reported.
+"""
+
+import argparse
+from typing import List, NamedTuple, Optional, Tuple
+
+from rdkit import Chem, rdBase
+from rdkit.Chem import rdMolDescriptors
+from rdkit.Chem.MolStandardize import rdMolStandardize
+
+import formula as chem_formula
+from smiles_lexer import logged_mol_from_smiles
+
+FRAGMENT = 'fragment'
+NEUTRALISE = 'neutralise'
+TAUTOMER = 'tautomer'
+
+# Transformations tried against the expected formula, fewest first. Tautomers share a
+# formula, so the canonical tautomer of each form only normalises the reported SMILES.
+CANDIDATES = ((FRAGMENT,), (NEUTRALISE,), (FRAGMENT, NEUTRALISE))
+
+class Form(NamedTuple):
+    """A standardised form of a molecule: the transformations applied, its canonical tautomer SMILES and formula"""
+    steps: Tuple[str, ...]
+    smiles: str
+    formula: str
+
+_standardizers = None
+
+def standardizers():
+    """Fragment chooser, uncharger and tautomer enumerator, created once per process"""
+    global _standardizers
+    if _standardizers is None:
+        _standardizers = (rdMolStandardize.LargestFragmentChooser(preferOrganic=True),
+                          rdMolStandardize.Uncharger(),
+                          rdMolStandardize.TautomerEnumerator())
+    return _standardizers
+
+def transform(mol, steps: Tuple[str, ...]):
+    """mol with the fragment and neutralisation steps applied in order"""
+    chooser, uncharger, _ = standardizers()
+    for step in steps:
+        mol = chooser.choose(mol) if step == FRAGMENT else uncharger.uncharge(mol)
+    return mol
+
+def standardize_smiles(smiles: str) -> Optional[List[Form]]:
+    """Standardised forms of a SMILES in CANDIDATES order, or None if RDKit cannot parse it"""
+    mol, _ = logged_mol_from_smiles(smiles)
+    if mol is None:
+        return None
+    enumerator = standardizers()[2]
+    tautomers = {}
+    forms = []
+    with rdBase.BlockLogs():
+        for steps in CANDIDATES:
+            try:
+                result = transform(mol, steps)
+                key = Chem.MolToSmiles(result)
+                if key not in tautomers:
+                    tautomers[key] = Chem.MolToSmiles(enumerator.Canonicalize(result))
+            except (RuntimeError, ValueError):
+                continue
+            forms.append(Form(steps + (TAUTOMER,), tautomers[key], rdMolDescriptors.CalcMolFormula(result)))
+    return forms
+
+def standardize_chunk(smiles: List[str]) -> List[Optional[List[Form]]]:
+    """Standardised forms of a chunk of SMILES in a worker process"""
+    return [standardize_smiles(s) for s in smiles]
+
+def explain(formula: str, forms: List[Form]) -> Optional[Form]:
+    """First standardised form whose formula matches the expected one, or None"""
+    expected = chem_formula.vector(formula)
+    for form in forms:
+        if chem_formula.vector(form.formula) == expected:
+            return form
+    return None
+
+def standardized_record(error: dict, forms: Optional[List[Form]]) -> dict:
+    """Error record of a formula mismatch with its standardised form and the steps that fix it
+
+    'fixed_by' lists the transformations that make the formula match, without
+    the tautomer step, or is empty when none does; the SMILES shown is then the
+    fully standardised one.
+    """
+    if not forms:
+        return error
+    form = explain(error['formula'], forms)
+    fixed_by = [step for step in form.steps if step != TAUTOMER] if form else []
+    form = form or forms[-1]
+    return {**error, 'standardized': {'smiles': form.smiles, 'formula': form.formula, 'fixed_by': fixed_by}}
+
+def needs_standardizing(error: Optional[dict]) -> bool:
+    """Whether an error record is a formula or charge mismatch standardisation may explain"""
+    return error is not None and 'expected' in error and bool(error.get('smiles'))
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Standardise SMILES and check them against expected formulas")
+    parser.add_argument('smiles')
+    parser.add_argument('formula', nargs='?', help="expected formula; shows which transformations match it")
+    args = parser.parse_args(argv)
+
+    forms = standardize_smiles(args.smiles)
+    if forms is None:
+        parser.exit(1, "RDKit could not parse SMILES\n")
+    match = explain(args.formula, forms) if args.formula else None
+    for form in forms:
+        marker = '*' if form is match else ' '
+        print(f"{marker} {' + '.join(form.steps):<32} {form.formula:<16} {form.smiles}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary store of the validated molecule catalogue
+Keeps RDKit's binary serialisation of every molecule that passes validation, so
+downstream tools restore parsed Mols instead of parsing SMILES again. The file is
+read through mmap; molecules are decoded one at a time, by index or by name.
+
+Store file layout (all sections 64-byte aligned, little-endian):
+  magic 'KJMOLST1' | uint32 header length | JSON header
+  index            (offset uint64, length uint32, line uint32)[count]  binary Mol per molecule
+  name_offsets     uint64[count + 1]   byte offsets into names
+  names            UTF-8 names
+  formula_offsets  uint64[count + 1]   byte offsets into formulas
+  formulas         UTF-8 expected formulas
+  smiles_offsets   uint64[count + 1]   byte offsets into smiles
+  smiles           UTF-8 SMILES as given in the catalogue
+  mols             RDKit binary molecules
+"""
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from rdkit import Chem, rdBase
+
+from molecule_reader import FORMATS, Row, iter_rows, iter_text_rows
+from validate_all_smiles import (DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS, IN_FLIGHT_PER_WORKER, check_chunk_mols,
+                                 chunked, element_table, molecules_data)
+
+MAGIC = b'KJMOLST1'
+ALIGNMENT = 64
+DEFAULT_STORE_PATH = os.path.join('.cache', 'molecules.molstore')
+COLUMNS = ('names', 'formulas', 'smiles')
+SECTIONS = ('index', 'name_offsets', 'names', 'formula_offsets', 'formulas', 'smiles_offsets', 'smiles', 'mols')
+
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('line', '<u4')])
+
+OFFSET_SECTIONS = {'names': 'name_offsets', 'formulas': 'formula_offsets', 'smiles': 'smiles_offsets'}
+
+def aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def store_chunk(rows: List[Row]) -> List[Tuple[Row, Optional[bytes]]]:
+    """Validate a chunk in a worker process, returning each row with its binary Mol, or None if invalid"""
+    _, mols = check_chunk_mols(rows)
+    return [(row, mol.ToBinary() if mol is not None else None) for row, mol in zip(rows, mols)]
+
+def iter_binaries(rows: Iterable[Row], workers: int = 1,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Row, Optional[bytes]]]:
+    """Yield (row, binary Mol or None) in input order, serially or across a process pool"""
+    if workers <= 1:
+        for chunk in chunked(rows, chunk_size):
+            yield from store_chunk(chunk)
+        return
+    element_table()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(rows, chunk_size):
+            pending.append(executor.submit(store_chunk, chunk))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def build_store(rows: Iterable[Row], path: str = DEFAULT_STORE_PATH, workers: int = 1,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Validate every row and write the valid ones to a store file; returns build statistics
+
+    Sections are streamed to temporary files first, so memory does not grow
+    with the catalogue.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    parts = {name: open(f"{path}.{name}.tmp", 'wb') for name in SECTIONS}
+    sizes = dict.fromkeys(COLUMNS + ('mols',), 0)
+    count = skipped = 0
+    start = time.perf_counter()
+    try:
+        for column in COLUMNS:
+            parts[OFFSET_SECTIONS[column]].write(struct.pack('<Q', 0))
+        for (line, name, formula, smiles), binary in iter_binaries(rows, workers, chunk_size):
+            if binary is None:
+                skipped += 1
+                continue
+            parts['index'].write(struct.pack('<QII', sizes['mols'], len(binary), line))
+            parts['mols'].write(binary)
+            sizes['mols'] += len(binary)
+            for column, value in zip(COLUMNS, (name, formula, smiles)):
+                encoded = value.encode('utf-8')
+                parts[column].write(encoded)
+                sizes[column] += len(encoded)
+                parts[OFFSET_SECTIONS[column]].write(struct.pack('<Q', sizes[column]))
+            count += 1
+    finally:
+        for f in parts.values():
+            f.close()
+
+    section_sizes = {name: os.path.getsize(f"{path}.{name}.tmp") for name in SECTIONS}
+    header = {'count': count, 'rdkit': rdBase.rdkitVersion, 'sections': {}}
+    # Header length is fixed before section offsets are known, so reserve room for them
+    offset = aligned(len(MAGIC) + 4 + 1024)
+    for name in SECTIONS:
+        header['sections'][name] = [offset, section_sizes[name]]
+        offset = aligned(offset + section_sizes[name])
+    header_bytes = json.dumps(header).encode('utf-8')
+    if len(header_bytes) > 1024:
+        raise ValueError("Store header too large")
+
+    with open(path + '.tmp', 'wb') as out:
+        out.write(MAGIC)
+        out.write(struct.pack('<I', len(header_bytes)))
+        out.write(header_bytes)
+        for name in SECTIONS:
+            out.write(b'\0' * (header['sections'][name][0] - out.tell()))
+            with open(f"{path}.{name}.tmp", 'rb') as part:
+                shutil.copyfileobj(part, out)
+            os.remove(f"{path}.{name}.tmp")
+    os.replace(path + '.tmp', path)
+
+    return {'molecules': count, 'skipped': skipped, 'seconds': round(time.perf_counter() - start, 3),
+            'bytes': os.path.getsize(path)}
+
+class MolStore:
+    """Read-only, memory-mapped view of a store file written by build_store
+
+    store[i] restores molecule i, store.get(name) the first molecule with that
+    name, and iterating yields molecules in catalogue order without decoding
+    the rest of the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a molecule store")
+            (length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(length))
+        self.count = self.header['count']
+        self._data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.empty(0, np.uint8)
+        self.index = self._section('index', INDEX_DTYPE)
+        self.mols = self._section('mols', np.uint8)
+        self._columns = {column: (self._section(OFFSET_SECTIONS[column], np.uint64), self._section(column, np.uint8))
+                         for column in COLUMNS}
+        self._names: Optional[Dict[str, int]] = None
+
+    def _section(self, name: str, dtype) -> np.ndarray:
+        offset, size = self.header['sections'][name]
+        return self._data[offset:offset + size].view(dtype)
+
+    def _text(self, column: str, i: int) -> str:
+        offsets, text = self._columns[column]
+        return text[int(offsets[i]):int(offsets[i + 1])].tobytes().decode('utf-8')
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Chem.Mol:
+        if not -self.count <= i < self.count:
+            raise IndexError(i)
+        return self.mol(i % self.count)
+
+    def __iter__(self) -> Iterator[Chem.Mol]:
+        for i in range(self.count):
+            yield self.mol(i)
+
+    def mol(self, i: int) -> Chem.Mol:
+        """Parsed molecule i, restored from its stored binary form"""
+        offset, length, _ = self.index[i]
+        return Chem.Mol(self.mols[int(offset):int(offset) + int(length)].tobytes())
+
+    def name(self, i: int) -> str:
+        return self._text('names', i)
+
+    def formula(self, i: int) -> str:
+        return self._text('formulas', i)
+
+    def smiles(self, i: int) -> str:
+        return self._text('smiles', i)
+
+    def line(self, i: int) -> int:
+        """Line number of molecule i in the catalogue the store was built from"""
+        return int(self.index[i]['line'])
+
+    def find(self, name: str) -> Optional[int]:
+        """Index of the first molecule with the given name"""
+        if self._names is None:
+            self._names = {}
+            for i in range(self.count):
+                self._names.setdefault(self.name(i), i)
+        return self._names.get(name)
+
+    def get(self, name: str) -> Optional[Chem.Mol]:
+        """First molecule with the given name, or None"""
+        i = self.find(name)
+        return None if i is None else self.mol(i)
+
+    def items(self) -> Iterator[Tuple[str, Chem.Mol]]:
+        """(name, molecule) pairs in catalogue order"""
+        for i in range(self.count):
+            yield self.name(i), self.mol(i)
+
+def bench(store: MolStore) -> Dict:
+    """Seconds to restore every molecule from the store versus parsing its SMILES again"""
+    start = time.perf_counter()
+    for mol in store:
+        pass
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(len(store)):
+        Chem.MolFromSmiles(store.smiles(i))
+    parsed = time.perf_counter() - start
+    return {'molecules': len(store), 'load_seconds': round(loaded, 3), 'parse_seconds': round(parsed, 3)}
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Binary store of validated, parsed molecules")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"store file (default: {DEFAULT_STORE_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="validate a catalogue and write its valid molecules")
+    build.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                       help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                            "(default: src/data/molecules.js)")
+    build.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    build.add_argument('--embedded', action='store_true', help="use the catalogue embedded in validate_all_smiles")
+    build.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    build.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    show = commands.add_parser('show', help="print stored molecules by name or index")
+    show.add_argument('keys', nargs='+')
+
+    commands.add_parser('bench', help="time restoring every molecule against parsing its SMILES")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        rows = iter_text_rows(molecules_data) if args.embedded else iter_rows(args.input, args.format)
+        stats = build_store(rows, args.store, args.workers, args.chunk_size)
+        print(f"Stored {stats['molecules']} molecules ({stats['skipped']} invalid skipped), "
+              f"{stats['bytes']} bytes in {stats['seconds']} s: {args.store}")
+        return
+
+    store = MolStore(args.store)
+    if args.command == 'show':
+        for key in args.keys:
+            i = int(key) if key.lstrip('-').isdigit() else store.find(key)
+            if i is None or not -len(store) <= i < len(store):
+                print(f"{key}: not in store")
+                continue
+            i %= len(store)
+            mol = store.mol(i)
+            print(f"[{i}] {store.name(i)}  {store.formula(i)}  {Chem.MolToSmiles(mol)}  "
+                  f"({mol.GetNumAtoms()} atoms, line {store.line(i)})")
+    else:
+        stats = bench(store)
+        speedup = f" ({stats['parse_seconds'] / stats['load_seconds']:.1f}x)" if stats['load_seconds'] else ''
+        print(f"{stats['molecules']} molecules: restore {stats['load_seconds']} s, "
+              f"MolFromSmiles {stats['parse_seconds']} s{speedup}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Fuzzy name and synonym index for molecule lookup
+Folds case and accents out of every catalogue name and its cactusQuery lookup name,
+merges names that share a lookup name or an InChIKey into one entry (Kortisol and
+Hydrokortison, Adrenalin and Epinefrin), and indexes the folded terms by trigram.
+Lookups rank entries by trigram overlap (Dice) through the inverted index instead of
+scanning every name. The index is exported as compact JSON for the site's search box,
+and the validators use it to flag one name used for different structures.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from molecule_dedup import iter_identities
+from molecule_reader import FORMATS, Row, iter_rows
+from reference_check import CACTUS_NAMES_JS, load_cactus_names
+from validate_all_smiles import DEFAULT_CHUNK_SIZE, DEFAULT_MOLECULES_JS
+
+DEFAULT_INDEX_PATH = os.path.join('public', 'data', 'names.json')
+DEFAULT_LIMIT = 5
+DEFAULT_THRESHOLD = 0.3
+
+# Letters NFKD cannot reduce to ASCII
+FOLD_LETTERS = str.maketrans({'æ': 'ae', 'ø': 'o', 'å': 'a', 'ß': 'ss'})
+NON_ALNUM = re.compile(r'[\W_]+')
+PARENTHESES = re.compile(r'\s*\([^)]*\)\s*')
+
+class Match(NamedTuple):
+    """A ranked lookup result: entry position, its display name and the Dice score of the best term"""
+    entry: int
+    name: str
+    score: float
+    term: str
+
+def normalise(name: str) -> str:
+    """Case- and accent-folded name with punctuation collapsed to single spaces, e.g. 'Thiamin (B1)' -> 'thiamin b1'"""
+    text = unicodedata.normalize('NFKD', name.casefold().translate(FOLD_LETTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return NON_ALNUM.sub(' ', text).strip()
+
+def trigrams(term: str) -> List[str]:
+    """Distinct trigrams of a normalised term, padded so short names and word starts count"""
+    padded = f"  {term} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+def name_terms(name: str) -> List[str]:
+    """Search terms of a name: the whole name, the name without parenthesised parts and each of those parts"""
+    terms = [normalise(name), normalise(PARENTHESES.sub(' ', name))]
+    terms += [normalise(part) for part in re.findall(r'\(([^)]*)\)', name)]
+    return [t for t in dict.fromkeys(terms) if t]
+
+class NameIndex:
+    """Synonym entries, their folded terms and a trigram inverted index over the terms"""
+
+    def __init__(self, entries: List[List[str]], terms: List[str], term_entries: List[List[int]],
+                 postings: Optional[Dict[str, List[int]]] = None):
+        self.entries = entries
+        self.terms = terms
+        self.term_entries = term_entries
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.term_sizes = [len(trigrams(term)) for term in terms]
+        if postings is None:
+            postings = {}
+            for i, term in enumerate(terms):
+                for gram in trigrams(term):
+                    postings.setdefault(gram, []).append(i)
+        self.postings = postings
+
+    @classmethod
+    def build(cls, groups: Iterable[Tuple[List[str], List[str]]]) -> 'NameIndex':
+        """Index (display names, lookup names) groups; each group becomes one entry"""
+        entries = []
+        terms: Dict[str, List[int]] = {}
+        for names, synonyms in groups:
+            entry = len(entries)
+            entries.append(list(names) + [s for s in synonyms if s not in names])
+            for name in entries[-1]:
+                for term in name_terms(name):
+                    owners = terms.setdefault(term, [])
+                    if entry not in owners:
+                        owners.append(entry)
+        return cls(entries, list(terms), list(terms.values()))
+
+    def lookup(self, query: str, limit: int = DEFAULT_LIMIT, threshold: float = DEFAULT_THRESHOLD) -> List[Match]:
+        """Entries whose names best match query, best first"""
+        folded = normalise(query)
+        if not folded:
+            return []
+        best: Dict[int, Tuple[float, int]] = {}
+        exact = self.term_ids.get(folded)
+        if exact is not None:
+            for entry in self.term_entries[exact]:
+                best[entry] = (1.0, exact)
+        grams = trigrams(folded)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.postings.get(gram, ()))
+        for term, common in counts.items():
+            score = 2 * common / (len(grams) + self.term_sizes[term])
+            if score < threshold:
+                continue
+            for entry in self.term_entries[term]:
+                if score > best.get(entry, (0.0, 0))[0]:
+                    best[entry] = (score, term)
+        ranked = sorted(best.items(), key=lambda item: -item[1][0])[:limit]
+        return [Match(entry, self.entries[entry][0], round(score, 3), self.terms[term])
+                for entry, (score, term) in ranked]
+
+    def to_json(self) -> Dict:
+        """Compact form for the site: terms index into 'entries', trigram postings index into 'terms'"""
+        return {
+            'version': 1,
+            'entries': self.entries,
+            'terms': self.terms,
+            'term_entries': [ids[0] if len(ids) == 1 else ids for ids in self.term_entries],
+            'trigrams': self.postings,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'NameIndex':
+        term_entries = [ids if isinstance(ids, list) else [ids] for ids in data['term_entries']]
+        return cls(data['entries'], data['terms'], term_entries, data['trigrams'])
+
+    def write(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> 'NameIndex':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+class Catalogue(NamedTuple):
+    """Name index of a catalogue plus the name collisions found while building it"""
+    index: NameIndex
+    collisions: List[Dict]
+
+def synonym_groups(rows: Iterable[Tuple[Row, Optional[Tuple[str, str]]]],
+                   cactus: Dict[str, str]) -> Tuple[List[Tuple[List[str], List[str]]], List[Dict]]:
+    """Merge rows into synonym groups by lookup name and InChIKey, and collect name collisions
+
+    A collision is one folded name, or one cactusQuery lookup name, used for
+    rows whose structures differ. Rows that do not parse have no structure to
+    compare and are left out. A lookup name collision among rows of one folded
+    name repeats that name's collision and is not reported again.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(key: str) -> str:
+        while parent.setdefault(key, key) != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(a: str, b: str):
+        parent[find(a)] = find(b)
+
+    names: Dict[str, List[Tuple[str, str, Optional[str]]]] = {}
+    lookups: Dict[str, List[Tuple[str, str, Optional[str]]]] = {}
+    order: List[str] = []
+    for (_, name, _, smiles), identity in rows:
+        key = identity[1] if identity else None
+        node = f"name:{name}"
+        if node not in parent:
+            order.append(name)
+        find(node)
+        if key:
+            union(node, f"inchikey:{key}")
+        if name in cactus:
+            union(node, f"lookup:{normalise(cactus[name])}")
+            lookups.setdefault(normalise(cactus[name]), []).append((name, smiles, key))
+        names.setdefault(normalise(name), []).append((name, smiles, key))
+
+    collisions = []
+    for kind, table in (('name', names), ('synonym', lookups)):
+        for folded, members in table.items():
+            members = [member for member in members if member[2] is not None]
+            if len({key for _, _, key in members}) < 2:
+                continue
+            if kind == 'synonym' and len({normalise(name) for name, _, _ in members}) == 1:
+                continue
+            collisions.append({
+                'kind': kind,
+                'key': folded,
+                'names': [name for name, _, _ in members],
+                'smiles': [smiles for _, smiles, _ in members],
+            })
+
+    grouped: Dict[str, List[str]] = {}
+    for name in order:
+        grouped.setdefault(find(f"name:{name}"), []).append(name)
+    groups = []
+    for members in grouped.values():
+        synonyms = list(dict.fromkeys(cactus[name] for name in members if name in cactus))
+        groups.append((members, synonyms))
+    return groups, collisions
+
+def build_catalogue(rows: Iterable[Row], cactus_path: str = CACTUS_NAMES_JS, workers: int = 1,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, identities: Optional[Iterable[Tuple[Row, Tuple]]] = None
+                    ) -> Catalogue:
+    """Name index and name collisions of a catalogue
+
+    identities, if given, are iter_identities results computed already, and rows is ignored.
+    """
+    cactus = load_cactus_names(cactus_path) if os.path.exists(cactus_path) else {}
+    if identities is None:
+        identities = iter_identities(rows, workers, chunk_size)
+    groups, collisions = synonym_groups(identities, cactus)
+    return Catalogue(NameIndex.build(groups), collisions)
+
+def print_collisions(collisions: List[Dict]):
+    """Print every name used for more than one structure"""
+    print(f"Name collisions: {len(collisions)}")
+    for collision in collisions:
+        label = 'same name' if collision['kind'] == 'name' else f"same lookup name '{collision['key']}'"
+        print(f"  {label}, different structures: {' / '.join(collision['names'])}")
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Build and query the fuzzy molecule name index")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="index a catalogue and report name collisions")
+    build.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                       help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                            "(default: src/data/molecules.js)")
+    build.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    build.add_argument('--names', default=CACTUS_NAMES_JS, help="cactusQuery mapping (default: scripts/cactus-names.js)")
+    build.add_argument('--output', default=DEFAULT_INDEX_PATH, help=f"index file (default: {DEFAULT_INDEX_PATH})")
+    build.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    build.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    lookup = commands.add_parser('lookup', help="rank catalogue names against queries")
+    lookup.add_argument('queries', nargs='+')
+    lookup.add_argument('--index', default=DEFAULT_INDEX_PATH, help=f"index file (default: {DEFAULT_INDEX_PATH})")
+    lookup.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    lookup.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="lowest Dice score shown")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        catalogue = build_catalogue(iter_rows(args.input, args.format), args.names, args.workers, args.chunk_size)
+        catalogue.index.write(args.output)
+        print(f"Name index: {len(catalogue.index.entries)} entries, {len(catalogue.index.terms)} terms, "
+              f"{len(catalogue.index.postings)} trigrams, {os.path.getsize(args.output)} bytes: {args.output}")
+        print_collisions(catalogue.collisions)
+        return
+
+    index = NameIndex.load(args.index)
+    for query in args.queries:
+        start = time.perf_counter()
+        matches = index.lookup(query, args.limit, args.threshold)
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(f"{query} ({elapsed:.0f} µs)")
+        for match in matches:
+            synonyms = [n for n in index.entries[match.entry][1:]]
+            also = f"  [{', '.join(synonyms)}]" if synonyms else ''
+            print(f"  {match.score:.3f}  {match.name}{also}")
+
+if __name__ == "__main__":
+    main()
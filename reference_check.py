@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Cross-check catalogue SMILES against a reference structure service
+Looks every molecule up by name (through the cactusQuery mapping in scripts/cactus-names.js)
+on NCI Cactus or PubChem, concurrently over one pooled aiohttp session behind a token-bucket
+rate limiter, and compares the fetched structure with ours by InChIKey. Responses are kept in
+a persistent cache, and `stub` serves the catalogue itself on localhost as an offline stand-in.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from molecule_dedup import smiles_identity
+from molecule_reader import FORMATS, Row, iter_rows, iter_text_rows, open_error_sink, unescape_js
+from validate_all_smiles import DEFAULT_MOLECULES_JS, molecules_data
+from validation_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, ValidationCache
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:  # only needed for network lookups and the stub server
+    aiohttp = None
+
+CACTUS_NAMES_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'cactus-names.js')
+CACTUS_ENTRY = re.compile(r"^\s*'((?:[^'\\]|\\.)*)'\s*:\s*'((?:[^'\\]|\\.)*)'", re.MULTILINE)
+
+PROVIDERS = {
+    'cactus': 'https://cactus.nci.nih.gov/chemical/structure',
+    'pubchem': 'https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name',
+}
+
+# Request budgets matching what the services tolerate (PubChem asks for at most 5/s)
+DEFAULT_RATES = {'cactus': 8.0, 'pubchem': 5.0}
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 4
+REQUEST_TIMEOUT = 15
+
+# Statuses that mean "try again later" rather than "no such molecule"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Only definite answers are cached; anything else (400, 401, 403, ...) may be a passing misconfiguration
+CACHED_STATUSES = {200, 404}
+
+def load_cactus_names(path: str = CACTUS_NAMES_JS) -> Dict[str, str]:
+    """Display name -> lookup name mapping shared with the Node fetch scripts"""
+    with open(path, encoding='utf-8') as f:
+        return {unescape_js(name): unescape_js(query) for name, query in CACTUS_ENTRY.findall(f.read())}
+
+def query_name(display_name: str, names: Dict[str, str]) -> str:
+    """Lookup name for a molecule, same rule as getQueryName in the fetch scripts"""
+    if display_name in names:
+        return names[display_name]
+    return re.sub(r'\s+', ' ', re.sub(r'\s*\([^)]+\)\s*', ' ', display_name).strip()).lower()
+
+def reference_url(provider: str, base_url: str, query: str) -> str:
+    if provider == 'pubchem':
+        return f"{base_url}/{quote(query, safe='')}/property/IsomericSMILES/JSON"
+    return f"{base_url}/{quote(query, safe='')}/smiles"
+
+def parse_response(provider: str, text: str) -> Optional[str]:
+    """Reference SMILES from a response body, or None if the service had no structure"""
+    if provider == 'pubchem':
+        try:
+            props = json.loads(text)['PropertyTable']['Properties'][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+        smiles = props.get('IsomericSMILES') or props.get('SMILES')
+        return smiles if isinstance(smiles, str) and len(smiles) > 2 else None
+    first = text.split('\n')[0].strip()
+    if len(first) > 2 and not first.startswith('<') and not first.startswith('Sorry'):
+        return first
+    return None
+
+def compare(smiles: str, reference: Optional[str]) -> str:
+    """match, stereo, protonation, mismatch, not_found, unparseable or bad_reference
+
+    stereo means the InChIs are the same once their stereo and isotope layers are
+    removed (molecule_dedup.skeleton). protonation means the InChIKeys share their
+    skeleton block and differ in the protonation flag, e.g. acetic acid and acetate.
+    """
+    if reference is None:
+        return 'not_found'
+    ours = smiles_identity(smiles)
+    if ours is None or ours[1] is None:
+        return 'unparseable'
+    theirs = smiles_identity(reference)
+    if theirs is None or theirs[1] is None:
+        return 'bad_reference'
+    (_, our_key, our_skeleton), (_, their_key, their_skeleton) = ours, theirs
+    if our_key == their_key:
+        return 'match'
+    if our_skeleton == their_skeleton:
+        return 'stereo'
+    if our_key[:14] == their_key[:14] and our_key[-1] != their_key[-1]:
+        return 'protonation'
+    return 'mismatch'
+
+class TokenBucket:
+    """Async token bucket: at most `rate` acquisitions per second, with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ReferenceFetcher:
+    """Concurrent, rate-limited, cached reference lookups over one HTTP session"""
+
+    def __init__(self, session, provider: str, base_url: str, bucket: TokenBucket,
+                 cache: Optional[ValidationCache] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 retries: int = DEFAULT_RETRIES):
+        self.session = session
+        self.provider = provider
+        self.base_url = base_url.rstrip('/')
+        self.bucket = bucket
+        self.cache = cache
+        self.retries = retries
+        self.requests = 0
+        self.failures = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(self, query: str) -> Tuple[bool, Optional[str]]:
+        """(answered, reference SMILES); answered is False when the service kept failing or refused the request"""
+        if self.cache is not None:
+            found, cached = self.cache.get(query, '')
+            if found:
+                return True, cached['smiles']
+        url = reference_url(self.provider, self.base_url, query)
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                await self.bucket.acquire()
+                self.requests += 1
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+                try:
+                    async with self.session.get(url) as response:
+                        text = await response.text()
+                        if response.status in CACHED_STATUSES:
+                            smiles = parse_response(self.provider, text) if response.status == 200 else None
+                            if self.cache is not None:
+                                self.cache.put(query, '', {'smiles': smiles})
+                            return True, smiles
+                        if response.status not in RETRY_STATUSES:
+                            break
+                        retry_after = response.headers.get('Retry-After', '')
+                        if retry_after.isdigit():
+                            delay = max(delay, float(retry_after))
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                if attempt < self.retries:
+                    await asyncio.sleep(delay)
+        self.failures += 1
+        return False, None
+
+async def check_rows(rows: List[Row], provider: str, base_url: str, names: Dict[str, str], rate: float,
+                     concurrency: int, retries: int, cache: Optional[ValidationCache]) -> List[Dict]:
+    """Fetch and compare every row; molecules sharing a lookup name are fetched once"""
+    queries = {query_name(name, names) for _, name, _, _ in rows}
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        fetcher = ReferenceFetcher(session, provider, base_url, TokenBucket(rate), cache, concurrency, retries)
+        order = sorted(queries)
+        fetched = dict(zip(order, await asyncio.gather(*(fetcher.fetch(q) for q in order))))
+    print(f"Requests: {fetcher.requests} for {len(queries)} names, {fetcher.failures} failed", file=sys.stderr)
+
+    results = []
+    for _, name, formula, smiles in rows:
+        query = query_name(name, names)
+        answered, reference = fetched[query]
+        status = compare(smiles, reference) if answered else 'error'
+        results.append({'name': name, 'query': query, 'smiles': smiles, 'reference': reference, 'status': status})
+    return results
+
+def stub_app(rows: Iterable[Row], names: Dict[str, str]):
+    """aiohttp app answering Cactus and PubChem style requests from a catalogue"""
+    table = {}
+    for _, name, _, smiles in rows:
+        table.setdefault(query_name(name, names), smiles)
+
+    async def cactus(request):
+        smiles = table.get(request.match_info['query'])
+        if smiles is None:
+            return web.Response(status=404, text="Page not found (404)")
+        return web.Response(text=smiles + '\n')
+
+    async def pubchem(request):
+        smiles = table.get(request.match_info['query'])
+        if smiles is None:
+            return web.json_response({'Fault': {'Code': 'PUGREST.NotFound'}}, status=404)
+        return web.json_response({'PropertyTable': {'Properties': [{'CID': 0, 'IsomericSMILES': smiles}]}})
+
+    app = web.Application()
+    app.router.add_get('/{query}/smiles', cactus)
+    app.router.add_get('/{query}/property/IsomericSMILES/JSON', pubchem)
+    return app
+
+def load_rows(source: str, fmt: Optional[str]) -> List[Row]:
+    return list(iter_text_rows(molecules_data) if source == 'embedded' else iter_rows(source, fmt))
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Cross-check SMILES against Cactus/PubChem by InChIKey")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command in ('check', 'stub'):
+        p = sub.add_parser(command, help="compare against a reference service" if command == 'check'
+                           else "serve a catalogue as a local Cactus/PubChem stand-in")
+        p.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                       help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                            "(default: src/data/molecules.js); 'embedded' uses validate_all_smiles' rows")
+        p.add_argument('--format', choices=FORMATS)
+        p.add_argument('--names', default=CACTUS_NAMES_JS, help="cactusQuery mapping (default: scripts/cactus-names.js)")
+    check = sub.choices['check']
+    check.add_argument('--provider', choices=PROVIDERS, default='cactus')
+    check.add_argument('--base-url', help="service root, e.g. http://127.0.0.1:8765 for the stub "
+                                          "(default: the provider's public URL)")
+    check.add_argument('--rate', type=float, help="requests per second (default: 8 for cactus, 5 for pubchem)")
+    check.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    check.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    check.add_argument('--output', default='reference_check.json',
+                       help="molecules that do not match; *.jsonl writes JSON Lines")
+    check.add_argument('--cache', default=DEFAULT_CACHE_PATH)
+    check.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES)
+    check.add_argument('--no-cache', action='store_true', help="always ask the service")
+    stub = sub.choices['stub']
+    stub.add_argument('--host', default='127.0.0.1')
+    stub.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if aiohttp is None:
+        parser.error("aiohttp is required: pip install aiohttp")
+    rows = load_rows(args.input, args.format)
+    names = load_cactus_names(args.names)
+    if args.command == 'stub':
+        web.run_app(stub_app(rows, names), host=args.host, port=args.port)
+        return
+
+    base_url = args.base_url or PROVIDERS[args.provider]
+    rate = args.rate or DEFAULT_RATES[args.provider]
+    cache = None
+    if not args.no_cache:
+        cache = ValidationCache(args.cache, args.cache_size, namespace=f'reference:{args.provider}:{base_url}')
+    try:
+        results = asyncio.run(check_rows(rows, args.provider, base_url, names, rate,
+                                         args.concurrency, args.retries, cache))
+    finally:
+        if cache is not None:
+            cache.close()
+
+    counts = {}
+    with open_error_sink(args.output) as sink:
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            if result['status'] != 'match':
+                sink.write(result)
+                print(f"X {result['name']} ({result['query']}): {result['status']}")
+    print(f"\nChecked {len(results)} molecules: " + ', '.join(f"{n} {s}" for s, n in sorted(counts.items())))
+    if cache is not None:
+        print(cache.summary())
+    print(f"Report saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
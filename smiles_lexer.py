@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Single-pass SMILES lexer used as a prefilter in front of RDKit
+Tokenizes a SMILES once, checking bracket and branch balance, ring-closure pairing,
+bond placement and element symbols, and counts heavy atoms by element. Strings it
+rejects are ones RDKit's parser rejects too, so validators can report them, or a
+heavy-atom formula mismatch, without paying for MolFromSmiles. RDKit's error log is
+captured per molecule instead of going to stderr.
+"""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from rdkit import Chem, rdBase
+
+import formula as chem_formula
+
+# A run of organic-subset atoms is one token, since nothing between them needs checking;
+# bracket atoms, '\\', %nn and %(n) are multi-character tokens and every other character
+# is a token on its own
+TOKEN_PATTERN = re.compile(r'(?:Cl|Br|[BCNOPSFIbcnops*])+|\[[^\[\]]*\]|\\\\|%\d\d|%\(\d{1,5}\)|.', re.DOTALL)
+
+# Like RDKit, skip leading whitespace and stop at the next one; the rest is a name or title
+SMILES_SPAN = re.compile(r'\s*\S*')
+
+# Individual atoms, for counting once the SMILES is known to be well formed
+ATOM_PATTERN = re.compile(r'\[[^\[\]]*\]|Cl|Br|[BCNOPSFIbcnops*]')
+
+# Isotope and element symbol or atomic number (#6) of a bracket atom; the rest of the bracket is left to RDKit
+BRACKET_SYMBOL = re.compile(r'\[\d*([A-Z][a-z]?|[a-z][a-z]?|\*|#\d+)')
+
+# Lower-case symbols RDKit accepts for aromatic atoms in brackets
+AROMATIC_SYMBOLS = {'b': 'B', 'c': 'C', 'n': 'N', 'o': 'O', 'p': 'P', 's': 'S',
+                    'si': 'Si', 'as': 'As', 'se': 'Se', 'te': 'Te'}
+
+ORGANIC = {'Cl': 'Cl', 'Br': 'Br', 'B': 'B', 'C': 'C', 'N': 'N', 'O': 'O', 'P': 'P', 'S': 'S', 'F': 'F', 'I': 'I',
+           'b': 'B', 'c': 'C', 'n': 'N', 'o': 'O', 'p': 'P', 's': 'S'}
+
+# Token kinds by the first character of a token
+ATOM, BRACKET, RING, BOND, OPEN, CLOSE, DOT, SPACE = range(8)
+TOKEN_KINDS = {**{t: ATOM for t in ORGANIC if len(t) == 1}, '*': ATOM, '[': BRACKET,
+               **{c: RING for c in '0123456789%'}, **{c: BOND for c in '-=#$:/\\'},
+               '(': OPEN, ')': CLOSE, '.': DOT, **{c: SPACE for c in ' \t\r\n\f\v'}}
+
+# What the previous token left the parser expecting; after an atom, ring bond or
+# closed branch anything may follow
+START, AFTER_ATOM, AFTER_BOND, AFTER_OPEN, AFTER_DOT = range(5)
+
+# Timestamp RDKit puts in front of every log line
+LOG_TIMESTAMP = re.compile(r'^\[\d\d:\d\d:\d\d\] ')
+
+class Lexed(NamedTuple):
+    """Outcome of lexing one SMILES: an error message, or heavy-atom counts by element"""
+    error: Optional[str]
+    heavy_atoms: Dict[str, int]
+    wildcard: bool = False
+
+@lru_cache(maxsize=4096)
+def bracket_element(token: str) -> Optional[str]:
+    """Capitalised element symbol of a bracket atom, '*' for a wildcard, or None if unknown"""
+    match = BRACKET_SYMBOL.match(token)
+    if not match:
+        return None
+    symbol = match.group(1)
+    if symbol == '*':
+        return symbol
+    if symbol[0] == '#':
+        # RDKit reads [#0] as a wildcard and rejects leading zeros such as [#06]
+        number = symbol[1:]
+        if len(number) > 1 and number[0] == '0':
+            return None
+        z = int(number)
+        return chem_formula.ELEMENT_SYMBOLS[z] if z < chem_formula.CHARGE_INDEX else None
+    if symbol[0].islower():
+        # [se], [as]; [sH], [nH+] and [cH-] only match one lower-case letter
+        return AROMATIC_SYMBOLS.get(symbol)
+    if symbol in chem_formula.ATOMIC_NUMBERS:
+        return symbol
+    return None
+
+def _position(tokens: List[str], index: int) -> int:
+    """1-based character position of tokens[index]"""
+    return sum(map(len, tokens[:index])) + 1
+
+def _error(message: str) -> Lexed:
+    return Lexed(message, {})
+
+def lex(smiles: str) -> Lexed:
+    """Tokenize a SMILES in one pass, returning the first syntax error or the heavy-atom histogram"""
+    rings: Dict[int, int] = {}
+    depth = 0
+    state = START
+    kind_of = TOKEN_KINDS.get
+    smiles = SMILES_SPAN.match(smiles).group()
+    if smiles and smiles.isspace():
+        return _error("SMILES is only whitespace")
+    tokens = TOKEN_PATTERN.findall(smiles)
+    for index, token in enumerate(tokens):
+        kind = kind_of(token[0])
+        if kind == SPACE:
+            # Only leading whitespace is left in the span
+            continue
+        if kind == ATOM:
+            state = AFTER_ATOM
+        elif kind == BRACKET:
+            if token[-1] != ']':
+                return _error(f"Unclosed bracket atom at position {_position(tokens, index)}")
+            if bracket_element(token) is None:
+                return _error(f"Unknown element in {token} at position {_position(tokens, index)}")
+            state = AFTER_ATOM
+        elif kind == RING:
+            if state == START or state == AFTER_OPEN or state == AFTER_DOT:
+                return _error(f"Ring bond {token} at position {_position(tokens, index)} does not follow an atom")
+            if token == '%':
+                return _error(f"Ring bond % at position {_position(tokens, index)} needs two digits "
+                              f"or a number in parentheses")
+            # 1, %01 and %(1) are the same ring bond
+            number = int(token.strip('%()'))
+            if number in rings:
+                del rings[number]
+            else:
+                rings[number] = index
+            state = AFTER_ATOM
+        elif kind == BOND:
+            if state == START or state == AFTER_BOND or state == AFTER_DOT:
+                return _error(f"Bond '{token[0]}' at position {_position(tokens, index)} does not follow an atom")
+            state = AFTER_BOND
+        elif kind == OPEN:
+            if state != AFTER_ATOM:
+                return _error(f"Branch at position {_position(tokens, index)} does not follow an atom")
+            depth += 1
+            state = AFTER_OPEN
+        elif kind == CLOSE:
+            if depth == 0:
+                return _error(f"Unmatched ')' at position {_position(tokens, index)}")
+            if state == AFTER_OPEN:
+                return _error(f"Empty branch at position {_position(tokens, index) - 1}")
+            if state == AFTER_BOND:
+                return _error(f"Bond before ')' at position {_position(tokens, index)} is not followed by an atom")
+            depth -= 1
+            state = AFTER_ATOM
+        elif kind == DOT:
+            if state != AFTER_ATOM:
+                return _error(f"'.' at position {_position(tokens, index)} does not follow an atom")
+            state = AFTER_DOT
+        else:
+            return _error(f"Unexpected character {token!r} at position {_position(tokens, index)}")
+    if state == AFTER_BOND:
+        return _error("SMILES ends with a bond")
+    if state == AFTER_DOT:
+        return _error("SMILES ends with '.'")
+    if depth:
+        return _error(f"Unclosed branch: {depth} '(' without ')'")
+    if rings:
+        number, index = next(iter(rings.items()))
+        return _error(f"Unclosed ring bond {number} at position {_position(tokens, index)}")
+
+    # Well formed: count atoms per distinct token, which Counter does in C
+    heavy: Dict[str, int] = {}
+    wildcard = False
+    for token, count in Counter(ATOM_PATTERN.findall(smiles)).items():
+        # A bare '*' is neither in the organic subset nor a bracket atom
+        element = '*' if token == '*' else ORGANIC.get(token) or bracket_element(token)
+        if element == '*':
+            wildcard = True
+        elif element != 'H':
+            heavy[element] = heavy.get(element, 0) + count
+    return Lexed(None, heavy, wildcard)
+
+@lru_cache(maxsize=chem_formula.CACHE_SIZE)
+def formula_heavy_atoms(formula: str) -> Optional[Dict[str, int]]:
+    """Non-hydrogen element counts of a formula, or None if it cannot be parsed"""
+    try:
+        counts = chem_formula.parse(formula).counts
+    except chem_formula.FormulaError:
+        return None
+    return {e: n for e, n in counts if e != 'H'}
+
+def heavy_atom_mismatch(lexed: Lexed, formula: str) -> Optional[Dict[str, int]]:
+    """Heavy-atom counts of the expected formula when they differ from the SMILES, else None
+
+    Returns None whenever the comparison cannot be made without RDKit: a wildcard
+    atom, an unparseable formula or a lexer error.
+    """
+    if lexed.error or lexed.wildcard or not formula:
+        return None
+    expected = formula_heavy_atoms(formula)
+    if expected is None or expected == lexed.heavy_atoms:
+        return None
+    return dict(expected)
+
+def clean_log(messages: str) -> List[str]:
+    """Log lines without RDKit's timestamps"""
+    return [LOG_TIMESTAMP.sub('', line) for line in messages.splitlines() if line.strip()]
+
+def logged_mol_from_smiles(smiles: str, parse=Chem.MolFromSmiles) -> Tuple[Optional[object], List[str]]:
+    """Parse with parse(smiles), capturing RDKit's error log for this molecule instead of printing it"""
+    if not hasattr(rdBase, 'CaptureErrorLog'):
+        # Older RDKit: the log still goes to stderr
+        return parse(smiles), []
+    with rdBase.CaptureErrorLog() as capture:
+        mol = parse(smiles)
+    return mol, clean_log(capture.messages)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Substructure and similarity search index for the molecule catalogue
+Stores packed Morgan and pattern fingerprints in one memory-mapped file. Queries screen
+candidates with vectorised bit tests / Tanimoto over the packed arrays and only run
+RDKit's exact substructure match on the molecules that survive the screen.
+
+Index file layout (all sections 64-byte aligned, little-endian):
+  magic 'KJFPIDX2' | uint32 header length | JSON header
+  morgan      uint8[count, nbits / 8]   packed Morgan fingerprints
+  pattern     uint8[count, nbits / 8]   packed pattern fingerprints
+  popcount    uint16[count]             on-bits per Morgan fingerprint
+  offsets     uint64[count + 1]         byte offsets into text
+  text        UTF-8 'name<TAB>smiles' records
+  mol_offsets uint64[count + 1]         byte offsets into mols
+  mols        RDKit binary molecules, so exact matching skips SMILES parsing
+"""
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from rdkit import Chem, DataStructs, rdBase
+from rdkit.Chem import rdFingerprintGenerator
+
+from molecule_reader import FORMATS, Row, iter_rows, iter_text_rows
+from validate_all_smiles import DEFAULT_MOLECULES_JS, molecules_data, validate_smiles
+
+MAGIC = b'KJFPIDX2'
+ALIGNMENT = 64
+DEFAULT_NBITS = 2048
+MORGAN_RADIUS = 2
+DEFAULT_INDEX_PATH = os.path.join('.cache', 'substructure.idx')
+SECTIONS = ('morgan', 'pattern', 'popcount', 'offsets', 'text', 'mol_offsets', 'mols')
+
+# Rows scanned per vectorised block, bounding temporary memory during queries
+SCAN_BLOCK = 1 << 16
+
+# Ready-made queries for the website's structure search
+NAMED_QUERIES = {
+    'steroid': '[#6]1~[#6]~[#6]~[#6]2~[#6](~[#6]~1)~[#6]~[#6]~[#6]1~[#6]~2~[#6]~[#6]~[#6]2~[#6]~[#6]~[#6]~[#6]~1~2',
+    'carboxylic_acid': '[CX3](=O)[OX2H1,OX1-]',
+    'ester': '[#6][CX3](=O)[OX2H0][#6]',
+    'amide': '[NX3][CX3](=[OX1])',
+    'primary_amine': '[NX3;H2;!$(NC=O)][#6]',
+    'phenol': '[OX2H]c1ccccc1',
+    'benzene': 'c1ccccc1',
+    'indole': 'c1ccc2[nH]ccc2c1',
+    'thiol': '[#16X2H]',
+    'phosphate': 'P(=O)(O)O',
+}
+
+if hasattr(np, 'bitwise_count'):
+    def popcount_rows(packed: np.ndarray) -> np.ndarray:
+        """On-bits per row of a packed uint8 matrix"""
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.uint32)
+else:
+    POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount_rows(packed: np.ndarray) -> np.ndarray:
+        """On-bits per row of a packed uint8 matrix"""
+        return POPCOUNT_TABLE[packed].sum(axis=1, dtype=np.uint32)
+
+def morgan_generator(nbits: int = DEFAULT_NBITS):
+    return rdFingerprintGenerator.GetMorganGenerator(radius=MORGAN_RADIUS, fpSize=nbits)
+
+def pattern_bits(mol, nbits: int = DEFAULT_NBITS) -> np.ndarray:
+    """Packed pattern fingerprint of a molecule or SMARTS query"""
+    bits = np.zeros(nbits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(mol, fpSize=nbits), bits)
+    return np.packbits(bits)
+
+def fingerprint_row(smiles: str, generator, nbits: int) -> Optional[Tuple[np.ndarray, np.ndarray, bytes]]:
+    """Packed (Morgan, pattern) fingerprints and binary Mol of a SMILES, or None if RDKit cannot parse it"""
+    mol, error = validate_smiles(smiles)
+    if error:
+        return None
+    return np.packbits(generator.GetFingerprintAsNumPy(mol)), pattern_bits(mol, nbits), mol.ToBinary()
+
+def aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def build_index(rows: Iterable[Row], path: str = DEFAULT_INDEX_PATH, nbits: int = DEFAULT_NBITS) -> Dict:
+    """Fingerprint every parseable row and write the index file; returns build statistics
+
+    Sections are streamed to temporary files first, so memory does not grow
+    with the catalogue. Fingerprints are computed once per distinct SMILES.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    generator = morgan_generator(nbits)
+    parts = {name: open(f"{path}.{name}.tmp", 'wb') for name in SECTIONS}
+    seen: Dict[str, Optional[Tuple[np.ndarray, np.ndarray, bytes]]] = {}
+    count = skipped = distinct = 0
+    text_size = mols_size = 0
+    start = time.perf_counter()
+    try:
+        parts['offsets'].write(struct.pack('<Q', 0))
+        parts['mol_offsets'].write(struct.pack('<Q', 0))
+        for _, name, _, smiles in rows:
+            if smiles not in seen:
+                if len(seen) >= 1 << 20:
+                    seen.clear()
+                seen[smiles] = fingerprint_row(smiles, generator, nbits)
+                distinct += 1
+            fps = seen[smiles]
+            if fps is None:
+                skipped += 1
+                continue
+            morgan, pattern, binary = fps
+            parts['morgan'].write(morgan.tobytes())
+            parts['pattern'].write(pattern.tobytes())
+            parts['popcount'].write(struct.pack('<H', int(popcount_rows(morgan[None, :])[0])))
+            record = f"{name}\t{smiles}".encode('utf-8')
+            parts['text'].write(record)
+            text_size += len(record)
+            parts['offsets'].write(struct.pack('<Q', text_size))
+            parts['mols'].write(binary)
+            mols_size += len(binary)
+            parts['mol_offsets'].write(struct.pack('<Q', mols_size))
+            count += 1
+    finally:
+        for f in parts.values():
+            f.close()
+
+    sizes = {name: os.path.getsize(f"{path}.{name}.tmp") for name in parts}
+    header = {'count': count, 'nbits': nbits, 'radius': MORGAN_RADIUS, 'rdkit': rdBase.rdkitVersion, 'sections': {}}
+    # Header length is fixed before section offsets are known, so reserve room for them
+    offset = aligned(len(MAGIC) + 4 + 1024)
+    for name in SECTIONS:
+        header['sections'][name] = [offset, sizes[name]]
+        offset = aligned(offset + sizes[name])
+    header_bytes = json.dumps(header).encode('utf-8')
+    if len(header_bytes) > 1024:
+        raise ValueError("Index header too large")
+
+    with open(path, 'wb') as out:
+        out.write(MAGIC)
+        out.write(struct.pack('<I', len(header_bytes)))
+        out.write(header_bytes)
+        for name in SECTIONS:
+            out.write(b'\0' * (header['sections'][name][0] - out.tell()))
+            with open(f"{path}.{name}.tmp", 'rb') as part:
+                shutil.copyfileobj(part, out)
+            os.remove(f"{path}.{name}.tmp")
+
+    return {'molecules': count, 'skipped': skipped, 'distinct_smiles': distinct,
+            'seconds': round(time.perf_counter() - start, 3), 'bytes': os.path.getsize(path)}
+
+class SubstructureIndex:
+    """Read-only, memory-mapped view of an index file written by build_index"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a substructure index")
+            (length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(length))
+        self.count = self.header['count']
+        self.nbits = self.header['nbits']
+        width = self.nbits // 8
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        self.morgan = self._section('morgan', np.uint8).reshape(self.count, width)
+        self.pattern = self._section('pattern', np.uint8).reshape(self.count, width)
+        self.popcount = self._section('popcount', np.uint16)
+        self.offsets = self._section('offsets', np.uint64)
+        self.text = self._section('text', np.uint8)
+        self.mol_offsets = self._section('mol_offsets', np.uint64)
+        self.mols = self._section('mols', np.uint8)
+        self._generator = morgan_generator(self.nbits)
+        self._names: Optional[Dict[str, int]] = None
+
+    def _section(self, name: str, dtype) -> np.ndarray:
+        offset, size = self.header['sections'][name]
+        return self._data[offset:offset + size].view(dtype)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, i: int) -> Tuple[str, str]:
+        """(name, smiles) of molecule i"""
+        raw = self.text[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode('utf-8')
+        name, smiles = raw.split('\t', 1)
+        return name, smiles
+
+    def mol(self, i: int) -> Chem.Mol:
+        """Parsed molecule i, restored from its stored binary form"""
+        return Chem.Mol(self.mols[int(self.mol_offsets[i]):int(self.mol_offsets[i + 1])].tobytes())
+
+    def find(self, name: str) -> Optional[int]:
+        """Index of the first molecule with the given name"""
+        if self._names is None:
+            self._names = {}
+            for i in range(self.count):
+                self._names.setdefault(self.record(i)[0], i)
+        return self._names.get(name)
+
+    def screen(self, query) -> np.ndarray:
+        """Indices whose pattern fingerprint contains every bit of the query's"""
+        bits = pattern_bits(query, self.nbits)
+        hits = []
+        for start in range(0, self.count, SCAN_BLOCK):
+            block = self.pattern[start:start + SCAN_BLOCK]
+            hits.append(np.flatnonzero(((block & bits) == bits).all(axis=1)) + start)
+        return np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+
+    def substructure(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, str, str]]:
+        """Molecules containing a SMARTS/SMILES query or a NAMED_QUERIES key, as (index, name, smiles)"""
+        pattern = Chem.MolFromSmarts(NAMED_QUERIES.get(query, query))
+        if pattern is None:
+            raise ValueError(f"Invalid substructure query {query!r}")
+        pattern.UpdatePropertyCache(strict=False)
+        Chem.FastFindRings(pattern)
+        matches = []
+        for i in self.screen(pattern):
+            if self.mol(i).HasSubstructMatch(pattern):
+                matches.append((int(i), *self.record(i)))
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def tanimoto(self, smiles: str) -> np.ndarray:
+        """Tanimoto similarity of every indexed molecule to a SMILES"""
+        mol, error = validate_smiles(smiles)
+        if error:
+            raise ValueError(f"Invalid SMILES {smiles!r}: {error}")
+        query = np.packbits(self._generator.GetFingerprintAsNumPy(mol))
+        query_count = int(popcount_rows(query[None, :])[0])
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK):
+            block = self.morgan[start:start + SCAN_BLOCK]
+            common = popcount_rows(block & query)
+            union = self.popcount[start:start + SCAN_BLOCK].astype(np.uint32) + query_count - common
+            scores[start:start + len(block)] = np.where(union > 0, common / np.maximum(union, 1), 1.0)
+        return scores
+
+    def similar(self, smiles: str, k: int = 10, threshold: float = 0.0) -> List[Tuple[int, str, float]]:
+        """The k most similar molecules to a SMILES, as (index, name, Tanimoto)"""
+        scores = self.tanimoto(smiles)
+        k = min(k, self.count)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), self.record(i)[0], float(scores[i])) for i in top if scores[i] >= threshold]
+
+    def neighbours(self, name: str, k: int = 10) -> List[Tuple[int, str, float]]:
+        """Nearest neighbours of a catalogue molecule by name, excluding itself"""
+        i = self.find(name)
+        if i is None:
+            raise KeyError(name)
+        return [hit for hit in self.similar(self.record(i)[1], k + 1) if hit[0] != i][:k]
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Build or query the substructure/similarity index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="fingerprint a catalogue into an index file")
+    build.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                       help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                            "(default: src/data/molecules.js); 'embedded' uses validate_all_smiles' rows")
+    build.add_argument('--format', choices=FORMATS)
+    build.add_argument('--nbits', type=int, default=DEFAULT_NBITS)
+    build.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    query = sub.add_parser('query', help="search an index")
+    query.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    group = query.add_mutually_exclusive_group(required=True)
+    group.add_argument('--substructure', metavar='SMARTS',
+                       help=f"SMARTS/SMILES or one of: {', '.join(NAMED_QUERIES)}")
+    group.add_argument('--similar', metavar='SMILES')
+    group.add_argument('--neighbours', metavar='NAME')
+    query.add_argument('-k', type=int, default=10, help="results for similarity queries")
+    query.add_argument('--limit', type=int, help="stop after this many substructure hits")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        rows = iter_text_rows(molecules_data) if args.input == 'embedded' else iter_rows(args.input, args.format)
+        stats = build_index(rows, args.index, args.nbits)
+        print(f"Indexed {stats['molecules']} molecules ({stats['skipped']} unparseable) in {stats['seconds']} s, "
+              f"{stats['bytes']} bytes: {args.index}")
+        return
+
+    index = SubstructureIndex(args.index)
+    start = time.perf_counter()
+    if args.substructure:
+        results = [(i, name, smiles) for i, name, smiles in index.substructure(args.substructure, args.limit)]
+    elif args.similar:
+        results = index.similar(args.similar, args.k)
+    else:
+        results = index.neighbours(args.neighbours, args.k)
+    elapsed = (time.perf_counter() - start) * 1000
+    for result in results:
+        print('\t'.join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in result))
+    print(f"{len(results)} results in {elapsed:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Reproducible synthetic molecule catalogues for benchmarks
+Builds catalogues of any size from the embedded rows and src/data/molecules.js by
+enumerating randomised SMILES, adding methyl groups, perturbing formulas and breaking
+SMILES, with large peptides and organometallics mixed in. The same (rows, seed) always
+gives the same catalogue.
+"""
+
+import argparse
+import csv
+import gzip
+import os
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rdkit import Chem, RDLogger
+from rdkit.Chem import rdMolDescriptors
+
+import formula as chem_formula
+from molecule_reader import Row, iter_rows, iter_text_rows
+from validate_all_smiles import DEFAULT_MOLECULES_JS, molecules_data
+
+DEFAULT_SEED = 287
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'synthetic')
+
+# Distinct variants generated before rows are sampled; bounds generation time at 1M rows
+POOL_SIZE = 20000
+
+# Share of rows of each kind; the rest are valid variants
+MIX = {'pathological': 0.04, 'formula_mismatch': 0.04, 'malformed': 0.02}
+
+# Entries that are slow or unusual for the validator: large peptides, organometallics, salts
+PATHOLOGICAL = ('Oxytocin', 'Kobalamin (B12)', 'Vitamin B12', 'Organotin', 'Siloksan', 'Koensym Q10',
+                'Glutathion', 'L-Glutathion', 'Natriumoksalat', 'Epigallocatechingallat')
+
+SUBSCRIPTS = str.maketrans('0123456789', '₀₁₂₃₄₅₆₇₈₉')
+SUPERSCRIPTS = str.maketrans('0123456789', '⁰¹²³⁴⁵⁶⁷⁸⁹')
+
+def format_counts(counts: Dict[str, int]) -> str:
+    """Hill order (C, H, then alphabetical) with subscript digits"""
+    order = sorted(counts, key=lambda e: (e != 'C', e != 'H', e) if 'C' in counts else e)
+    return ''.join(f"{e}{counts[e] if counts[e] > 1 else ''}" for e in order).translate(SUBSCRIPTS)
+
+def hill_formula(mol) -> str:
+    """Catalogue-style formula with subscript digits and a superscript charge"""
+    parsed = chem_formula.parse(rdMolDescriptors.CalcMolFormula(mol))
+    text = format_counts(dict(parsed.counts))
+    if parsed.charge:
+        magnitude = str(abs(parsed.charge)).translate(SUPERSCRIPTS) if abs(parsed.charge) > 1 else ''
+        text += magnitude + ('⁺' if parsed.charge > 0 else '⁻')
+    return text
+
+def base_rows() -> List[Row]:
+    """Distinct (by SMILES) rows of the embedded catalogue and molecules.js"""
+    rows = list(iter_text_rows(molecules_data))
+    if os.path.exists(DEFAULT_MOLECULES_JS):
+        rows += list(iter_rows(DEFAULT_MOLECULES_JS))
+    seen = set()
+    distinct = []
+    for row in rows:
+        if row[3] not in seen:
+            seen.add(row[3])
+            distinct.append(row)
+    return distinct
+
+def add_methyl(mol, rng: random.Random):
+    """Copy of mol with a methyl group on a random carbon that carries a hydrogen, or None"""
+    sites = [a.GetIdx() for a in mol.GetAtoms() if a.GetSymbol() == 'C' and a.GetTotalNumHs() > 0]
+    if not sites:
+        return None
+    edited = Chem.RWMol(mol)
+    carbon = edited.AddAtom(Chem.Atom(6))
+    edited.AddBond(rng.choice(sites), carbon, Chem.BondType.SINGLE)
+    try:
+        Chem.SanitizeMol(edited)
+    except Exception:
+        return None
+    return edited.GetMol()
+
+def perturb_formula(formula: str, rng: random.Random) -> str:
+    """Change one element count in a formula so it no longer matches its SMILES"""
+    parsed = chem_formula.parse(formula)
+    counts = dict(parsed.counts)
+    element = rng.choice(sorted(counts))
+    counts[element] = max(1, counts[element] + rng.choice((-2, -1, 1, 2)))
+    if counts == dict(parsed.counts):
+        counts[element] += 1
+    return format_counts(counts)
+
+def break_smiles(smiles: str, rng: random.Random) -> str:
+    """Corrupt a SMILES: unbalanced branch, dangling ring bond, bad atom or truncation"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return smiles + '('
+    if kind == 1:
+        return smiles + '9'
+    if kind == 2:
+        position = rng.randrange(len(smiles) + 1)
+        return smiles[:position] + 'Xq' + smiles[position:]
+    return smiles[:max(1, len(smiles) // 2)] + '=('
+
+def build_pool(seed: int = DEFAULT_SEED, size: int = POOL_SIZE) -> Dict[str, List[Tuple[str, str, str]]]:
+    """Distinct (name, formula, smiles) variants of every kind"""
+    rng = random.Random(seed)
+    RDLogger.DisableLog('rdApp.*')
+    parsed = []
+    for _, name, formula, smiles in base_rows():
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is not None:
+            parsed.append((name, formula, smiles, mol))
+
+    pool = {'valid': [], 'pathological': [], 'formula_mismatch': [], 'malformed': []}
+    for name, formula, smiles, mol in parsed:
+        if name in PATHOLOGICAL:
+            pool['pathological'].append((name, formula, smiles))
+    seen = set()
+    attempts = 0
+    while len(pool['valid']) < size and attempts < size * 4:
+        attempts += 1
+        name, formula, smiles, mol = rng.choice(parsed)
+        if rng.random() < 0.5:
+            variant = Chem.MolToSmiles(mol, doRandom=True, canonical=False)
+            entry = (name, hill_formula(mol), variant)
+        else:
+            methylated = add_methyl(mol, rng)
+            if methylated is None:
+                continue
+            entry = (f"Metyl-{name}", hill_formula(methylated), Chem.MolToSmiles(methylated, doRandom=True,
+                                                                                canonical=False))
+        if entry[2] in seen:
+            continue
+        seen.add(entry[2])
+        pool['valid'].append(entry)
+        if name in PATHOLOGICAL:
+            pool['pathological'].append(entry)
+    for name, formula, smiles in pool['valid'][:size // 10]:
+        pool['formula_mismatch'].append((name, perturb_formula(formula, rng), smiles))
+        pool['malformed'].append((name, formula, break_smiles(smiles, rng)))
+    RDLogger.EnableLog('rdApp.*')
+    return pool
+
+def iter_synthetic(rows: int, seed: int = DEFAULT_SEED) -> Iterator[Row]:
+    """Yield a reproducible synthetic catalogue of the given size"""
+    pool = build_pool(seed, min(POOL_SIZE, max(rows, 100)))
+    rng = random.Random(seed + 1)
+    thresholds = []
+    total = 0.0
+    for kind, share in MIX.items():
+        total += share
+        thresholds.append((total, kind))
+    for i in range(1, rows + 1):
+        draw = rng.random()
+        kind = next((k for limit, k in thresholds if draw < limit), 'valid')
+        name, formula, smiles = rng.choice(pool[kind] or pool['valid'])
+        yield i, f"{name} #{i}", formula, smiles
+
+def catalogue_path(rows: int, seed: int = DEFAULT_SEED, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """CSV (gzip) of a synthetic catalogue, generated on first use"""
+    path = os.path.join(cache_dir, f"synthetic-{rows}-{seed}.csv.gz")
+    if not os.path.exists(path):
+        write_catalogue(iter_synthetic(rows, seed), path)
+    return path
+
+def write_catalogue(rows: Iterator[Row], path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path + '.tmp', 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('name', 'formula', 'smiles'))
+        for _, name, formula, smiles in rows:
+            writer.writerow((name, formula, smiles))
+    os.replace(path + '.tmp', path)
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Write a reproducible synthetic molecule catalogue")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output', help="CSV path, gzip-compressed when it ends in .gz")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    write_catalogue(iter_synthetic(args.rows, args.seed), args.output)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+from benchmark_smiles import compare_results
+
+def bench(rate, rss=100.0):
+    return {'molecules_per_sec': rate, 'peak_rss_mb': rss}
+
+BASELINE = {'benchmarks': {'validate/1000': bench(1000.0), 'validate/10000': bench(2000.0),
+                           'dedup/1000': bench(500.0)}}
+
+def test_slower_benchmarks_regress():
+    current = {'benchmarks': {'validate/1000': bench(950.0), 'validate/10000': bench(1500.0),
+                              'dedup/1000': bench(600.0)}}
+    changes, regressions = compare_results(BASELINE, current, 0.1)
+    assert regressions == ['validate/10000']
+    assert [c['change'] for c in changes] == [-0.05, -0.25, 0.2]
+
+def test_missing_or_failed_benchmarks_regress():
+    current = {'benchmarks': {'validate/1000': bench(1000.0), 'dedup/1000': bench(0.0)}}
+    changes, regressions = compare_results(BASELINE, current, 0.1)
+    assert regressions == ['validate/10000', 'dedup/1000']
+    assert [c['current'] for c in changes] == [1000.0, None, None]
@@ -0,0 +1,14 @@
+import formula
+from element_table import check_masses, compile_table, load_element_table
+
+def test_dummy_atom_is_a_known_massless_element(tmp_path):
+    table = compile_table([(1, 'H', 1.008), (6, 'C', 12.011)], 'test')
+    assert table.present[0] and table.mass[0] == 0.0
+    vectors = [formula.vector('CH3*'), formula.vector('CH3Xe')]
+    assert check_masses(vectors, [15.035, 15.035], table) == [None, "Unknown element: Xe not in elements.js"]
+
+def test_cached_table_keeps_the_dummy_atom(tmp_path):
+    cache_path = str(tmp_path / 'elements.npz')
+    load_element_table(cache_path=cache_path)
+    table = load_element_table(cache_path=cache_path)
+    assert table.present[0] and table.present[6]
@@ -0,0 +1,53 @@
+import pytest
+from rdkit import Chem
+from rdkit.Chem import rdMolDescriptors
+
+import formula
+from formula import FormulaError
+
+@pytest.mark.parametrize('smiles', ['*C(=O)O', 'C*', '*CC*'])
+def test_dummy_atoms_are_counted(smiles):
+    mol = Chem.MolFromSmiles(smiles)
+    calculated = rdMolDescriptors.CalcMolFormula(mol)
+    assert '*' in calculated
+    assert formula.vector(calculated) == formula.mol_vector(mol)
+
+def test_dummy_atom_is_not_a_hydrate_dot():
+    assert formula.parse('CH3*') == formula.parse('CH3*1')
+    assert formula.parse('CH3*') != formula.parse('CH3')
+
+@pytest.mark.parametrize('formula_str', ['CuSO4.', 'CuSO₄·', '.H2O', 'CuSO4..5H2O', 'CuSO4·5'])
+def test_rejects_empty_hydrate_part(formula_str):
+    with pytest.raises(FormulaError, match='Empty hydrate part'):
+        formula.parse(formula_str)
+
+@pytest.mark.parametrize('formula_str, counts, charge', [
+    ('[Co(NH3)6]3+', {'Co': 1, 'N': 6, 'H': 18}, 3),
+    ('[Co(NH₃)₆]³⁺', {'Co': 1, 'N': 6, 'H': 18}, 3),
+    ('[Fe(CN)6]4-', {'Fe': 1, 'C': 6, 'N': 6}, -4),
+    ('[Cu(H2O)6]+', {'Cu': 1, 'H': 12, 'O': 6}, 1),
+    ('[Co(NH3)6]Cl3', {'Co': 1, 'N': 6, 'H': 18, 'Cl': 3}, 0),
+    ('Fe2(SO4)3', {'Fe': 2, 'S': 3, 'O': 12}, 0),
+    ('CuSO₄·5H₂O', {'Cu': 1, 'S': 1, 'O': 9, 'H': 10}, 0),
+])
+def test_bracket_charge(formula_str, counts, charge):
+    parsed = formula.parse(formula_str)
+    assert parsed.as_dict() == counts
+    assert parsed.charge == charge
+
+@pytest.mark.parametrize('formula_str', ['[Co(NH3)6)', '(Co(NH3]6)', '[Co(NH3)6', 'Co(NH3)6]', 'C{H3]'])
+def test_rejects_mismatched_brackets(formula_str):
+    with pytest.raises(FormulaError):
+        formula.parse(formula_str)
+
+def test_braces_are_parentheses():
+    assert formula.parse('{C6H10O5}n') == formula.parse('(C6H10O5)n')
+
+@pytest.mark.parametrize('formula_str', ['C^2+3', 'C²⁺3', 'Fe^3-1'])
+def test_rejects_digits_after_superscript_charge(formula_str):
+    with pytest.raises(FormulaError):
+        formula.parse(formula_str)
+
+@pytest.mark.parametrize('formula_str, charge', [('Fe²⁺', 2), ('Fe+2', 2), ('Fe+', 1), ('C2H3O2-', -1)])
+def test_simple_charges(formula_str, charge):
+    assert formula.parse(formula_str).charge == charge
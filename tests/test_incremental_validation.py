@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from incremental_validation import changed_molecules, read_manifest
+from validate_all_smiles import validate_incremental
+
+HEADER = "export const molecules = [\n"
+ROWS = {
+    'Etanol': "  { name: 'Etanol', formula: 'C₂H₆O', smiles: 'CCO', groups: ['organisk'] },\n",
+    'Metan': "  { name: 'Metan', formula: 'CH₄', smiles: 'C', groups: ['organisk'] },\n",
+    'Benzen': "  { name: 'Benzen', formula: 'C₆H₆', smiles: 'c1ccccc1', groups: ['organisk'] },\n",
+}
+BROKEN_METAN = "  { name: 'Metan', formula: 'CH₄', smiles: 'CC', groups: ['organisk'] },\n"
+
+def write_catalogue(path, rows):
+    path.write_text(HEADER + ''.join(rows) + "];\n", encoding='utf-8')
+
+def run(tmp_path, capsys, **kwargs):
+    errors = validate_incremental(source=str(tmp_path / 'molecules.js'), output=str(tmp_path / 'errors.json'),
+                                  manifest_path=str(tmp_path / 'manifest.json'), **kwargs)
+    return errors, capsys.readouterr().out
+
+def test_changed_molecules():
+    old = HEADER + ROWS['Etanol'] + ROWS['Metan']
+    new = HEADER + ROWS['Benzen'] + BROKEN_METAN
+    assert changed_molecules(old, new) == ({'Etanol', 'Metan', 'Benzen'}, {'Etanol'})
+    assert changed_molecules(old, HEADER + ROWS['Metan'] + ROWS['Etanol']) == (set(), set())
+
+def test_edit_clean_edit_cycle(tmp_path, capsys):
+    source = tmp_path / 'molecules.js'
+    report = tmp_path / 'errors.json'
+    write_catalogue(source, [ROWS['Etanol'], BROKEN_METAN, ROWS['Benzen']])
+    errors, out = run(tmp_path, capsys)
+    assert 'running full validation' in out
+    assert [err['name'] for err in errors] == ['Metan']
+    assert not read_manifest(str(tmp_path / 'manifest.json'))['clean']
+
+    write_catalogue(source, [ROWS['Etanol'], ROWS['Metan'], ROWS['Benzen']])
+    errors, out = run(tmp_path, capsys)
+    assert '1 changed, 0 removed, 2 unchanged' in out
+    assert errors == []
+    assert not report.exists()
+    assert read_manifest(str(tmp_path / 'manifest.json'))['clean']
+
+    # No report file is left after a clean run; the manifest keeps the next run incremental
+    write_catalogue(source, [ROWS['Etanol'], BROKEN_METAN])
+    errors, out = run(tmp_path, capsys)
+    assert '1 changed, 1 removed, 1 unchanged' in out
+    assert [err['name'] for err in errors] == ['Metan']
+    assert [err['name'] for err in json.loads(report.read_text(encoding='utf-8'))] == ['Metan']
+
+def test_tampered_snapshot_runs_full(tmp_path, capsys):
+    write_catalogue(tmp_path / 'molecules.js', [ROWS['Etanol']])
+    run(tmp_path, capsys)
+    (tmp_path / 'manifest.snapshot').write_text(HEADER, encoding='utf-8')
+    _, out = run(tmp_path, capsys)
+    assert 'running full validation' in out
+
+def git(tmp_path, *args):
+    return subprocess.run(['git', '-C', str(tmp_path), *args], check=True, capture_output=True, text=True).stdout
+
+def test_base_ref_writes_no_git_objects(tmp_path, capsys):
+    try:
+        git(tmp_path, 'init', '-q')
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git is not available")
+    source = tmp_path / 'molecules.js'
+    write_catalogue(source, [ROWS['Etanol'], ROWS['Metan']])
+    git(tmp_path, 'add', 'molecules.js')
+    git(tmp_path, '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', 'catalogue')
+    run(tmp_path, capsys)
+    objects = git(tmp_path, 'count-objects', '-v')
+
+    write_catalogue(source, [ROWS['Etanol'], BROKEN_METAN])
+    errors, out = run(tmp_path, capsys, base='HEAD')
+    assert 'against HEAD: 1 changed, 0 removed, 1 unchanged' in out
+    assert [err['name'] for err in errors] == ['Metan']
+    assert git(tmp_path, 'count-objects', '-v') == objects
+    assert not os.path.exists(tmp_path / 'manifest.snapshot.tmp')
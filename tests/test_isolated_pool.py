@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import isolated_pool
+from isolated_pool import RESOURCE_LIMIT, TIMEOUT, IsolatedPool, Limits
+
+def sleepy(item):
+    """Sleep for item seconds, or allocate item bytes when it is an int"""
+    if isinstance(item, int):
+        return len(bytearray(item))
+    time.sleep(item)
+    return item
+
+def failed(item, kind, detail):
+    return kind
+
+def run(jobs, limits, workers=1):
+    with IsolatedPool(sleepy, failed, workers, limits) as pool:
+        return [results for _, results in pool.imap(enumerate(jobs))], pool.counts
+
+def test_rows_are_timed_from_their_own_start(monkeypatch):
+    # Several healthy rows share one message, so the message comes later than one row's timeout
+    monkeypatch.setattr(isolated_pool, 'FLUSH_INTERVAL', 0.5)
+    results, counts = run([[0.4, 0.4, 0.4]], Limits(timeout=0.6))
+    assert results == [[0.4, 0.4, 0.4]]
+    assert counts[TIMEOUT] == counts['retries'] == 0
+
+def test_slow_row_times_out():
+    results, counts = run([[0.0, 30.0, 0.0], [0.0]], Limits(timeout=0.5))
+    assert results == [[0.0, TIMEOUT, 0.0], [0.0]]
+    assert counts[TIMEOUT] == 1
+
+@pytest.mark.skipif(isolated_pool.resource is None, reason="needs RLIMIT_AS")
+def test_memory_cap():
+    results, counts = run([[0.0, 8 << 30, 1024]], Limits(timeout=30.0, max_memory=256))
+    assert results == [[0.0, RESOURCE_LIMIT, 1024]]
+    assert counts[RESOURCE_LIMIT] == 1
+
+def test_timeout_must_exceed_flush_interval():
+    with pytest.raises(ValueError):
+        IsolatedPool(sleepy, failed, 1, Limits(timeout=isolated_pool.FLUSH_INTERVAL))
@@ -0,0 +1,19 @@
+import json
+import os
+
+from molecule_conformers import INDEX_NAME, build_conformers, default_threads
+
+def test_only_valid_molecules_get_conformers(tmp_path):
+    molecules = [{'name': 'Etanol', 'formula': 'C₂H₆O', 'smiles': 'CCO'},
+                 {'name': 'Metan', 'formula': 'CH₄', 'smiles': 'CC'}]
+    stats = build_conformers(molecules, str(tmp_path), threads=1, cache_path=None)
+    index = json.loads((tmp_path / INDEX_NAME).read_text(encoding='utf-8'))
+    assert list(index['molecules']) == ['Etanol']
+    assert list(stats['excluded']) == ['Metan']
+    assert index['molecules']['Etanol']['atoms'] == 9
+
+def test_default_threads_share_the_cores():
+    cores = os.cpu_count() or 1
+    assert default_threads(1) == cores
+    assert default_threads(cores * 2) == 1
+    assert default_threads(2) * 2 <= max(cores, 2)
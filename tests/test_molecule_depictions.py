@@ -0,0 +1,23 @@
+import json
+import os
+
+from molecule_depictions import MANIFEST_NAME, build_depictions
+
+MOLECULES = [
+    {'name': 'Etanol', 'formula': 'C₂H₆O', 'smiles': 'CCO'},
+    {'name': 'Metan', 'formula': 'CH₄', 'smiles': 'CC'},
+]
+
+def test_only_valid_molecules_and_own_files(tmp_path):
+    for name in ('logo.svg', 'names.json', '0123456789abcdef.svg', '0123456789abcdef.mol.tmp'):
+        (tmp_path / name).write_text('x')
+
+    stats = build_depictions(MOLECULES, str(tmp_path), cache_path=None)
+
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert list(manifest['molecules']) == ['Etanol']
+    assert list(stats['excluded']) == ['Metan']
+    assert stats['removed_files'] == 1
+    entry = manifest['molecules']['Etanol']
+    assert sorted(os.listdir(tmp_path)) == sorted([entry['svg'], entry['molblock'], MANIFEST_NAME, 'logo.svg',
+                                                   'names.json', '0123456789abcdef.mol.tmp'])
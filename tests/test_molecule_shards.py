@@ -0,0 +1,46 @@
+import json
+import os
+
+from molecule_shards import build_shards
+
+MOLECULES_JS = """export const moleculeGroups = {
+  organisk: 'Organiske forbindelser',
+  løsningsmiddel: 'Løsningsmidler',
+};
+
+export const molecules = [
+  { name: 'Etanol', formula: 'C₂H₆O', smiles: 'CCO', groups: ['organisk', 'løsningsmiddel'], description: 'Alkohol.' },
+  { name: 'Metan', formula: 'CH₄', smiles: 'C', groups: ['organisk'], description: 'Gass.' },
+];
+"""
+
+def test_prune_keeps_other_data(tmp_path):
+    source = tmp_path / 'molecules.js'
+    source.write_text(MOLECULES_JS, encoding='utf-8')
+    output_dir = tmp_path / 'data'
+    output_dir.mkdir()
+    for name in ('names.json', 'conformers.json', 'organisk.0123456789ab.json'):
+        (output_dir / name).write_text('{}')
+
+    stats = build_shards(str(source), str(output_dir), cache_path=None)
+
+    index = json.loads((output_dir / 'index.json').read_text())
+    shards = {entry[2] for entry in index['groups'] if entry[2]} | {index['shared']}
+    assert stats['removed_files'] == 1
+    assert sorted(os.listdir(output_dir)) == sorted(shards | {'index.json', 'names.json', 'conformers.json'})
+
+def test_group_named_shared_keeps_its_own_shard(tmp_path):
+    source = tmp_path / 'molecules.js'
+    source.write_text(MOLECULES_JS.replace("organisk: 'Organiske forbindelser'", "shared: 'Delt'")
+                      .replace("['organisk'", "['shared'"), encoding='utf-8')
+    output_dir = tmp_path / 'data'
+    build_shards(str(source), str(output_dir), cache_path=None)
+
+    index = json.loads((output_dir / 'index.json').read_text())
+    files = {key: name for key, _, name in index['groups']}
+    assert index['shared'].startswith('_shared.')
+    assert files['shared'].startswith('shared.')
+    shared_group = json.loads((output_dir / files['shared']).read_text())
+    assert [row[0] for row in shared_group['molecules']] == ['Metan']
+    shared = json.loads((output_dir / index['shared']).read_text())
+    assert [row[0] for row in shared['molecules']] == ['Etanol']
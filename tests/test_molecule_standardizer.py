@@ -0,0 +1,37 @@
+import pytest
+
+import validate_all_smiles
+from validate_all_smiles import STANDARDIZE_NAMESPACE, iter_standardized, validate_entry
+from validation_cache import ValidationCache
+
+SALT = ('Natriumacetat', 'C₂H₄O₂', 'CC(=O)[O-].[Na+]')
+ACETATE = ('Acetat', 'C₂H₄O₂', 'CC(=O)[O-]')
+
+def standardized(rows, cache=None):
+    """Records of rows after validation and standardisation, by name"""
+    results = [(i, name, validate_entry(name, formula, smiles)) for i, (name, formula, smiles) in enumerate(rows)]
+    return {name: error for _, name, error in iter_standardized(results, cache=cache)}
+
+@pytest.mark.parametrize('row, fixed_by', [(SALT, ['fragment', 'neutralise']), (ACETATE, ['neutralise'])])
+def test_mismatch_fixed_by(row, fixed_by):
+    record = standardized([row])[row[0]]
+    assert record['standardized']['fixed_by'] == fixed_by
+    assert record['standardized']['smiles'] == 'CC(=O)O'
+
+def test_valid_rows_untouched():
+    assert standardized([('Etanol', 'C₂H₆O', 'CCO')]) == {'Etanol': None}
+
+def test_forms_persist_in_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    with ValidationCache(path) as cache:
+        first = standardized([SALT, ACETATE], cache)
+
+    def fail(smiles):
+        raise AssertionError(f"standardised again: {smiles}")
+    monkeypatch.setattr(validate_all_smiles, 'standardize_chunk', fail)
+    with ValidationCache(path) as cache:
+        assert standardized([SALT, ACETATE], cache) == first
+        assert cache.hits == 2
+        # Validation results under the cache's own namespace never see the forms
+        assert cache.get(SALT[2], '')[0] is False
+        assert cache.get(SALT[2], '', STANDARDIZE_NAMESPACE)[0] is True
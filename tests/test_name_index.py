@@ -0,0 +1,29 @@
+import json
+
+from molecule_dedup import smiles_identity
+from name_index import NameIndex, synonym_groups
+
+CACTUS = {'Etanol': 'ethanol', 'Alkohol': 'ethanol'}
+
+def collisions(rows):
+    identified = [((i, name, '', smiles), smiles_identity(smiles)) for i, (name, smiles) in enumerate(rows)]
+    return synonym_groups(identified, CACTUS)[1]
+
+def test_unparseable_rows_do_not_collide():
+    assert collisions([('Etanol', 'CCO'), ('Etanol', 'C1CC')]) == []
+
+def test_name_collision_reported_once():
+    found = collisions([('Etanol', 'CCO'), ('etanol', 'CCC'), ('Etanol', 'C1CC')])
+    assert [(c['kind'], c['names']) for c in found] == [('name', ['Etanol', 'etanol'])]
+
+def test_synonym_collision_across_names():
+    found = collisions([('Etanol', 'CCO'), ('Alkohol', 'CC')])
+    assert [(c['kind'], c['key'], c['names']) for c in found] == [('synonym', 'ethanol', ['Etanol', 'Alkohol'])]
+
+def test_write_replaces_index(tmp_path):
+    path = tmp_path / 'names.json'
+    path.write_text('stale', encoding='utf-8')
+    index = NameIndex.build([(['Etanol'], ['ethanol'])])
+    index.write(str(path))
+    assert json.loads(path.read_text(encoding='utf-8')) == index.to_json()
+    assert [p.name for p in tmp_path.iterdir()] == ['names.json']
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import reference_check
+from reference_check import check_rows, stub_app
+from validation_cache import ValidationCache
+
+CATALOGUE = [(1, 'Etanol', 'C₂H₆O', 'CCO'), (2, 'Alanin', 'C₃H₇NO₂', 'C[C@H](N)C(=O)O')]
+
+def run_check(app, rows, provider='cactus', cache=None, retries=2):
+    """check_rows against app served on localhost; returns results by name"""
+    async def check():
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            base_url = str(server.make_url('')).rstrip('/')
+            return await check_rows(rows, provider, base_url, {}, 100.0, 4, retries, cache)
+        finally:
+            await server.close()
+    return {result['name']: result for result in asyncio.run(check())}
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(delay):
+        pass
+    monkeypatch.setattr(reference_check.asyncio, 'sleep', sleep)
+
+@pytest.mark.parametrize('provider', ['cactus', 'pubchem'])
+def test_match(provider):
+    results = run_check(stub_app(CATALOGUE, {}), CATALOGUE, provider)
+    assert {name: r['status'] for name, r in results.items()} == {'Etanol': 'match', 'Alanin': 'match'}
+
+@pytest.mark.parametrize('provider', ['cactus', 'pubchem'])
+def test_mismatch_and_stereo(provider):
+    ours = [(1, 'Etanol', 'C₂H₆O', 'COC'), (2, 'Alanin', 'C₃H₇NO₂', 'C[C@@H](N)C(=O)O')]
+    results = run_check(stub_app(CATALOGUE, {}), ours, provider)
+    assert results['Etanol']['status'] == 'mismatch'
+    assert results['Etanol']['reference'] == 'CCO'
+    assert results['Alanin']['status'] == 'stereo'
+
+@pytest.mark.parametrize('provider', ['cactus', 'pubchem'])
+def test_not_found(provider):
+    results = run_check(stub_app(CATALOGUE, {}), [(1, 'Ukjent', 'C', 'C')], provider)
+    assert results['Ukjent']['status'] == 'not_found'
+
+@pytest.mark.parametrize('ours, theirs, status', [
+    ('C[C@H](N)C(=O)O', 'C[C@@H](N)C(=O)O', 'stereo'),
+    ('[13CH3]C(=O)O', 'CC(=O)O', 'stereo'),
+    ('CC(=O)O', 'CC(=O)[O-]', 'protonation'),
+    ('CN', 'C[NH3+]', 'protonation'),
+    ('CC[N+](C)(C)C', 'CCN(C)C', 'mismatch'),
+    ('CC(=O)O', 'CCO', 'mismatch'),
+    ('CC(=O)O', 'CC(=O)O', 'match'),
+])
+def test_compare(ours, theirs, status):
+    assert reference_check.compare(ours, theirs) == status
+
+def flaky_app(statuses):
+    """Cactus-style app answering with the given statuses in turn, then the structure of ethanol"""
+    calls = []
+
+    async def handler(request):
+        calls.append(request.match_info['query'])
+        if len(calls) <= len(statuses):
+            return web.Response(status=statuses[len(calls) - 1], headers={'Retry-After': '0'})
+        return web.Response(text='CCO\n')
+
+    app = web.Application()
+    app.router.add_get('/{query}/smiles', handler)
+    return app, calls
+
+def test_retries_transient_errors():
+    app, calls = flaky_app([503, 429])
+    results = run_check(app, [(1, 'Etanol', 'C₂H₆O', 'CCO')])
+    assert results['Etanol']['status'] == 'match'
+    assert len(calls) == 3
+
+def test_gives_up_after_retries():
+    app, calls = flaky_app([503] * 10)
+    results = run_check(app, [(1, 'Etanol', 'C₂H₆O', 'CCO')], retries=2)
+    assert results['Etanol']['status'] == 'error'
+    assert len(calls) == 3
+
+def test_only_definite_answers_are_cached(tmp_path):
+    cache = ValidationCache(str(tmp_path / 'cache.sqlite'), namespace='reference:test')
+    app, calls = flaky_app([403])
+    results = run_check(app, [(1, 'Etanol', 'C₂H₆O', 'CCO')], cache=cache)
+    assert results['Etanol']['status'] == 'error'
+    assert len(calls) == 1
+    assert cache.get('etanol', '') == (False, None)
+
+    app, calls = flaky_app([])
+    results = run_check(app, [(1, 'Etanol', 'C₂H₆O', 'CCO')], cache=cache)
+    assert results['Etanol']['status'] == 'match'
+    assert cache.get('etanol', '') == (True, {'smiles': 'CCO'})
+
+    results = run_check(stub_app([], {}), [(1, 'Metan', 'CH₄', 'C')], cache=cache)
+    assert results['Metan']['status'] == 'not_found'
+    assert cache.get('metan', '') == (True, {'smiles': None})
+    cache.close()
@@ -0,0 +1,68 @@
+import pytest
+from rdkit import Chem
+
+from smiles_lexer import heavy_atom_mismatch, lex
+from validate_all_smiles import validate_entry
+
+@pytest.mark.parametrize('smiles', ['C*', '*C(=O)O', '*CC*', 'c1ccccc1*'])
+def test_bare_wildcard(smiles):
+    assert Chem.MolFromSmiles(smiles) is not None
+    lexed = lex(smiles)
+    assert lexed.error is None
+    assert lexed.wildcard
+    assert None not in lexed.heavy_atoms
+    assert heavy_atom_mismatch(lexed, 'C2H4O2') is None
+
+def test_atomic_number_zero_is_a_wildcard():
+    assert Chem.MolFromSmiles('[#0]CC') is not None
+    assert lex('[#0]CC') == (None, {'C': 2}, True)
+
+def test_bare_wildcard_counts_other_atoms():
+    assert lex('*C(=O)O').heavy_atoms == {'C': 1, 'O': 2}
+
+def test_bare_wildcard_reaches_rdkit():
+    error = validate_entry('Acyl', 'CHO2', '*C(=O)O')
+    assert error is None or 'error' in error
+
+@pytest.mark.parametrize('smiles, heavy_atoms', [
+    ('C%(10)CCCCC%(10)', {'C': 6}),
+    ('C%(10)CCCCC%10', {'C': 6}),
+    ('C%(123)CC%(123)', {'C': 3}),
+    ('C%(5)CC5', {'C': 3}),
+    ('CCO ethanol', {'C': 2, 'O': 1}),
+    ('CCO\tethanol', {'C': 2, 'O': 1}),
+    ('c1ccccn1 pyridin og so', {'C': 5, 'N': 1}),
+    (' CCO', {'C': 2, 'O': 1}),
+    ('CCO\n', {'C': 2, 'O': 1}),
+    ('[#6]C', {'C': 2}),
+    ('[13#6]C', {'C': 2}),
+    ('[#8H]C', {'C': 1, 'O': 1}),
+    ('[#1]C', {'C': 1}),
+    ('[#118]', {'Og': 1}),
+])
+def test_accepts_what_rdkit_accepts(smiles, heavy_atoms):
+    assert Chem.MolFromSmiles(smiles) is not None
+    assert lex(smiles) == (None, heavy_atoms, False)
+
+@pytest.mark.parametrize('smiles, message', [
+    ('C%()C', 'Ring bond %'),
+    ('C%(1a)C', 'Ring bond %'),
+    ('C%(10)CC', 'Unclosed ring bond 10'),
+    ('C%(10)CC1', 'Unclosed ring bond'),
+    ('  ', 'only whitespace'),
+    (' C(C', 'Unclosed branch'),
+    ('[#119]C', 'Unknown element'),
+    ('[#06]C', 'Unknown element'),
+    ('[#]C', 'Unknown element'),
+])
+def test_rejects_what_rdkit_rejects(smiles, message):
+    assert Chem.MolFromSmiles(smiles) is None
+    assert message in lex(smiles).error
+
+def test_heavy_atom_mismatch_keeps_rdkit_counts():
+    error = validate_entry('Metan', 'CH₄', 'CC')
+    assert error['rdkit'] == {'C': 2, 'H': 6}
+    assert error['expected'] == {'C': 1, 'H': 4}
+    assert error['heavy_atoms'] == {'C': 2}
+    assert 'rdkit' in validate_entry('Metan', 'CH₄', '[CH2]')
+    assert 'heavy_atoms' not in validate_entry('Metan', 'CH₄', '[CH2]')
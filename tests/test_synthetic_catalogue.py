@@ -0,0 +1,15 @@
+import pytest
+from rdkit import Chem
+
+import formula
+from synthetic_catalogue import hill_formula
+
+@pytest.mark.parametrize('smiles, text', [
+    ('[NH4+]', 'H₄N⁺'),
+    ('[Fe+2]', 'Fe²⁺'),
+    ('[O-]C(=O)CC(=O)[O-]', 'C₃H₂O₄²⁻'),
+])
+def test_hill_formula_parses_back(smiles, text):
+    mol = Chem.MolFromSmiles(smiles)
+    assert hill_formula(mol) == text
+    assert formula.vector(text) == formula.mol_vector(mol)
@@ -0,0 +1,32 @@
+import os
+
+import element_table
+import validation_cache
+from validation_cache import ValidationCache
+
+def rows(cache):
+    return cache._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+def test_replacing_a_key_keeps_the_count(tmp_path):
+    with ValidationCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.put('CCO', 'C2H6O', None)
+        cache.put('CCO', 'C2H6O', {'error': 'x'})
+        assert cache._rows == rows(cache) == 1
+        assert cache.get('CCO', 'C2H6O') == (True, {'error': 'x'})
+
+def test_evicts_least_recently_used_down_to_max_entries(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with ValidationCache(path, max_entries=3) as cache:
+        for n in range(5):
+            cache.put('C' * (n + 1), '', None)
+        cache.flush()
+        assert cache._rows == rows(cache) == 3
+        assert not cache.get('C', '')[0] and cache.get('CCCCC', '')[0]
+    # A reopened cache starts from the stored row count
+    with ValidationCache(path, max_entries=3) as cache:
+        assert cache._rows == 3
+
+def test_default_paths_do_not_depend_on_cwd():
+    root = os.path.dirname(os.path.abspath(validation_cache.__file__))
+    for path in (validation_cache.DEFAULT_CACHE_PATH, element_table.DEFAULT_TABLE_CACHE):
+        assert os.path.isabs(path) and path.startswith(os.path.join(root, '.cache'))
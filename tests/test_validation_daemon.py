@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+import validation_daemon
+from molecule_reader import read_error_report
+from validation_daemon import ValidationServer
+
+CATALOGUE = ("export const molecules = [\n"
+             "  { name: 'Etanol', formula: 'C₂H₆O', smiles: 'CCO', groups: ['organisk'] },\n"
+             "  { name: 'Metan', formula: 'CH₄', smiles: 'CC', groups: ['organisk'] },\n"
+             "];\n")
+
+async def call(path, request):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(json.dumps(request).encode('utf-8') + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response
+
+def run_daemon(server, path, client, **serve_args):
+    """Serve on path while client(path) runs, then shut the daemon down; returns what client returned"""
+    async def session():
+        daemon = asyncio.ensure_future(server.serve(path, **serve_args))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        try:
+            return await client(path)
+        finally:
+            server.stopping.set()
+            await daemon
+    try:
+        return asyncio.run(session())
+    finally:
+        server.close()
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'daemon.sock')
+
+def test_slow_batch_does_not_block_other_clients(socket_path, monkeypatch):
+    server = ValidationServer()
+    validate = server.validate
+
+    def slow_validate(molecules, tier='default'):
+        time.sleep(0.5)
+        return validate(molecules, tier)
+    monkeypatch.setattr(server, 'validate', slow_validate)
+
+    async def client(path):
+        done = []
+
+        async def tracked(label, request):
+            response = await call(path, request)
+            done.append(label)
+            return response
+        batch = tracked('validate', {'op': 'validate', 'molecules': [{'smiles': 'CCO'}]})
+        ping = tracked('ping', {'op': 'ping'})
+        first = asyncio.ensure_future(batch)
+        await asyncio.sleep(0.1)
+        results, _ = await asyncio.gather(first, ping)
+        return done, results
+
+    done, results = run_daemon(server, socket_path, client)
+    assert done == ['ping', 'validate']
+    assert results['results'][0]['is_valid']
+
+def test_watch_and_client_reports_share_a_format(tmp_path, socket_path):
+    catalogue = tmp_path / 'molecules.js'
+    catalogue.write_text(CATALOGUE, encoding='utf-8')
+    watch_report = str(tmp_path / 'watch.json')
+    client_report = str(tmp_path / 'client.json')
+    server = ValidationServer()
+
+    async def client(path):
+        while not os.path.exists(watch_report):
+            await asyncio.sleep(0.01)
+        with pytest.raises(SystemExit) as exit_info:
+            await asyncio.to_thread(validation_daemon.main, ['--socket', path, 'validate', str(catalogue),
+                                                            '--quiet', '--output', client_report])
+        return exit_info.value.code
+
+    assert run_daemon(server, socket_path, client, watch=str(catalogue), output=watch_report) == 1
+    assert read_error_report(client_report) == read_error_report(watch_report)
+    record, = read_error_report(watch_report)
+    assert record['name'] == 'Metan' and record['status'] == 'NEEDS_REVIEW'
+
+def test_stop_with_idle_clients_is_quiet(socket_path, caplog):
+    server = ValidationServer()
+
+    async def client(path):
+        idle = [await asyncio.open_unix_connection(path) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert (await call(path, {'op': 'shutdown'}))['ok']
+        # The daemon ends idle connections as it stops
+        received = [await reader.read() for reader, _ in idle]
+        for _, writer in idle:
+            writer.close()
+        return received
+
+    assert run_daemon(server, socket_path, client) == [b'', b'']
+    assert not [record for record in caplog.records if record.exc_info or 'CancelledError' in record.getMessage()]
+    assert not os.path.exists(socket_path)
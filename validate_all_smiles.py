@@ -4,12 +4,46 @@ Comprehensive SMILES Validator for all 287 molecules
 Validates molecular SMILES codes and identifies errors
 """
 
+import argparse
 import json
-import re
+import os
 import sys
-from rdkit import Chem
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import islice
 from rdkit.Chem import Descriptors, rdMolDescriptors
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+
+import formula as chem_formula
+from element_table import ElementTable, check_masses, load_element_table
+from incremental_validation import (DEFAULT_MANIFEST_PATH, changed_molecules, read_manifest, read_snapshot,
+                                    ref_text, write_manifest)
+from isolated_pool import DEFAULT_MAX_MEMORY_MB, DEFAULT_TIMEOUT, FLUSH_INTERVAL, IsolatedPool, Limits
+from molecule_reader import (FORMATS, Row, detect_format, iter_js_lines, iter_rows, iter_text_rows, open_error_sink,
+                             read_error_report)
+from molecule_standardizer import Form, needs_standardizing, standardize_chunk, standardize_smiles, standardized_record
+from smiles_lexer import heavy_atom_mismatch, lex, logged_mol_from_smiles
+from validation_cache import (DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, ValidationCache,
+                              strip_name, with_name)
+import validation_metrics
+from validation_metrics import Metrics, Progress, collecting, stage
+
+DEFAULT_MOLECULES_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'data', 'molecules.js')
+
+# Rows handed to a worker process per task in parallel mode
+DEFAULT_CHUNK_SIZE = 256
+
+# Chunks queued per worker before the reader waits for results
+IN_FLIGHT_PER_WORKER = 4
+
+# Errors kept in memory for the console summary; the report file has all of them
+MAX_ERROR_DETAILS = 1000
+
+# Standardised forms depend on the SMILES alone, so they are keyed apart from validation results
+STANDARDIZE_NAMESPACE = 'standardize'
 
 # Fix encoding for Windows
 if sys.stdout.encoding != 'utf-8':
@@ -276,103 +310,470 @@ Organotin,C₄H₁₂Sn,C[Sn](C)(C)C
 
 def normalize_formula(formula_str: str) -> str:
     """Convert subscript numbers to regular numbers"""
-    subscripts = {
-        '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4',
-        '₅': '5', '₆': '6', '₇': '7', '₈': '8', '₉': '9'
-    }
-    normalized = formula_str
-    for sub, num in subscripts.items():
-        normalized = normalized.replace(sub, num)
-    return normalized
+    return chem_formula.normalize(formula_str)
 
 def parse_formula(formula_str: str) -> Dict[str, int]:
     """Parse chemical formula to get element counts"""
-    formula_str = normalize_formula(formula_str)
-    formula_str = formula_str.replace('⁺', '').replace('⁻', '')
-    
-    # Handle repeating units like (C6H10O5)n
-    formula_str = formula_str.replace('(', '').replace(')', 'n').replace('n', '')
-    
-    elements = {}
-    pattern = r'([A-Z][a-z]?)(\d*)'
-    matches = re.findall(pattern, formula_str)
-    
-    for element, count in matches:
-        count = int(count) if count else 1
-        elements[element] = elements.get(element, 0) + count
-    
-    return elements
+    return chem_formula.element_counts(formula_str)
 
 def get_rdkit_formula(mol) -> Dict[str, int]:
     """Get formula from RDKit molecule"""
     formula = rdMolDescriptors.CalcMolFormula(mol)
     return parse_formula(formula)
 
-def validate_smiles(smiles: str) -> Tuple[Optional[object], Optional[str]]:
-    """Convert SMILES to molecule or return error"""
+def get_rdkit_vector(mol) -> bytes:
+    """Get the element vector (counts by atomic number plus charge) of an RDKit molecule
+
+    CalcMolFormula counts atoms and implicit hydrogens in C++; decoding its
+    output through the memoised formula.vector is much cheaper than walking
+    the atoms from Python (formula.mol_vector), with identical results.
+    """
+    return chem_formula.vector(rdMolDescriptors.CalcMolFormula(mol))
+
+def parse_smiles(smiles: str) -> Tuple[Optional[object], Optional[str], List[str]]:
+    """Convert SMILES to molecule with RDKit, returning (mol, error, RDKit error log)"""
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        if validation_metrics.active():
+            mol, log = logged_mol_from_smiles(smiles, validation_metrics.staged_mol_from_smiles)
+        else:
+            mol, log = logged_mol_from_smiles(smiles)
         if mol is None:
-            return None, "RDKit could not parse SMILES"
-        return mol, None
+            return None, "RDKit could not parse SMILES", log
+        return mol, None, log
     except Exception as e:
-        return None, str(e)
+        return None, str(e), []
+
+def validate_smiles(smiles: str) -> Tuple[Optional[object], Optional[str]]:
+    """Convert SMILES to molecule or return error; malformed strings never reach RDKit"""
+    with stage('prefilter'):
+        error = lex(smiles).error
+    if error:
+        return None, error
+    return parse_smiles(smiles)[:2]
+
+@lru_cache(maxsize=None)
+def element_table() -> ElementTable:
+    """src/data/elements.js as NumPy arrays, loaded once per process"""
+    return load_element_table()
+
+def cache_namespace() -> str:
+    """Cached results depend on the element table through the mass check"""
+    return f'validate_all_smiles:{element_table().digest}'
+
+def parse_entry(name: str, formula: str, smiles: str) -> Tuple[Optional[object], Optional[Dict]]:
+    """Parse and formula-check one catalogue row, returning (mol, error record or None)
+
+    The lexer rejects malformed SMILES before RDKit is called; those records
+    carry no RDKit formula. Every formula mismatch has the full RDKit counts
+    under 'rdkit', and 'heavy_atoms' when the lexer already saw the heavy atoms differ.
+    """
+    with stage('prefilter'):
+        lexed = lex(smiles)
+        expected_heavy = heavy_atom_mismatch(lexed, formula)
+    if lexed.error:
+        return None, {
+            'name': name,
+            'formula': formula,
+            'smiles': smiles,
+            'error': lexed.error
+        }
+
+    mol, error, log = parse_smiles(smiles)
+
+    if error:
+        record = {
+            'name': name,
+            'formula': formula,
+            'smiles': smiles,
+            'error': error
+        }
+        if log:
+            record['rdkit_log'] = log
+        return None, record
+
+    record = check_formula(mol, name, formula, smiles)
+    if record is not None and expected_heavy is not None and 'rdkit' in record:
+        record['heavy_atoms'] = dict(sorted(lexed.heavy_atoms.items()))
+    return mol, record
+
+def validate_entry(name: str, formula: str, smiles: str) -> Optional[Dict]:
+    """Validate one catalogue row, return an error record or None if valid"""
+    return parse_entry(name, formula, smiles)[1]
+
+def check_formula(mol, name: str, formula: str, smiles: str) -> Optional[Dict]:
+    """Compare a parsed molecule with its expected formula, return an error record or None"""
+    # Inputs without a formula column (plain .smi files) only get the parse check
+    if not formula:
+        return None
+
+    with stage('rdkit_formula'):
+        rdkit_formula_str = rdMolDescriptors.CalcMolFormula(mol)
+    try:
+        with stage('parse_formula'):
+            matches = chem_formula.vector(rdkit_formula_str) == chem_formula.vector(formula)
+    except chem_formula.FormulaError as e:
+        return {
+            'name': name,
+            'formula': formula,
+            'smiles': smiles,
+            'error': f"Formula parse error: {e}"
+        }
+
+    if not matches:
+        rdkit_formula = parse_formula(rdkit_formula_str)
+        expected_formula = parse_formula(formula)
+        expected_charge = chem_formula.parse(formula).charge
+        rdkit_charge = chem_formula.parse(rdkit_formula_str).charge
+        if rdkit_formula == expected_formula:
+            error = f"Charge mismatch: expected {expected_charge:+d}, got {rdkit_charge:+d}"
+        else:
+            error = f"Formula mismatch: expected {expected_formula}, got {rdkit_formula}"
+        return {
+            'name': name,
+            'formula': formula,
+            'smiles': smiles,
+            'error': error,
+            'expected': expected_formula,
+            'rdkit': rdkit_formula
+        }
+    return None
+
+def validate_row(row: Row) -> Tuple[int, str, Optional[Dict]]:
+    """Validate one (line number, name, formula, smiles) row"""
+    i, name, formula, smiles = row
+    return i, name, validate_entry(name, formula, smiles)
+
+def check_chunk(rows: List[Row], metrics: Optional[Metrics] = None) -> List[Tuple[int, str, Optional[Dict]]]:
+    """Validate rows one by one, then mass-check the ones that passed in a single vectorised pass
+
+    The mass check compares each expected formula's mass, from the elements.js
+    table, with RDKit's MolWt. It catches symbols missing from elements.js and
+    isotope labels that the element counts cannot see.
+    """
+    return check_chunk_mols(rows, metrics)[0]
+
+def check_chunk_mols(rows: List[Row], metrics: Optional[Metrics] = None) -> Tuple[List[Tuple[int, str, Optional[Dict]]],
+                                                                                   List[Optional[object]]]:
+    """check_chunk, also returning the parsed molecule of every row that passed (None for the rest)"""
+    results = []
+    mols = []
+    passed = []
+    for k, (i, name, formula, smiles) in enumerate(rows):
+        start = time.perf_counter_ns()
+        mol, error = parse_entry(name, formula, smiles)
+        if error is None and formula:
+            with stage('mass_check'):
+                passed.append((k, Descriptors.MolWt(mol)))
+        results.append((i, name, error))
+        mols.append(mol if error is None else None)
+        if metrics is not None:
+            metrics.observe(name, smiles, time.perf_counter_ns() - start)
+    if passed:
+        with stage('mass_check'):
+            messages = check_masses([chem_formula.vector(rows[k][2]) for k, _ in passed],
+                                    [weight for _, weight in passed], element_table())
+        for (k, _), message in zip(passed, messages):
+            if message:
+                i, name, formula, smiles = rows[k]
+                results[k] = (i, name, {'name': name, 'formula': formula, 'smiles': smiles, 'error': message})
+                mols[k] = None
+    return results, mols
+
+def check_row(row: Row) -> Tuple[int, str, Optional[Dict]]:
+    """Validate one row, mass check included, in an isolated worker"""
+    return check_chunk([row])[0]
+
+def limit_record(row: Row, kind: str, detail: str) -> Tuple[int, str, Dict]:
+    """Result of a row whose validation ran out of time or memory or crashed its worker"""
+    i, name, formula, smiles = row
+    return i, name, {'name': name, 'formula': formula, 'smiles': smiles, 'error': f"{kind}: {detail}", 'limit': kind}
+
+def validate_chunk(rows: List[Row]) -> List[Tuple[int, str, Optional[Dict]]]:
+    """Validate a chunk of rows in a worker process"""
+    return check_chunk(rows)
+
+def profile_chunk(rows: List[Row]) -> Tuple[List[Tuple[int, str, Optional[Dict]]], Metrics]:
+    """Validate a chunk with stage timers and per-molecule latencies collected"""
+    metrics = Metrics()
+    with collecting(metrics):
+        results = check_chunk(rows, metrics)
+    return results, metrics
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    """Yield consecutive lists of at most size rows without materialising the input"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def cached_chunk(chunk: List[Row], cache: Optional[ValidationCache]) -> Tuple[Dict, List[Row]]:
+    """Split a chunk into cached results and the unique rows that still need validating"""
+    with stage('cache'):
+        hits = cache.get_many((smiles, formula) for _, _, formula, smiles in chunk) if cache is not None else {}
+    misses = {}
+    for row in chunk:
+        key = (row[3], row[2])
+        if key not in hits and key not in misses:
+            misses[key] = row
+    return hits, list(misses.values())
+
+def merge_chunk(chunk: List[Row], hits: Dict, misses: List[Row], computed: List[Tuple[int, str, Optional[Dict]]],
+                cache: Optional[ValidationCache]) -> Iterator[Tuple[int, str, Optional[Dict]]]:
+    """Yield results for a chunk in input order, storing freshly computed ones in the cache"""
+    results = dict(hits)
+    with stage('cache'):
+        for (_, _, formula, smiles), (_, _, error) in zip(misses, computed):
+            results[(smiles, formula)] = strip_name(error)
+            # Budget overruns depend on the machine and the load, so they are retried next run
+            if cache is not None and not (error and 'limit' in error):
+                cache.put(smiles, formula, results[(smiles, formula)])
+    for i, name, formula, smiles in chunk:
+        yield i, name, with_name(name, results[(smiles, formula)])
+
+def iter_results(rows: Iterable[Row], workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 cache: Optional[ValidationCache] = None, metrics: Optional[Metrics] = None,
+                 limits: Optional[Limits] = None) -> Iterator[Tuple[int, str, Optional[Dict]]]:
+    """Yield (line number, name, error) in input order, serially or across a process pool
+
+    With metrics set, chunks are validated with stage timers on and the
+    timings of every chunk, from any process, are merged into metrics.
+    With limits set, every row runs in an isolated worker under a time and
+    memory budget instead; rows over budget get a TIMEOUT, RESOURCE_LIMIT or
+    WORKER_CRASH error.
+    """
+    def computed(result):
+        if metrics is None:
+            return result
+        result, chunk_metrics = result
+        metrics.merge(chunk_metrics)
+        return result
+
+    if workers > 1 or limits is not None:
+        # Built and written to its disk cache once here, so workers load it instead of racing to write it
+        element_table()
+
+    if limits is not None:
+        def jobs():
+            for chunk in chunked(rows, chunk_size):
+                hits, misses = cached_chunk(chunk, cache)
+                yield (chunk, hits, misses), misses
+
+        with IsolatedPool(check_row, limit_record, workers, limits) as pool:
+            for (chunk, hits, misses), computed_rows in pool.imap(jobs()):
+                yield from merge_chunk(chunk, hits, misses, computed_rows, cache)
+        return
+
+    validate = validate_chunk if metrics is None else profile_chunk
+    if workers <= 1:
+        for chunk in chunked(rows, chunk_size):
+            hits, misses = cached_chunk(chunk, cache)
+            yield from merge_chunk(chunk, hits, misses, computed(validate(misses)), cache)
+        return
+
+    # One task per chunk keeps pickling overhead per chunk, not per molecule.
+    # Only a bounded window of chunks is in flight so memory stays flat, and
+    # futures are drained in submission order so output matches the serial run.
+    # Cache lookups and writes stay in this process; workers only see misses,
+    # and duplicate rows within a chunk are validated once.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(rows, chunk_size):
+            hits, misses = cached_chunk(chunk, cache)
+            future = executor.submit(validate, misses) if misses else None
+            pending.append((chunk, hits, misses, future))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                chunk, hits, misses, future = pending.popleft()
+                yield from merge_chunk(chunk, hits, misses, computed(future.result()) if future else [], cache)
+        while pending:
+            chunk, hits, misses, future = pending.popleft()
+            yield from merge_chunk(chunk, hits, misses, computed(future.result()) if future else [], cache)
+
+def invalid_molecules(molecules: List[Dict], workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      cache_path: Optional[str] = DEFAULT_CACHE_PATH) -> Dict[int, str]:
+    """Error message by position for every molecule dict that fails validation"""
+    rows = ((k, m['name'], m['formula'], m['smiles']) for k, m in enumerate(molecules))
+    cache = ValidationCache(cache_path, namespace=cache_namespace()) if cache_path else None
+    try:
+        return {k: error['error'] for k, _, error in iter_results(rows, workers, chunk_size, cache) if error}
+    finally:
+        if cache is not None:
+            cache.close()
+
+def iter_standardized(results: Iterable[Tuple[int, str, Optional[Dict]]], workers: int = 1,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, limits: Optional[Limits] = None,
+                      cache: Optional[ValidationCache] = None) -> Iterator[Tuple[int, str, Optional[Dict]]]:
+    """Yield results in order, with every formula mismatch annotated by molecule_standardizer
+
+    Only mismatching SMILES are standardised, each distinct one once per run,
+    serially or across a process pool. With cache set, their forms are kept
+    under STANDARDIZE_NAMESPACE and reused by later runs. With limits set they
+    run in isolated workers, and a SMILES over budget is left unannotated.
+    """
+    known: Dict[str, Optional[List]] = {}
+
+    def split(chunk: List) -> List[str]:
+        todo = list(dict.fromkeys(error['smiles'] for _, _, error in chunk
+                                  if needs_standardizing(error) and error['smiles'] not in known))
+        if cache is not None and todo:
+            hits = cache.get_many(((smiles, '') for smiles in todo), STANDARDIZE_NAMESPACE)
+            for (smiles, _), forms in hits.items():
+                known[smiles] = [Form(tuple(steps), form_smiles, formula) for steps, form_smiles, formula in forms]
+            todo = [smiles for smiles in todo if (smiles, '') not in hits]
+        # SMILES already in flight in an earlier chunk are resolved when that chunk is
+        for smiles in todo:
+            known[smiles] = None
+        return todo
+
+    def resolve(chunk: List, todo: List[str], computed: List) -> Iterator[Tuple[int, str, Optional[Dict]]]:
+        known.update(zip(todo, computed))
+        if cache is not None:
+            for smiles, forms in zip(todo, computed):
+                # None is a SMILES over budget; it may fit next time
+                if forms is not None:
+                    cache.put(smiles, '', forms, STANDARDIZE_NAMESPACE)
+        for i, name, error in chunk:
+            if needs_standardizing(error):
+                with stage('standardize'):
+                    error = standardized_record(error, known[error['smiles']])
+            yield i, name, error
+
+    if limits is not None:
+        def jobs():
+            for chunk in chunked(results, chunk_size):
+                todo = split(chunk)
+                yield (chunk, todo), todo
+
+        with IsolatedPool(standardize_smiles, standardize_limit, workers, limits) as pool:
+            for (chunk, todo), computed in pool.imap(jobs()):
+                yield from resolve(chunk, todo, computed)
+        return
+
+    if workers <= 1:
+        for chunk in chunked(results, chunk_size):
+            todo = split(chunk)
+            yield from resolve(chunk, todo, standardize_chunk(todo) if todo else [])
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunked(results, chunk_size):
+            todo = split(chunk)
+            pending.append((chunk, todo, executor.submit(standardize_chunk, todo) if todo else None))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                chunk, todo, future = pending.popleft()
+                yield from resolve(chunk, todo, future.result() if future else [])
+        while pending:
+            chunk, todo, future = pending.popleft()
+            yield from resolve(chunk, todo, future.result() if future else [])
+
+def standardize_limit(smiles: str, kind: str, detail: str) -> None:
+    """A SMILES whose standardisation ran over budget keeps its plain mismatch record"""
+    return None
+
+def standardization_summary(fixed: Dict[str, int], mismatches: int) -> str:
+    """One line counting the mismatches each combination of transformations explains"""
+    counts = ', '.join(f"{steps} {count}" for steps, count in sorted(fixed.items(), key=lambda item: -item[1]))
+    return (f"Standardisation: {sum(fixed.values())} of {mismatches} formula mismatches are representation "
+            f"differences{f' ({counts})' if counts else ''}")
+
+def error_label(error: Dict) -> str:
+    """Short form of an error for the line printed per molecule"""
+    label = error['error'].split(':')[0] if 'expected' in error else error['error']
+    fixed_by = error.get('standardized', {}).get('fixed_by')
+    return f"{label} (fixed by {' + '.join(fixed_by)})" if fixed_by else label
+
+def validate_all(workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 data: Optional[str] = None, source: Optional[str] = None,
+                 fmt: Optional[str] = None, output: str = 'smiles_validation_errors.json',
+                 cache_path: Optional[str] = None, cache_size: int = DEFAULT_MAX_ENTRIES,
+                 mode: str = 'verbose', profile: Optional[str] = None,
+                 limits: Optional[Limits] = None, standardize: bool = False,
+                 rows: Optional[List[Row]] = None) -> List[Dict]:
+    """Validate all molecules
+
+    Rows are streamed from source (a CSV/TSV/SMI/molecules.js file, optionally
+    gzipped, or '-' for stdin) or from the embedded molecules_data string, or
+    given as rows already read from source, and errors are written to output as
+    they are found. With cache_path set,
+    results are reused from the persistent validation cache.
+
+    mode is 'verbose' (a line per molecule), 'quiet' (summary only) or
+    'progress' (summary plus a progress bar on stderr). With profile set,
+    per-stage timings are printed and written as JSON to that path. With
+    limits set, each molecule runs in an isolated worker (see iter_results).
+    With standardize set, formula mismatches are checked against standardised
+    forms of their SMILES (see iter_standardized).
+    """
+    if rows is not None:
+        total = len(rows)
+        origin = '' if source is None else f" from {'stdin' if source == '-' else source}"
+        print(f"Validating {total} molecules{origin}...\n")
+    elif source is not None:
+        rows = iter_rows(source, fmt)
+        total = None
+        print(f"Validating molecules from {'stdin' if source == '-' else source}...\n")
+    else:
+        data = (molecules_data if data is None else data).strip()
+        rows = iter_text_rows(data)
+        total = data.count('\n') + 1
+        print(f"Validating {total} molecules...\n")
 
-def validate_all():
-    """Validate all molecules"""
-    lines = molecules_data.strip().split('\n')
-    
-    print(f"Validating {len(lines)} molecules...\n")
-    
     errors = []
     valid_count = 0
-    
-    for i, line in enumerate(lines, 1):
-        parts = line.split(',')
-        if len(parts) < 3:
-            continue
-        
-        name = parts[0].strip()
-        formula = parts[1].strip()
-        smiles = parts[2].strip()
-        
-        mol, error = validate_smiles(smiles)
-        
-        if error:
-            errors.append({
-                'name': name,
-                'formula': formula,
-                'smiles': smiles,
-                'error': error
-            })
-            print(f"X [{i}/{len(lines)}] {name}: {error}")
-        else:
-            rdkit_formula = get_rdkit_formula(mol)
-            expected_formula = parse_formula(formula)
-            
-            if rdkit_formula != expected_formula:
-                errors.append({
-                    'name': name,
-                    'formula': formula,
-                    'smiles': smiles,
-                    'error': f"Formula mismatch: expected {expected_formula}, got {rdkit_formula}",
-                    'expected': expected_formula,
-                    'rdkit': rdkit_formula
-                })
-                print(f"X [{i}/{len(lines)}] {name}: Formula mismatch")
-            else:
+    verbose = mode == 'verbose'
+    progress = Progress(total) if mode == 'progress' else None
+    metrics = Metrics() if profile else None
+    start = time.perf_counter()
+
+    cache = ValidationCache(cache_path, cache_size, namespace=cache_namespace()) if cache_path else None
+    results = iter_results(rows, workers, chunk_size, cache, metrics, limits)
+    if standardize:
+        results = iter_standardized(results, workers, chunk_size, limits, cache)
+    mismatches = 0
+    fixed: Dict[str, int] = {}
+
+    with collecting(metrics) if metrics else nullcontext(), open_error_sink(output) as sink:
+        for i, name, error in results:
+            position = f"{i}/{total}" if total else f"{i}"
+            if progress is not None:
+                progress.update(valid_count + sink.count, sink.count)
+            if error is None:
                 valid_count += 1
-                print(f"O [{i}/{len(lines)}] {name}")
+                if verbose:
+                    with stage('print'):
+                        print(f"O [{position}] {name}")
+                continue
+            if 'standardized' in error:
+                mismatches += 1
+                if error['standardized']['fixed_by']:
+                    steps = ' + '.join(error['standardized']['fixed_by'])
+                    fixed[steps] = fixed.get(steps, 0) + 1
+            with stage('write'):
+                sink.write(error)
+            if len(errors) < MAX_ERROR_DETAILS:
+                errors.append(error)
+            if verbose:
+                with stage('print'):
+                    print(f"X [{position}] {name}: {error_label(error)}")
+    error_count = sink.count
+    if progress is not None:
+        progress.close(valid_count + error_count, error_count)
+    if cache is not None:
+        cache.close()
     
     print(f"\n{'='*60}")
-    print(f"Summary: {valid_count} valid, {len(errors)} errors out of {len(lines)} molecules")
+    print(f"Summary: {valid_count} valid, {error_count} errors out of {total or valid_count + error_count} molecules")
+    if standardize:
+        print(standardization_summary(fixed, mismatches))
+    if cache is not None:
+        print(cache.summary())
     print(f"{'='*60}\n")
     
     if errors:
-        with open('smiles_validation_errors.json', 'w', encoding='utf-8') as f:
-            json.dump(errors, f, indent=2, ensure_ascii=False)
-        print(f"Error report saved to: smiles_validation_errors.json")
-        
+        print(f"Error report saved to: {output}")
+
+    if errors and verbose:
         # Print details
         print("ERRORS FOUND:")
         for err in errors:
@@ -380,6 +781,212 @@ def validate_all():
             print(f"  Formula (file): {err['formula']}")
             print(f"  SMILES: {err['smiles']}")
             print(f"  Error: {err['error']}")
+            if err.get('standardized', {}).get('fixed_by'):
+                print(f"  Standardised: {err['standardized']['smiles']} "
+                      f"({' + '.join(err['standardized']['fixed_by'])})")
+        if error_count > len(errors):
+            print(f"\n... and {error_count - len(errors)} more, see {output}")
+
+    if metrics is not None:
+        elapsed = time.perf_counter() - start
+        metrics.write(profile, elapsed)
+        print(f"\n{'='*60}")
+        print(metrics.format_report(elapsed))
+        print(f"Metrics saved to: {profile}")
+
+    return errors
+
+def validate_incremental(source: str = DEFAULT_MOLECULES_JS, base: Optional[str] = None,
+                         output: str = 'smiles_validation_errors.json',
+                         manifest_path: str = DEFAULT_MANIFEST_PATH, workers: int = 1,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, cache_path: Optional[str] = None,
+                         cache_size: int = DEFAULT_MAX_ENTRIES, limits: Optional[Limits] = None,
+                         standardize: bool = False) -> List[Dict]:
+    """Re-validate only molecules.js entries changed since base and merge them into the previous report
+
+    base is a git ref; it defaults to the snapshot of molecules.js kept by the
+    last run's manifest, so the report always matches the file contents last validated.
+    Without a usable base or previous report this falls back to a full run.
+    """
+    manifest = read_manifest(manifest_path)
+    same_run = manifest.get('source') == os.path.abspath(source) and manifest.get('output') == os.path.abspath(output)
+    with open(source, encoding='utf-8', newline='') as f:
+        text = f.read()
+    old = ref_text(source, base) if base else read_snapshot(manifest) if same_run else None
+    # A clean run leaves no report file behind, so the manifest says whether the report is empty
+    if same_run and manifest.get('clean'):
+        previous = []
+    elif os.path.exists(output):
+        previous = read_error_report(output)
+    else:
+        previous = None
+
+    if old is None or previous is None:
+        print("No usable base ref or previous report, running full validation\n")
+        errors = validate_all(workers=workers, chunk_size=chunk_size, source=source, fmt='js',
+                              output=output, cache_path=cache_path, cache_size=cache_size, limits=limits,
+                              standardize=standardize)
+        if not errors and os.path.exists(output):
+            os.remove(output)
+        write_manifest(source, output, text, not errors, manifest_path)
+        return errors
+
+    changed, removed = changed_molecules(old, text)
+    # Entries come from the text read above, so edits saved during the run are picked up by the next one
+    entries = list(iter_js_lines(text.splitlines(True)))
+    order = {molecule['name']: n for n, (_, molecule) in enumerate(entries)}
+    rows = [(i, m['name'], m['formula'], m['smiles']) for i, m in entries if m['name'] in changed]
+
+    print(f"Incremental validation against {base or 'the previous run'}: "
+          f"{len(rows)} changed, {len(removed)} removed, {len(entries) - len(rows)} unchanged\n")
+
+    merged = {err['name']: err for err in previous
+              if err['name'] in order and err['name'] not in changed}
+    valid_count = 0
+    cache = ValidationCache(cache_path, cache_size, namespace=cache_namespace()) if cache_path else None
+    results = iter_results(rows, workers, chunk_size, cache, limits=limits)
+    if standardize:
+        results = iter_standardized(results, workers, chunk_size, limits, cache)
+    for i, name, error in results:
+        if error is None:
+            valid_count += 1
+            print(f"O [{i}] {name}")
+        else:
+            merged[name] = error
+            print(f"X [{i}] {name}: {error_label(error)}")
+    if cache is not None:
+        cache.close()
+
+    errors = sorted(merged.values(), key=lambda err: order[err['name']])
+    if errors:
+        with open_error_sink(output) as sink:
+            for err in errors:
+                sink.write(err)
+    elif os.path.exists(output):
+        os.remove(output)
+    write_manifest(source, output, text, not errors, manifest_path)
+
+    print(f"\n{'='*60}")
+    print(f"Summary: {valid_count} valid, {len(rows) - valid_count} errors out of {len(rows)} changed molecules; "
+          f"{len(errors)} errors in {output}")
+    if cache is not None:
+        print(cache.summary())
+    print(f"{'='*60}")
+    return errors
+
+def is_molecules_js(path: Optional[str], fmt: Optional[str]) -> bool:
+    """Whether an input is a molecules.js file that molecule_shards can read groups and descriptions from"""
+    if not path or path == '-':
+        return False
+    try:
+        return (fmt or detect_format(path)) == 'js'
+    except ValueError:
+        return False
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Validate SMILES codes against their formulas")
+    parser.add_argument('input', nargs='?',
+                        help="CSV/TSV/SMI file (optionally .gz), src/data/molecules.js or '-' for stdin; "
+                             "defaults to the embedded catalogue")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="input format, detected from the file extension by default (stdin: csv)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (default: 1, serial)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows handed to a worker per task (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--output', default='smiles_validation_errors.json',
+                        help="error report; *.jsonl writes JSON Lines, '-' writes JSON Lines to stdout")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help=f"validation result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum cached results before least recently used ones are evicted")
+    parser.add_argument('--no-cache', action='store_true', help="validate every row from scratch")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-validate molecules.js entries changed since --base and merge "
+                             "them into the existing report")
+    parser.add_argument('--base',
+                        help="git ref to diff against in --incremental mode "
+                             "(default: the contents validated by the last run)")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help=f"run manifest for --incremental (default: {DEFAULT_MANIFEST_PATH})")
+    output_mode = parser.add_mutually_exclusive_group()
+    output_mode.add_argument('--quiet', action='store_true', help="only print the summary")
+    output_mode.add_argument('--progress', action='store_true',
+                             help="print a progress bar on stderr instead of a line per molecule")
+    parser.add_argument('--profile', nargs='?', const='validation_metrics.json', metavar='PATH',
+                        help="time each stage and write metrics JSON (default path: validation_metrics.json)")
+    parser.add_argument('--isolate', action='store_true',
+                        help="validate each molecule in a recyclable worker under --timeout and --max-memory")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f"seconds per molecule with --isolate (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_MAX_MEMORY_MB, metavar='MB',
+                        help=f"RSS cap per worker with --isolate, 0 for none (default: {DEFAULT_MAX_MEMORY_MB})")
+    parser.add_argument('--standardize', action='store_true',
+                        help="check formula mismatches against the largest fragment, neutralised and canonical "
+                             "tautomer forms and report which transformation fixes them (see molecule_standardizer.py)")
+    parser.add_argument('--duplicates', metavar='PATH',
+                        help="also group exact, tautomer and stereoisomer duplicates and write them to PATH")
+    parser.add_argument('--name-collisions', metavar='PATH',
+                        help="also flag names used for different structures and write them to PATH "
+                             "(see name_index.py)")
+    parser.add_argument('--shards', metavar='DIR',
+                        help="also write per-category website shards of the valid molecules to DIR "
+                             "(molecules.js input only, see molecule_shards.py)")
+    parser.add_argument('--mol-store', metavar='PATH',
+                        help="also write the valid molecules as a memory-mapped binary store (see molecule_store.py)")
+    args = parser.parse_args(argv)
+    if args.isolate and args.profile:
+        parser.error("--profile cannot be combined with --isolate")
+    if args.isolate and args.timeout <= FLUSH_INTERVAL:
+        parser.error(f"--timeout must be longer than {FLUSH_INTERVAL:g} s")
+    if args.shards and not is_molecules_js(args.input, args.format):
+        parser.error("--shards needs a molecules.js file as input")
+    limits = Limits(args.timeout, args.max_memory or None) if args.isolate else None
+    # Passes after the validation read the same rows; reading them once also makes them work on stdin
+    rows = None
+    if args.duplicates or args.name_collisions or args.mol_store:
+        rows = list(iter_rows(args.input, args.format) if args.input else iter_text_rows(molecules_data))
+    if args.incremental:
+        validate_incremental(source=args.input or DEFAULT_MOLECULES_JS, base=args.base, output=args.output,
+                             manifest_path=args.manifest, workers=args.workers, chunk_size=args.chunk_size,
+                             cache_path=None if args.no_cache else args.cache, cache_size=args.cache_size,
+                             limits=limits, standardize=args.standardize)
+        return
+    validate_all(workers=args.workers, chunk_size=args.chunk_size, source=args.input,
+                 fmt=args.format, output=args.output,
+                 cache_path=None if args.no_cache else args.cache, cache_size=args.cache_size,
+                 mode='quiet' if args.quiet else 'progress' if args.progress else 'verbose',
+                 profile=args.profile, limits=limits, standardize=args.standardize, rows=rows)
+    identities = None
+    if args.duplicates or args.name_collisions:
+        # molecule_dedup builds on this module, so it is only imported when asked for
+        import molecule_dedup
+        # Both reports start from the same structure identities, so they are computed once
+        identities = list(molecule_dedup.iter_identities(rows, args.workers, args.chunk_size))
+    if args.duplicates:
+        index = molecule_dedup.find_duplicates(rows, identities=identities)
+        molecule_dedup.print_summary(index)
+        with open(args.duplicates, 'w', encoding='utf-8') as f:
+            json.dump(index.report(), f, indent=2, ensure_ascii=False)
+        print(f"Duplicate report saved to: {args.duplicates}")
+    if args.name_collisions:
+        import name_index
+        catalogue = name_index.build_catalogue(rows, identities=identities)
+        name_index.print_collisions(catalogue.collisions)
+        with open(args.name_collisions, 'w', encoding='utf-8') as f:
+            json.dump(catalogue.collisions, f, indent=2, ensure_ascii=False)
+        print(f"Name collision report saved to: {args.name_collisions}")
+    if args.shards:
+        import molecule_shards
+        # Results of the run above are in the cache, so this pass does not parse again
+        stats = molecule_shards.build_shards(args.input, args.shards, args.workers,
+                                             args.chunk_size, None if args.no_cache else args.cache)
+        molecule_shards.print_summary(stats, args.shards)
+    if args.mol_store:
+        import molecule_store
+        stats = molecule_store.build_store(rows, args.mol_store, args.workers, args.chunk_size)
+        print(f"Molecule store: {stats['molecules']} molecules, {stats['bytes']} bytes, saved to: {args.mol_store}")
 
 if __name__ == "__main__":
-    validate_all()
+    main()
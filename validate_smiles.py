@@ -4,13 +4,23 @@ SMILES Validator using RDKit
 Validates molecular SMILES codes, checks formulas, and identifies errors
 """
 
+import argparse
 import json
-import re
+import time
+from contextlib import nullcontext
 from rdkit import Chem
-from rdkit.Chem import Descriptors, rdMolDescriptors
-from collections import defaultdict
-import requests
-from typing import Dict, List, Tuple, Optional
+from rdkit.Chem import Descriptors, rdCIPLabeler, rdMolDescriptors
+from typing import Callable, Dict, List, Tuple, Optional
+
+import formula as chem_formula
+from molecule_reader import FORMATS, dict_to_formula_str, error_record, iter_molecules, open_error_sink
+from smiles_lexer import heavy_atom_mismatch, lex, logged_mol_from_smiles
+from validation_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, ValidationCache, strip_name, with_name
+import validation_metrics
+from validation_metrics import Metrics, Progress, collecting, stage
+
+# Invalid results kept in memory for the console summary; the report file has all of them
+MAX_ERROR_DETAILS = 1000
 
 # Molecules data
 molecules = [
@@ -43,52 +53,241 @@ molecules = [
 
 def normalize_formula(formula_str: str) -> str:
     """Convert subscript numbers to regular numbers for comparison"""
-    subscripts = {
-        '₀': '0', '₁': '1', '₂': '2', '₃': '3', '₄': '4',
-        '₅': '5', '₆': '6', '₇': '7', '₈': '8', '₉': '9'
-    }
-    normalized = formula_str
-    for sub, num in subscripts.items():
-        normalized = normalized.replace(sub, num)
-    return normalized
+    return chem_formula.normalize(formula_str)
 
 def parse_formula(formula_str: str) -> Dict[str, int]:
     """Parse a chemical formula string to get element counts"""
-    formula_str = normalize_formula(formula_str)
-    
-    # Remove charge notation
-    formula_str = formula_str.replace('⁺', '').replace('⁻', '')
-    
-    elements = {}
-    # Match element + optional count
-    pattern = r'([A-Z][a-z]?)(\d*)'
-    matches = re.findall(pattern, formula_str)
-    
-    for element, count in matches:
-        count = int(count) if count else 1
-        elements[element] = elements.get(element, 0) + count
-    
-    return elements
+    return chem_formula.element_counts(formula_str)
 
 def get_rdkit_formula(mol) -> Dict[str, int]:
     """Get formula from RDKit molecule"""
     formula = rdMolDescriptors.CalcMolFormula(mol)
     return parse_formula(formula)
 
-def smiles_to_mol(smiles: str) -> Tuple[Optional[object], Optional[str]]:
+def get_rdkit_vector(mol) -> bytes:
+    """Get the element vector (counts by atomic number plus charge) of an RDKit molecule"""
+    return chem_formula.vector(rdMolDescriptors.CalcMolFormula(mol))
+
+def parse_smiles(smiles: str) -> Tuple[Optional[object], Optional[str], List[str]]:
     """
-    Convert SMILES to RDKit molecule, return (mol, error_message)
+    Convert SMILES to RDKit molecule, return (mol, error_message, RDKit error log)
     """
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        if validation_metrics.active():
+            mol, log = logged_mol_from_smiles(smiles, validation_metrics.staged_mol_from_smiles)
+        else:
+            mol, log = logged_mol_from_smiles(smiles)
         if mol is None:
-            return None, "RDKit could not parse SMILES"
-        return mol, None
+            return None, "RDKit could not parse SMILES", log
+        return mol, None, log
     except Exception as e:
-        return None, str(e)
+        return None, str(e), []
+
+def smiles_to_mol(smiles: str) -> Tuple[Optional[object], Optional[str]]:
+    """
+    Convert SMILES to RDKit molecule, return (mol, error_message)
+    Malformed SMILES are rejected by the lexer without calling RDKit.
+    """
+    with stage('prefilter'):
+        error = lex(smiles).error
+    if error:
+        return None, error
+    return parse_smiles(smiles)[:2]
+
+class Candidate:
+    """A molecule moving through the pipeline: its input, its result so far and what earlier stages computed"""
+    __slots__ = ('mol_data', 'result', 'mol')
+
+    def __init__(self, mol_data: Dict, result: Dict):
+        self.mol_data = mol_data
+        self.result = result
+        self.mol = None
+
+# Pipeline stages by name. A stage returns an error message, which fails the
+# molecule and skips every later stage, or None to continue.
+PIPELINE_STAGES: Dict[str, Callable[[Candidate], Optional[str]]] = {}
+
+def pipeline_stage(name: str):
+    """Register a function as a pipeline stage"""
+    def register(func: Callable[[Candidate], Optional[str]]):
+        PIPELINE_STAGES[name] = func
+        return func
+    return register
+
+# Stage names per tier, cheapest first
+TIERS = {
+    # CI on every push: no sanitization, just parse and count atoms
+    'fast': ('prefilter', 'parse_unsanitized', 'formula'),
+    'default': ('prefilter', 'parse', 'formula'),
+    # Nightly: structural consistency checks on top of the default tier
+    'strict': ('prefilter', 'parse', 'formula', 'valence', 'charge', 'canonical', 'aromaticity', 'stereo'),
+}
+
+@pipeline_stage('prefilter')
+def prefilter_stage(candidate: Candidate) -> Optional[str]:
+    """Reject malformed SMILES and heavy-atom formula mismatches before RDKit"""
+    with stage('prefilter'):
+        lexed = lex(candidate.mol_data['smiles'])
+        expected_heavy = heavy_atom_mismatch(lexed, candidate.mol_data['formula'])
+    if lexed.error:
+        return f"SMILES parse error: {lexed.error}"
+    if expected_heavy is not None:
+        candidate.result['expected_formula'] = parse_formula(candidate.mol_data['formula'])
+        return (f"Formula mismatch: expected heavy atoms {expected_heavy}, "
+                f"SMILES has {dict(sorted(lexed.heavy_atoms.items()))}")
+    return None
+
+@pipeline_stage('parse')
+def parse_stage(candidate: Candidate) -> Optional[str]:
+    """Parse and fully sanitize"""
+    candidate.mol, error, log = parse_smiles(candidate.mol_data['smiles'])
+    if error:
+        if log:
+            candidate.result['rdkit_log'] = log
+        return f"SMILES parse error: {error}"
+    return None
+
+@pipeline_stage('parse_unsanitized')
+def parse_unsanitized_stage(candidate: Candidate) -> Optional[str]:
+    """Parse without sanitization; implicit hydrogens are still computed, so formulas match the full parse"""
+    with stage('parse'):
+        mol, log = logged_mol_from_smiles(candidate.mol_data['smiles'],
+                                          lambda smiles: Chem.MolFromSmiles(smiles, sanitize=False))
+    if mol is None:
+        if log:
+            candidate.result['rdkit_log'] = log
+        return "SMILES parse error: RDKit could not parse SMILES"
+    mol.UpdatePropertyCache(strict=False)
+    candidate.mol = mol
+    return None
+
+@pipeline_stage('formula')
+def formula_stage(candidate: Candidate) -> Optional[str]:
+    """Compare RDKit's formula with the expected one"""
+    result = candidate.result
+    formula = candidate.mol_data['formula']
+    with stage('rdkit_formula'):
+        rdkit_formula_str = rdMolDescriptors.CalcMolFormula(candidate.mol)
+    with stage('parse_formula'):
+        rdkit_formula = parse_formula(rdkit_formula_str)
+    result['rdkit_formula'] = rdkit_formula
+
+    # Inputs without a formula column (plain .smi files) only get the parse check
+    if not formula:
+        return None
+
+    try:
+        with stage('parse_formula'):
+            expected_formula = parse_formula(formula)
+            expected_vector = chem_formula.vector(formula)
+    except chem_formula.FormulaError as e:
+        return f"Formula parse error: {e}"
+    result['expected_formula'] = expected_formula
+
+    # Compare element vectors (counts by atomic number plus charge)
+    with stage('parse_formula'):
+        matches = chem_formula.vector(rdkit_formula_str) == expected_vector
+    if matches:
+        return None
+    if rdkit_formula == expected_formula:
+        expected_charge = chem_formula.parse(formula).charge
+        rdkit_charge = chem_formula.parse(rdkit_formula_str).charge
+        return f"Charge mismatch: expected {expected_charge:+d}, got {rdkit_charge:+d}"
+    return f"Formula mismatch: expected {expected_formula}, got {rdkit_formula}"
+
+def _atom_labels(atoms) -> str:
+    return ', '.join(f"{a.GetSymbol()}{a.GetIdx() + 1}" for a in atoms)
+
+@pipeline_stage('valence')
+def valence_stage(candidate: Candidate) -> Optional[str]:
+    """Atoms left with unpaired electrons, usually a bracket atom missing its hydrogens"""
+    with stage('valence'):
+        radicals = [a for a in candidate.mol.GetAtoms() if a.GetNumRadicalElectrons()]
+    if radicals:
+        return f"Radical electrons on {_atom_labels(radicals)}"
+    return None
+
+@pipeline_stage('charge')
+def charge_stage(candidate: Candidate) -> Optional[str]:
+    """Bonded atoms carrying charges of the same sign"""
+    with stage('charge'):
+        clashes = [b for b in candidate.mol.GetBonds()
+                   if b.GetBeginAtom().GetFormalCharge() * b.GetEndAtom().GetFormalCharge() > 0]
+    if clashes:
+        return "Like charges on bonded atoms " + ', '.join(
+            f"{_atom_labels([b.GetBeginAtom()])}-{_atom_labels([b.GetEndAtom()])}" for b in clashes)
+    return None
+
+@pipeline_stage('canonical')
+def canonical_stage(candidate: Candidate) -> Optional[str]:
+    """Canonical SMILES must survive a parse and write unchanged"""
+    with stage('canonical'):
+        canonical = Chem.MolToSmiles(candidate.mol)
+        reparsed = Chem.MolFromSmiles(canonical)
+        again = Chem.MolToSmiles(reparsed) if reparsed is not None else None
+    if again != canonical:
+        return f"Canonical SMILES is not stable: {canonical} -> {again}"
+    return None
+
+@pipeline_stage('aromaticity')
+def aromaticity_stage(candidate: Candidate) -> Optional[str]:
+    """The Kekulé form must perceive back to the same aromatic molecule"""
+    with stage('aromaticity'):
+        kekule = Chem.Mol(candidate.mol)
+        try:
+            Chem.Kekulize(kekule, clearAromaticFlags=True)
+        except Exception as e:
+            return f"Aromaticity round trip failed: {e}"
+        reparsed = Chem.MolFromSmiles(Chem.MolToSmiles(kekule, kekuleSmiles=True))
+        same = reparsed is not None and Chem.MolToSmiles(reparsed) == Chem.MolToSmiles(candidate.mol)
+    if not same:
+        return "Aromaticity round trip failed: Kekulé SMILES does not give the same molecule"
+    return None
+
+@pipeline_stage('stereo')
+def stereo_stage(candidate: Candidate) -> Optional[str]:
+    """Every stereo tag in the SMILES must sit on a real stereocentre with a CIP label"""
+    with stage('stereo'):
+        raw = Chem.MolFromSmiles(candidate.mol_data['smiles'], sanitize=False)
+        written = sum(a.GetChiralTag() != Chem.ChiralType.CHI_UNSPECIFIED for a in raw.GetAtoms())
+        kept = [a for a in candidate.mol.GetAtoms() if a.GetChiralTag() != Chem.ChiralType.CHI_UNSPECIFIED]
+        if written > len(kept):
+            return f"Stereo specified on {written - len(kept)} atom(s) that are not stereocentres"
+        labelled = Chem.Mol(candidate.mol)
+        rdCIPLabeler.AssignCIPLabels(labelled)
+        unlabelled = [labelled.GetAtomWithIdx(a.GetIdx()) for a in kept
+                      if not labelled.GetAtomWithIdx(a.GetIdx()).HasProp('_CIPCode')]
+    if unlabelled:
+        return f"No CIP label for stereocentre {_atom_labels(unlabelled)}"
+    return None
+
+def run_pipeline(candidate: Candidate, stages: Tuple[str, ...]) -> Dict:
+    """Run stages in order, stopping at the first one that fails the molecule"""
+    result = candidate.result
+    for name in stages:
+        error = PIPELINE_STAGES[name](candidate)
+        if error:
+            result['is_valid'] = False
+            result['errors'].append(error)
+            result['failed_stage'] = name
+            break
+    return result
+
+def validate_molecule(mol_data: Dict, cache: Optional[ValidationCache] = None, tier: str = 'default') -> Dict:
+    """Validate a single molecule with the stages of a tier, reusing a cached result when one is available
+
+    The cache must belong to the same tier (see cache_namespace).
+    """
+    if cache is not None:
+        with stage('cache'):
+            found, cached = cache.get(mol_data['smiles'], mol_data['formula'])
+        if found:
+            return with_name(mol_data['name'], cached)
+        result = validate_molecule(mol_data, tier=tier)
+        with stage('cache'):
+            cache.put(mol_data['smiles'], mol_data['formula'], strip_name(result))
+        return result
 
-def validate_molecule(mol_data: Dict) -> Dict:
-    """Validate a single molecule"""
     result = {
         'name': mol_data['name'],
         'formula': mol_data['formula'],
@@ -98,64 +297,107 @@ def validate_molecule(mol_data: Dict) -> Dict:
         'rdkit_formula': None,
         'expected_formula': None,
     }
-    
-    # Try to parse SMILES
-    mol, smiles_error = smiles_to_mol(mol_data['smiles'])
-    
-    if smiles_error:
-        result['is_valid'] = False
-        result['errors'].append(f"SMILES parse error: {smiles_error}")
-        return result
-    
-    # Get RDKit formula
-    rdkit_formula = get_rdkit_formula(mol)
-    result['rdkit_formula'] = rdkit_formula
-    
-    # Parse expected formula
-    expected_formula = parse_formula(mol_data['formula'])
-    result['expected_formula'] = expected_formula
-    
-    # Compare formulas
-    if rdkit_formula != expected_formula:
-        result['is_valid'] = False
-        result['errors'].append(f"Formula mismatch: expected {expected_formula}, got {rdkit_formula}")
-    
-    return result
+    return run_pipeline(Candidate(mol_data, result), TIERS[tier])
+
+def cache_namespace(tier: str = 'default') -> str:
+    """Cached results of different tiers are kept apart"""
+    return 'validate_smiles' if tier == 'default' else f'validate_smiles:{tier}'
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Validate all molecules"""
+    parser = argparse.ArgumentParser(description="Validate SMILES codes against their formulas")
+    parser.add_argument('input', nargs='?',
+                        help="CSV/TSV/SMI file (optionally .gz), src/data/molecules.js or '-' for stdin; "
+                             "defaults to the embedded molecule list")
+    parser.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    parser.add_argument('--output', default='smiles_errors.json',
+                        help="error report; *.jsonl writes JSON Lines")
+    parser.add_argument('--tier', choices=TIERS, default='default',
+                        help="checks to run: 'fast' skips sanitization, 'strict' adds valence, charge, "
+                             "canonical SMILES, aromaticity and stereo checks (default: default)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help=f"validation result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum cached results before least recently used ones are evicted")
+    parser.add_argument('--no-cache', action='store_true', help="validate every molecule from scratch")
+    output_mode = parser.add_mutually_exclusive_group()
+    output_mode.add_argument('--quiet', action='store_true', help="only print the summary")
+    output_mode.add_argument('--progress', action='store_true',
+                             help="print a progress bar on stderr instead of a line per molecule")
+    parser.add_argument('--profile', nargs='?', const='validation_metrics.json', metavar='PATH',
+                        help="time each stage and write metrics JSON (default path: validation_metrics.json)")
+    args = parser.parse_args(argv)
+    verbose = not (args.quiet or args.progress)
+
+    if args.input:
+        source = iter_molecules(args.input, args.format)
+        total = None
+    else:
+        source = molecules
+        total = len(molecules)
+
     print("Starting SMILES validation...")
-    print(f"Total molecules to validate: {len(molecules)}\n")
+    if total is not None:
+        print(f"Total molecules to validate: {total}\n")
+    else:
+        print(f"Reading molecules from {'stdin' if args.input == '-' else args.input}\n")
     
     errors_found = []
     valid_count = 0
+    count = 0
     
-    for i, mol_data in enumerate(molecules, 1):
-        result = validate_molecule(mol_data)
-        
-        if result['is_valid']:
-            valid_count += 1
-            print(f"✓ [{i}/{len(molecules)}] {mol_data['name']}")
-        else:
-            print(f"✗ [{i}/{len(molecules)}] {mol_data['name']}")
-            errors_found.append(result)
-            for error in result['errors']:
-                print(f"   → {error}")
+    cache = None if args.no_cache else ValidationCache(args.cache, args.cache_size, namespace=cache_namespace(args.tier))
+    progress = Progress(total) if args.progress else None
+    metrics = Metrics() if args.profile else None
+    start = time.perf_counter()
+    
+    with collecting(metrics) if metrics else nullcontext(), open_error_sink(args.output) as sink:
+        for i, mol_data in enumerate(source, 1):
+            count = i
+            position = f"{i}/{total}" if total else f"{i}"
+            if progress is not None:
+                progress.update(i - 1, sink.count)
+            molecule_start = time.perf_counter_ns()
+            result = validate_molecule(mol_data, cache, args.tier)
+            if metrics is not None:
+                metrics.observe(mol_data['name'], mol_data['smiles'], time.perf_counter_ns() - molecule_start)
+            
+            if result['is_valid']:
+                valid_count += 1
+                if verbose:
+                    with stage('print'):
+                        print(f"✓ [{position}] {mol_data['name']}")
+            else:
+                with stage('write'):
+                    sink.write(error_record(result))
+                if len(errors_found) < MAX_ERROR_DETAILS:
+                    errors_found.append(result)
+                if verbose:
+                    with stage('print'):
+                        print(f"✗ [{position}] {mol_data['name']}")
+                        for error in result['errors']:
+                            print(f"   → {error}")
+    invalid_count = sink.count
+    if progress is not None:
+        progress.close(count, invalid_count)
+    if cache is not None:
+        cache.close()
     
     print(f"\n{'='*60}")
     print(f"Validation Summary:")
     print(f"{'='*60}")
-    print(f"Total molecules: {len(molecules)}")
+    print(f"Total molecules: {count}")
     print(f"Valid: {valid_count}")
-    print(f"Invalid: {len(errors_found)}")
-    print(f"Error rate: {len(errors_found)/len(molecules)*100:.1f}%")
+    print(f"Invalid: {invalid_count}")
+    print(f"Error rate: {invalid_count/max(count, 1)*100:.1f}%")
+    if cache is not None:
+        print(cache.summary())
     
-    if errors_found:
+    if errors_found and verbose:
         print(f"\n{'='*60}")
         print("MOLECULES WITH ERRORS:")
         print(f"{'='*60}\n")
         
-        error_json = []
         for result in errors_found:
             print(f"\n{result['name']}")
             print(f"  Current SMILES: {result['smiles']}")
@@ -163,46 +405,19 @@ def main():
             print(f"  RDKit formula: {dict_to_formula_str(result['rdkit_formula'])}")
             print(f"  Expected parsed: {result['expected_formula']}")
             print(f"  Errors: {'; '.join(result['errors'])}")
-            
-            error_json.append({
-                'name': result['name'],
-                'current_smiles': result['smiles'],
-                'expected_formula': result['formula'],
-                'rdkit_formula': dict_to_formula_str(result['rdkit_formula']) if result['rdkit_formula'] else None,
-                'errors': result['errors'],
-                'status': 'NEEDS_REVIEW'
-            })
+        if invalid_count > len(errors_found):
+            print(f"\n... and {invalid_count - len(errors_found)} more, see {args.output}")
         
-        # Save error report
-        with open('smiles_errors.json', 'w') as f:
-            json.dump(error_json, f, indent=2)
-        print(f"\n\nError report saved to: smiles_errors.json")
-
-def dict_to_formula_str(formula_dict: Dict[str, int]) -> str:
-    """Convert formula dict back to string"""
-    if not formula_dict:
-        return ""
-    
-    # Order: C, H, then alphabetically
-    elements = sorted(formula_dict.keys())
-    if 'C' in elements:
-        elements.remove('C')
-        elements.insert(0, 'C')
-    if 'H' in elements:
-        elements.remove('H')
-        if 'C' in elements:
-            elements.insert(1, 'H')
-        else:
-            elements.insert(0, 'H')
-    
-    result = ""
-    for elem in elements:
-        count = formula_dict[elem]
-        if count == 1:
-            result += elem
-        else:
-            result += f"{elem}{count}"
-    return result
+        print(f"\n\nError report saved to: {args.output}")
+    elif errors_found:
+        print(f"\nError report saved to: {args.output}")
+
+    if metrics is not None:
+        elapsed = time.perf_counter() - start
+        metrics.write(args.profile, elapsed)
+        print(f"\n{'='*60}")
+        print(metrics.format_report(elapsed))
+        print(f"Metrics saved to: {args.profile}")
 
 if __name__ == "__main__":
     main()
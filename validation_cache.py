@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of SMILES validation results
+Results are stored in SQLite, keyed by a hash of (SMILES, expected formula, RDKit version),
+and the least recently used entries are evicted once the cache grows past its size limit
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from rdkit import rdBase
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'smiles_validation.sqlite')
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# Bump when validation logic changes so stale results are not reused
+CACHE_VERSION = 7
+
+# Pending last-used updates are written in batches of this size
+TOUCH_BATCH_SIZE = 1000
+
+# Seconds a writer waits for another process (a daemon, a parallel run) to commit
+BUSY_TIMEOUT = 60.0
+
+def salt(namespace: str) -> str:
+    """Prefix hashed into every key of a namespace, tied to the RDKit and cache versions"""
+    return f"{namespace}\0{rdBase.rdkitVersion}\0{CACHE_VERSION}\0"
+
+class ValidationCache:
+    """SQLite-backed LRU cache mapping validation inputs to JSON results
+
+    Results are stored without the molecule name, so entries that share a
+    SMILES and formula under different names (Adrenalin/Epinefrin) share one
+    cache row. Callers add the name back with the result's key order intact.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 namespace: str = 'default'):
+        self.path = path
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self._inserted = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' last_used INTEGER NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        # Counted once here, then kept up to date by put and flush, so eviction never scans the table
+        self._rows = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        self._salt = salt(namespace)
+
+    def key(self, smiles: str, formula: str, namespace: Optional[str] = None) -> str:
+        """Hash of the validation inputs and the RDKit version
+
+        namespace, when given, replaces the cache's own one, so related results
+        (standardised forms of a SMILES) share the table and its connection.
+        """
+        prefix = self._salt if namespace is None else salt(namespace)
+        return hashlib.blake2b(f"{prefix}{smiles}\0{formula}".encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, smiles: str, formula: str, namespace: Optional[str] = None) -> Tuple[bool, Optional[Dict]]:
+        """Return (found, result); result may itself be None for a cached 'valid' answer"""
+        key = self.key(smiles, formula, namespace)
+        row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._touch(key)
+        return True, json.loads(row[0])
+
+    def get_many(self, items: Iterable[Tuple[str, str]],
+                 namespace: Optional[str] = None) -> Dict[Tuple[str, str], Optional[Dict]]:
+        """Look up several (smiles, formula) pairs, returning only the hits"""
+        items = list(items)
+        keys = {self.key(smiles, formula, namespace): (smiles, formula) for smiles, formula in items}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), 500):
+            batch = key_list[start:start + 500]
+            marks = ','.join('?' * len(batch))
+            for key, value in self._db.execute(f'SELECT key, value FROM results WHERE key IN ({marks})', batch):
+                found[keys[key]] = json.loads(value)
+                self._touch(key)
+        self.hits += sum(1 for item in items if item in found)
+        self.misses += sum(1 for item in items if item not in found)
+        return found
+
+    def put(self, smiles: str, formula: str, result: Optional[Dict], namespace: Optional[str] = None):
+        """Store a result (None means the molecule was valid)"""
+        row = (json.dumps(result, ensure_ascii=False), time.time_ns(), self.key(smiles, formula, namespace))
+        # Only a new key adds a row; replacing an existing one leaves the count alone
+        if self._db.execute('UPDATE results SET value = ?, last_used = ? WHERE key = ?', row).rowcount == 0:
+            self._db.execute('INSERT INTO results (value, last_used, key) VALUES (?, ?, ?)', row)
+            self._rows += 1
+        self._inserted += 1
+        if self._inserted >= TOUCH_BATCH_SIZE:
+            self.flush()
+
+    def _touch(self, key: str):
+        self._touched[key] = time.time_ns()
+        if len(self._touched) >= TOUCH_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write pending last-used stamps and new entries, then evict down to max_entries"""
+        if self._touched:
+            self._db.executemany('UPDATE results SET last_used = ? WHERE key = ?',
+                                 [(stamp, key) for key, stamp in self._touched.items()])
+            self._touched.clear()
+        self._inserted = 0
+        if self._rows > self.max_entries:
+            self._rows -= self._db.execute(
+                'DELETE FROM results WHERE key IN ('
+                ' SELECT key FROM results ORDER BY last_used LIMIT ?)',
+                (self._rows - self.max_entries,),
+            ).rowcount
+        self._db.commit()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def summary(self) -> str:
+        return f"Cache: {self.hits} hits, {self.misses} misses ({self.path})"
+
+def strip_name(result: Optional[Dict]) -> Optional[Dict]:
+    """Drop the name from a result before caching it"""
+    if result is None:
+        return None
+    return {k: v for k, v in result.items() if k != 'name'}
+
+def with_name(name: str, result: Optional[Dict]) -> Optional[Dict]:
+    """Put the name back in front of a cached result"""
+    if result is None:
+        return None
+    return {'name': name, **result}
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Long-lived validation daemon with a Unix socket API
+Keeps RDKit and the validation cache loaded and answers validate_molecule requests
+over a Unix domain socket. The protocol is JSON Lines: each request line holds a
+batch of molecules and gets exactly one response line.
+
+  -> {"id": 1, "op": "validate", "tier": "default", "molecules": [{"name": "Etanol", "formula": "C2H6O", "smiles": "CCO"}]}
+  <- {"id": 1, "results": [{"name": "Etanol", ..., "is_valid": true, "errors": []}]}
+
+Other ops are "ping" (daemon status) and "shutdown". The client commands import
+neither RDKit nor the validators, so a call costs milliseconds instead of seconds.
+With --watch the daemon also re-validates molecules.js whenever it is saved.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, suppress
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from molecule_reader import FORMATS, error_record, iter_molecules, open_error_sink
+
+DEFAULT_MOLECULES_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'data', 'molecules.js')
+DEFAULT_SOCKET_PATH = os.path.join('.cache', 'validation.sock')
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_WATCH_INTERVAL = 0.5
+
+# Fields of a molecule in a request; each is a string, or absent
+MOLECULE_FIELDS = ('name', 'formula', 'smiles')
+
+# Longest request line the daemon reads; a batch of 10k molecules is about 2 MB
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+class DaemonError(RuntimeError):
+    """Raised by the client when the daemon is unreachable or rejects a request"""
+
+def molecules_error(molecules) -> Optional[str]:
+    """Why the 'molecules' of a request cannot be validated, or None"""
+    if not isinstance(molecules, list):
+        return "'molecules' must be a list"
+    for molecule in molecules:
+        if not isinstance(molecule, dict):
+            return "each molecule must be an object"
+        for field in MOLECULE_FIELDS:
+            if not isinstance(molecule.get(field, ''), (str, type(None))):
+                return f"molecule field {field!r} must be a string"
+    return None
+
+def daemon_running(path: str) -> bool:
+    """True if something accepts connections on the socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+class ValidationServer:
+    """Answers JSON Lines requests with validate_smiles.validate_molecule results"""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        # Imported here so the client commands never load RDKit
+        from validate_smiles import TIERS, cache_namespace, validate_molecule
+        self.tiers = TIERS
+        self._cache_namespace = cache_namespace
+        self._validate = validate_molecule
+        self.cache_path = cache_path
+        self.caches = {}
+        # Validation runs on this one thread, so the event loop keeps serving other clients
+        # meanwhile, and each cache connection is only used by the thread that opened it
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self.started = time.monotonic()
+        self.requests = 0
+        self.molecules = 0
+        self.stopping: Optional[asyncio.Event] = None
+
+    def cache(self, tier: str):
+        """Result cache of one tier, opened on first use"""
+        if self.cache_path is None:
+            return None
+        if tier not in self.caches:
+            from validation_cache import ValidationCache
+            self.caches[tier] = ValidationCache(self.cache_path, namespace=self._cache_namespace(tier))
+        return self.caches[tier]
+
+    def close(self):
+        """Close the caches on the validation thread, then stop it"""
+        def close_caches():
+            for cache in self.caches.values():
+                cache.close()
+        self.executor.submit(close_caches).result()
+        self.executor.shutdown()
+
+    def validate(self, molecules: Iterable[Dict], tier: str = 'default') -> List[Dict]:
+        cache = self.cache(tier)
+        results = []
+        for m in molecules:
+            smiles = m.get('smiles', '')
+            mol_data = {'name': m.get('name') or smiles, 'formula': m.get('formula') or '', 'smiles': smiles}
+            results.append(self._validate(mol_data, cache, tier))
+        self.molecules += len(results)
+        # Commit per request: an open write transaction would lock other validators out of the cache
+        if cache is not None:
+            cache.flush()
+        return results
+
+    async def validate_batches(self, molecules: Iterable[Dict], tier: str = 'default') -> List[Dict]:
+        """validate on the validation thread a batch at a time, so requests of other clients interleave"""
+        loop = asyncio.get_running_loop()
+        results = []
+        for batch in batched(molecules, DEFAULT_BATCH_SIZE):
+            results.extend(await loop.run_in_executor(self.executor, self.validate, batch, tier))
+        return results
+
+    def status(self) -> Dict:
+        from rdkit import rdBase
+        return {'pid': os.getpid(), 'rdkit': rdBase.rdkitVersion, 'uptime': round(time.monotonic() - self.started, 1),
+                'requests': self.requests, 'molecules': self.molecules}
+
+    async def handle(self, request: Dict) -> Dict:
+        """Response to one decoded request line"""
+        self.requests += 1
+        op = request.get('op', 'validate')
+        response = {'id': request.get('id')}
+        if op == 'validate':
+            molecules = request.get('molecules')
+            tier = request.get('tier', 'default')
+            problem = molecules_error(molecules)
+            if problem:
+                response['error'] = problem
+            elif tier not in self.tiers:
+                response['error'] = f"Unknown tier {tier!r}"
+            else:
+                response['results'] = await self.validate_batches(molecules, tier)
+        elif op == 'ping':
+            response.update(self.status())
+        elif op == 'shutdown':
+            response['ok'] = True
+            self.stopping.set()
+        else:
+            response['error'] = f"Unknown op {op!r}"
+        return response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than MAX_LINE_BYTES: the rest of the stream cannot be framed
+                    writer.write(b'{"id": null, "error": "request line too long"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    response = {'id': None, 'error': f"invalid JSON: {e}"}
+                else:
+                    if not isinstance(request, dict):
+                        response = {'id': None, 'error': "expected an object"}
+                    else:
+                        try:
+                            response = await self.handle(request)
+                        except Exception as e:
+                            # Every request line gets its response line, even when validation itself fails
+                            response = {'id': request.get('id'), 'error': f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+
+    async def close_connections(self):
+        """End every open connection and wait for its handler to return
+
+        Closing the transport gives the handler end-of-file, so it returns
+        normally rather than being cancelled while it waits for a request.
+        """
+        for writer in list(self.connections.values()):
+            writer.close()
+        for task in list(self.connections):
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def revalidate(self, path: str, output: str) -> str:
+        """Validate every molecule of path, write the error report and return a summary line"""
+        start = time.perf_counter()
+        molecules = await asyncio.get_running_loop().run_in_executor(self.executor, list, iter_molecules(path))
+        count = 0
+        with open_error_sink(output) as sink:
+            for result in await self.validate_batches(molecules):
+                count += 1
+                if not result['is_valid']:
+                    sink.write(error_record(result))
+            errors = sink.count
+        return (f"{time.strftime('%H:%M:%S')} {os.path.basename(path)}: {count} molecules, {errors} errors "
+                f"({time.perf_counter() - start:.2f} s), report: {output}")
+
+    async def watch(self, path: str, output: str, interval: float = DEFAULT_WATCH_INTERVAL):
+        """Re-validate path whenever its modification time changes"""
+        seen = None
+        while not self.stopping.is_set():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != seen:
+                seen = mtime
+                try:
+                    print(await self.revalidate(path, output), flush=True)
+                except (OSError, ValueError) as e:
+                    # A half-written file; the next save triggers another run
+                    print(f"Could not validate {path}: {e}", file=sys.stderr, flush=True)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def serve(self, path: str, watch: Optional[str] = None, output: str = 'smiles_errors.json',
+                    interval: float = DEFAULT_WATCH_INTERVAL):
+        """Listen on path until a shutdown request, SIGINT or SIGTERM"""
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+        server = await asyncio.start_unix_server(self.handle_connection, path=path, limit=MAX_LINE_BYTES)
+        os.chmod(path, 0o600)
+        print(f"Validation daemon {os.getpid()} listening on {path}", flush=True)
+        watcher = asyncio.ensure_future(self.watch(watch, output, interval)) if watch else None
+        try:
+            async with server:
+                await self.stopping.wait()
+                # Open connections hold up wait_closed on leaving the block (Python 3.12+), so end them first
+                server.close()
+                await self.close_connections()
+        finally:
+            if watcher is not None:
+                await watcher
+            if os.path.exists(path):
+                os.unlink(path)
+
+class DaemonClient:
+    """Blocking client for the daemon; one connection, one request at a time"""
+
+    def __init__(self, path: str = DEFAULT_SOCKET_PATH, timeout: Optional[float] = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            self.sock.close()
+            raise DaemonError(f"No validation daemon on {path} ({e.strerror}); "
+                              f"start one with: python validation_daemon.py serve") from e
+        self._file = self.sock.makefile('rwb')
+        self._next_id = 0
+
+    def call(self, request: Dict) -> Dict:
+        self._next_id += 1
+        request = {'id': self._next_id, **request}
+        self._file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("Daemon closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response
+
+    def validate(self, molecules: List[Dict], tier: str = 'default') -> List[Dict]:
+        return self.call({'op': 'validate', 'tier': tier, 'molecules': molecules})['results']
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_client(args) -> int:
+    """validate/ping/stop commands; returns the exit status"""
+    with DaemonClient(args.socket) as client:
+        if args.command == 'ping':
+            print(json.dumps(client.call({'op': 'ping'}), indent=2))
+            return 0
+        if args.command == 'stop':
+            client.call({'op': 'shutdown'})
+            print(f"Stopped daemon on {args.socket}")
+            return 0
+        if args.smiles:
+            source = [{'name': s, 'formula': '', 'smiles': s} for s in args.smiles]
+        else:
+            source = iter_molecules(args.input, args.format)
+        count = invalid = 0
+        with open_error_sink(args.output) if args.output else nullcontext() as sink:
+            for batch in batched(source, args.batch_size):
+                for result in client.validate(batch, args.tier):
+                    count += 1
+                    if args.json:
+                        print(json.dumps(result, ensure_ascii=False))
+                    elif result['is_valid']:
+                        if not args.quiet:
+                            print(f"✓ {result['name']}")
+                    else:
+                        print(f"✗ {result['name']}: {'; '.join(result['errors'])}")
+                    if not result['is_valid']:
+                        invalid += 1
+                        if sink is not None:
+                            sink.write(error_record(result))
+    if not args.json:
+        print(f"{count} molecules, {invalid} invalid")
+    return 1 if invalid else 0
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Warm validation daemon on a Unix socket, and its client")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help=f"socket path (default: {DEFAULT_SOCKET_PATH})")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="run the daemon in the foreground")
+    serve.add_argument('--watch', nargs='?', const=DEFAULT_MOLECULES_JS, metavar='PATH',
+                       help="re-validate PATH whenever it changes (default: src/data/molecules.js)")
+    serve.add_argument('--output', default='smiles_errors.json',
+                       help="error report written by --watch; *.jsonl writes JSON Lines")
+    serve.add_argument('--interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                       help="seconds between modification time checks")
+    serve.add_argument('--cache', help="validation result cache (default: .cache/smiles_validation.sqlite)")
+    serve.add_argument('--no-cache', action='store_true', help="validate every molecule from scratch")
+    validate = sub.add_parser('validate', help="validate molecules with a running daemon")
+    validate.add_argument('input', nargs='?', default=DEFAULT_MOLECULES_JS,
+                          help="CSV/TSV/SMI file (optionally .gz), molecules.js or '-' for stdin "
+                               "(default: src/data/molecules.js)")
+    validate.add_argument('--format', choices=FORMATS, help="input format, detected from the extension by default")
+    validate.add_argument('--smiles', nargs='+', help="validate these SMILES instead of a file")
+    validate.add_argument('--tier', default='default', help="fast, default or strict (see validate_smiles.py)")
+    validate.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    validate.add_argument('--output', help="also write invalid results; *.jsonl writes JSON Lines")
+    validate.add_argument('--json', action='store_true', help="print every result as a JSON line")
+    validate.add_argument('--quiet', action='store_true', help="only print invalid molecules and the summary")
+    sub.add_parser('ping', help="print the daemon's status")
+    sub.add_parser('stop', help="shut the daemon down")
+    args = parser.parse_args(argv)
+
+    if args.command != 'serve':
+        try:
+            sys.exit(run_client(args))
+        except DaemonError as e:
+            parser.exit(2, f"{e}\n")
+
+    if os.path.exists(args.socket):
+        if daemon_running(args.socket):
+            parser.exit(1, f"A daemon is already listening on {args.socket}\n")
+        os.unlink(args.socket)
+    directory = os.path.dirname(args.socket)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    cache_path = None
+    if not args.no_cache:
+        from validation_cache import DEFAULT_CACHE_PATH
+        cache_path = args.cache or DEFAULT_CACHE_PATH
+    server = ValidationServer(cache_path)
+    try:
+        asyncio.run(server.serve(args.socket, args.watch, args.output, args.interval))
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
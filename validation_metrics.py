@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing instrumentation for the validators
+Collects monotonic per-stage timers, a per-molecule latency histogram and the slowest
+molecules, merges them across worker processes and reports them as text or JSON.
+Timers are no-ops unless a Metrics object is being collected into.
+"""
+
+import heapq
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from rdkit import Chem
+
+# Upper bounds in microseconds of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000)
+
+DEFAULT_TOP_N = 20
+
+class _NullStage:
+    """Shared do-nothing timer used while no metrics are collected"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = _NullStage()
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+class Metrics:
+    """Stage totals, latency histogram and top-N slowest molecules of one run"""
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N):
+        self.top_n = top_n
+        self.stages: Dict[str, List[int]] = {}
+        self.histogram = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.molecules = 0
+        self.molecule_ns = 0
+        self._slowest: List[Tuple[int, str, str]] = []
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def add(self, name: str, ns: int, count: int = 1):
+        totals = self.stages.get(name)
+        if totals is None:
+            self.stages[name] = [count, ns]
+        else:
+            totals[0] += count
+            totals[1] += ns
+
+    def observe(self, name: str, smiles: str, ns: int):
+        """Record the end-to-end latency of one molecule"""
+        self.molecules += 1
+        self.molecule_ns += ns
+        us = ns / 1000
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS_US) and us > LATENCY_BUCKETS_US[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, (ns, name, smiles))
+        elif ns > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (ns, name, smiles))
+
+    def merge(self, other: 'Metrics'):
+        """Fold in metrics collected elsewhere, e.g. by a worker process"""
+        for name, (count, ns) in other.stages.items():
+            self.add(name, ns, count)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.molecules += other.molecules
+        self.molecule_ns += other.molecule_ns
+        for item in other._slowest:
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, item)
+            elif item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def slowest(self) -> List[Tuple[int, str, str]]:
+        return sorted(self._slowest, reverse=True)
+
+    def percentile_us(self, fraction: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the given fraction of molecules"""
+        if not self.molecules:
+            return None
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_US + (None,), self.histogram):
+            seen += count
+            if seen >= fraction * self.molecules:
+                return bound
+        return None
+
+    def to_dict(self, wall_seconds: Optional[float] = None) -> Dict:
+        """Machine-readable metrics"""
+        total_ns = sum(ns for _, ns in self.stages.values()) or 1
+        report = {
+            'version': 1,
+            'wall_seconds': round(wall_seconds, 4) if wall_seconds is not None else None,
+            'molecules': self.molecules,
+            'molecules_per_sec': round(self.molecules / wall_seconds, 1) if wall_seconds else None,
+            'stages': {
+                name: {
+                    'count': count,
+                    'total_ms': round(ns / 1e6, 3),
+                    'mean_us': round(ns / count / 1000, 2) if count else 0,
+                    'share': round(ns / total_ns, 4),
+                }
+                for name, (count, ns) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+            },
+            'latency_us': {
+                'mean': round(self.molecule_ns / self.molecules / 1000, 2) if self.molecules else None,
+                'p50_le': self.percentile_us(0.5),
+                'p90_le': self.percentile_us(0.9),
+                'p99_le': self.percentile_us(0.99),
+                'histogram': [{'le': bound, 'count': count}
+                              for bound, count in zip(LATENCY_BUCKETS_US + (None,), self.histogram)],
+            },
+            'slowest': [{'name': name, 'smiles': smiles, 'us': round(ns / 1000, 1)}
+                        for ns, name, smiles in self.slowest()],
+        }
+        return report
+
+    def format_report(self, wall_seconds: Optional[float] = None) -> str:
+        """Human-readable stage table, histogram and slowest molecules"""
+        data = self.to_dict(wall_seconds)
+        lines = [f"{'Stage':<16}{'count':>10}{'total ms':>12}{'mean us':>10}{'share':>8}"]
+        for name, s in data['stages'].items():
+            lines.append(f"{name:<16}{s['count']:>10}{s['total_ms']:>12.1f}{s['mean_us']:>10.1f}{s['share']:>8.1%}")
+        if self.molecules:
+            lines.append("")
+            lines.append(f"Per-molecule latency: mean {data['latency_us']['mean']} us, "
+                         f"p50 <= {data['latency_us']['p50_le']} us, p99 <= {data['latency_us']['p99_le']} us")
+            peak = max(self.histogram) or 1
+            for entry in data['latency_us']['histogram']:
+                label = f"<= {entry['le']} us" if entry['le'] is not None else f"> {LATENCY_BUCKETS_US[-1]} us"
+                lines.append(f"  {label:>12} {entry['count']:>8} {'#' * round(40 * entry['count'] / peak)}")
+            lines.append("")
+            lines.append(f"Slowest {len(data['slowest'])} molecules:")
+            for entry in data['slowest']:
+                lines.append(f"  {entry['us']:>10.1f} us  {entry['name']}")
+        if wall_seconds is not None:
+            lines.append("")
+            lines.append(f"Wall time: {wall_seconds:.3f} s")
+        return '\n'.join(lines)
+
+    def write(self, path: str, wall_seconds: Optional[float] = None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(wall_seconds), f, indent=2, ensure_ascii=False)
+
+_active: Optional[Metrics] = None
+
+def active() -> bool:
+    """True while stage timers are being collected in this process"""
+    return _active is not None
+
+def stage(name: str):
+    """Context manager timing one stage into the active metrics, or a no-op"""
+    if _active is None:
+        return NULL_STAGE
+    return _active.stage(name)
+
+@contextmanager
+def collecting(metrics: Metrics):
+    """Collect stage timers into metrics for the duration of the block"""
+    global _active
+    previous, _active = _active, metrics
+    try:
+        yield metrics
+    finally:
+        _active = previous
+
+def staged_mol_from_smiles(smiles: str):
+    """Chem.MolFromSmiles with parsing and sanitization timed as separate stages
+
+    Returns None where MolFromSmiles would, so profiled runs give the same results.
+    """
+    with stage('parse'):
+        mol = Chem.MolFromSmiles(smiles, sanitize=False)
+    if mol is None:
+        return None
+    with stage('sanitize'):
+        try:
+            # What MolFromSmiles does by default: drop explicit H atoms, which sanitizes
+            mol = Chem.RemoveHs(mol, updateExplicitCount=True)
+        except Exception:
+            return None
+        Chem.AssignStereochemistry(mol, cleanIt=True, force=True)
+    return mol
+
+class Progress:
+    """Single-line progress bar on stderr, redrawn at most ten times per second"""
+
+    def __init__(self, total: Optional[int] = None, stream=sys.stderr, width: int = 30):
+        self.total = total
+        self.stream = stream
+        self.width = width
+        self.start = time.monotonic()
+        self._drawn = 0.0
+
+    def update(self, done: int, errors: int = 0, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._drawn < 0.1:
+            return
+        self._drawn = now
+        rate = done / max(now - self.start, 1e-9)
+        if self.total:
+            filled = int(self.width * done / self.total)
+            bar = f"[{'#' * filled}{'-' * (self.width - filled)}] {done}/{self.total} {done / self.total:4.0%}"
+        else:
+            bar = f"{done} molecules"
+        self.stream.write(f"\r{bar}  {errors} errors  {rate:,.0f} mol/s ")
+        self.stream.flush()
+
+    def close(self, done: int, errors: int = 0):
+        self.update(done, errors, force=True)
+        self.stream.write('\n')
+        self.stream.flush()